@@ -0,0 +1,150 @@
+"""
+Load test: read latency while many quiz generations are in flight.
+
+Runs the FastAPI app in-process (httpx ASGI transport, one event loop, as
+under uvicorn) against a temporary database, with the LLM replaced by the
+local stub provider and Wikipedia by a stub that parses a saved page. First GET /api/quizzes is measured on
+an idle server, then again while --generations cold POST /api/quizzes
+requests (distinct articles) are running. With the async request path the
+two read latency distributions should be about the same.
+
+Usage (from backend/):
+    python benchmarks/bench_async_load.py
+    python benchmarks/bench_async_load.py --generations 200 --llm-latency 2 --json
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, ".."))
+
+# No Gemini client is created: every call goes to the local stub
+os.environ["LLM_PROVIDER"] = "stub"
+# Every create must reach the model: cached replies would hide its latency
+os.environ["LLM_CACHE_ENABLED"] = "false"
+
+import httpx  # noqa: E402
+import db  # noqa: E402
+import llm  # noqa: E402
+import main  # noqa: E402
+from providers import StubProvider  # noqa: E402
+from ratelimit import TokenBucketLimiter  # noqa: E402
+from scraper import parse_wikipedia_html  # noqa: E402
+
+FIXTURE = os.path.join(BENCH_DIR, "fixtures", "photosynthesis.html")
+
+
+def make_scraper(html: str, latency: float):
+    async def scrape(url: str) -> dict:
+        await asyncio.sleep(latency)
+        scraped = await asyncio.to_thread(parse_wikipedia_html, html, url)
+        # Each benchmark URL is its own article
+        scraped["canonical_url"] = url
+        scraped["title"] = url.rsplit("/", 1)[-1]
+        return scraped
+    return scrape
+
+
+def _summary(latencies: list) -> dict:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "p50_ms": round(statistics.median(ordered) * 1000, 2),
+        "p95_ms": round(ordered[int(len(ordered) * 0.95) - 1] * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+
+async def _read_loop(client, stop: asyncio.Event, interval: float) -> list:
+    latencies = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.get("/api/quizzes", params={"limit": 20})
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def run(generations: int, llm_latency: float, scrape_latency: float, idle_seconds: float, interval: float) -> dict:
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        # Phase 1: reads on an idle server
+        stop = asyncio.Event()
+        reader = asyncio.ensure_future(_read_loop(client, stop, interval))
+        await asyncio.sleep(idle_seconds)
+        stop.set()
+        idle = await reader
+        
+        # Phase 2: the same reads while every generation is in flight
+        async def generate(n: int) -> float:
+            start = time.perf_counter()
+            response = await client.post("/api/quizzes", json={"url": f"https://en.wikipedia.org/wiki/Bench_{n}"})
+            response.raise_for_status()
+            return time.perf_counter() - start
+        
+        stop = asyncio.Event()
+        reader = asyncio.ensure_future(_read_loop(client, stop, interval))
+        start = time.perf_counter()
+        generation_times = await asyncio.gather(*(generate(n) for n in range(generations)))
+        wall = time.perf_counter() - start
+        stop.set()
+        loaded = await reader
+    
+    return {
+        "generations": generations,
+        "llm_latency_s": llm_latency,
+        "reads_idle": _summary(idle),
+        "reads_under_load": _summary(loaded),
+        "generation": {
+            **_summary(generation_times),
+            "wall_s": round(wall, 2),
+            "quizzes_per_sec": round(generations / wall, 2),
+        },
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--generations", type=int, default=100, help="concurrent cold generate requests")
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="seconds per stub LLM call")
+    parser.add_argument("--scrape-latency", type=float, default=0.3, help="seconds per stub article fetch")
+    parser.add_argument("--idle-seconds", type=float, default=2.0, help="duration of the idle read phase")
+    parser.add_argument("--interval", type=float, default=0.02, help="pause between reads")
+    # The default Gemini quota would make this a benchmark of the rate limiter
+    parser.add_argument("--rpm", type=int, default=0, help="LLM requests per minute (0 = unlimited)")
+    parser.add_argument("--tpm", type=int, default=0, help="LLM tokens per minute (0 = unlimited)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+    
+    db.DB_PATH = os.path.join(tempfile.mkdtemp(prefix="bench_load_"), "quizzes.db")
+    db.init_db()
+    
+    with open(FIXTURE, encoding="utf-8") as f:
+        html = f.read()
+    llm.llm = StubProvider(latency=args.llm_latency)
+    llm.limiter = TokenBucketLimiter(args.rpm, args.tpm)
+    main.scrape_wikipedia = make_scraper(html, args.scrape_latency)
+    
+    result = asyncio.run(run(args.generations, args.llm_latency, args.scrape_latency, args.idle_seconds, args.interval))
+    
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    
+    print(f"{'phase':<18}{'requests':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for phase in ("reads_idle", "reads_under_load", "generation"):
+        r = result[phase]
+        print(f"{phase:<18}{r['requests']:>10}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['max_ms']:>10}")
+    g = result["generation"]
+    print(f"\n{result['generations']} generations in {g['wall_s']}s ({g['quizzes_per_sec']} quizzes/s)")
+
+
+if __name__ == "__main__":
+    main_cli()
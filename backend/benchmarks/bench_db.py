@@ -0,0 +1,229 @@
+"""
+Benchmark SQLite under concurrent readers and writers.
+
+Reader threads run the history query (GET /api/quizzes) and the quiz-by-
+article lookup from generate_quiz; writer threads submit attempts (quiz
+lookup + INSERT + commit), as POST /api/quizzes/{id}/attempt does. Each
+profile runs against its own seeded copy of the schema:
+
+- legacy: new connection per operation, rollback journal, no indexes on
+          quizzes.article_id / attempts.quiz_id (the original setup)
+- tuned:  db.get_db per-thread connections, WAL, pragmas from config.py,
+          indexes from the versioned migrations
+
+Usage (from backend/):
+    python benchmarks/bench_db.py
+    python benchmarks/bench_db.py --readers 8 --writers 4 --seconds 10 --json
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from contextlib import closing, contextmanager
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, ".."))
+
+import db  # noqa: E402
+
+HISTORY_QUERY = """
+    SELECT q.id, a.title, a.url, q.created_at
+    FROM quizzes q
+    JOIN articles a ON q.article_id = a.id
+    ORDER BY q.id DESC
+"""
+
+QUIZ_JSON = json.dumps([
+    {
+        "question": f"Question {i}?",
+        "options": ["A) a", "B) b", "C) c", "D) d"],
+        "answer": "A",
+        "difficulty": d,
+        "explanation": "Because the article says so.",
+    }
+    for i, d in enumerate(["easy", "easy", "medium", "medium", "hard", "hard"])
+])
+
+
+def seed(path: str, articles: int, attempts: int):
+    """Create the schema in path and fill it with articles, quizzes and attempts."""
+    db.DB_PATH = path
+    db.init_db()
+    now = datetime.now(timezone.utc).isoformat()
+    
+    with closing(sqlite3.connect(path)) as conn:
+        conn.executemany(
+            "INSERT INTO articles (url, title, created_at) VALUES (?, ?, ?)",
+            ((f"https://en.wikipedia.org/wiki/Article_{i}", f"Article {i}", now) for i in range(articles))
+        )
+        conn.executemany(
+            "INSERT INTO quizzes (article_id, quiz_json, llm_model, prompt_version, created_at) VALUES (?, ?, ?, ?, ?)",
+            ((i + 1, QUIZ_JSON, "gemini-2.5-flash", "v1", now) for i in range(articles))
+        )
+        conn.executemany(
+            "INSERT INTO attempts (quiz_id, score, total, user_answers, created_at) VALUES (?, ?, ?, ?, ?)",
+            ((random.randint(1, articles), 3, 6, "{}", now) for _ in range(attempts))
+        )
+        conn.commit()
+
+
+def make_legacy(path: str):
+    """Turn a seeded file back into the original setup."""
+    with closing(sqlite3.connect(path)) as conn:
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.execute("DROP INDEX IF EXISTS idx_quizzes_article_id")
+        conn.execute("DROP INDEX IF EXISTS idx_attempts_quiz_id")
+
+
+@contextmanager
+def legacy_db(path: str):
+    """The original get_db: a fresh default connection per operation."""
+    conn = sqlite3.connect(path, check_same_thread=False)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def read_history(conn, articles: int):
+    conn.execute(HISTORY_QUERY).fetchall()
+
+
+def read_quiz_by_article(conn, articles: int):
+    conn.execute(
+        "SELECT id, quiz_json FROM quizzes WHERE article_id = ?",
+        (random.randint(1, articles),)
+    ).fetchone()
+
+
+def read_attempt_stats(conn, articles: int):
+    conn.execute(
+        "SELECT COUNT(*), AVG(score) FROM attempts WHERE quiz_id = ?",
+        (random.randint(1, articles),)
+    ).fetchone()
+
+
+def write_attempt(conn, articles: int):
+    quiz_id = random.randint(1, articles)
+    conn.execute("SELECT quiz_json FROM quizzes WHERE id = ?", (quiz_id,)).fetchone()
+    conn.execute(
+        "INSERT INTO attempts (quiz_id, score, total, user_answers, created_at) VALUES (?, ?, ?, ?, ?)",
+        (quiz_id, 4, 6, '{"0": "A"}', datetime.now(timezone.utc).isoformat())
+    )
+    conn.commit()
+
+
+READ_OPS = [read_history, read_quiz_by_article, read_attempt_stats]
+
+
+def _worker(open_db, ops: list, articles: int, deadline: float, samples: dict, errors: dict):
+    while time.perf_counter() < deadline:
+        op = random.choice(ops)
+        start = time.perf_counter()
+        try:
+            with open_db() as conn:
+                op(conn, articles)
+        except sqlite3.OperationalError as e:
+            errors[op.__name__] = errors.get(op.__name__, 0) + 1
+            if "locked" not in str(e):
+                raise
+            continue
+        samples.setdefault(op.__name__, []).append(time.perf_counter() - start)
+
+
+def _percentile(values: list, pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run_profile(profile: str, readers: int, writers: int, seconds: float, articles: int, attempts: int) -> dict:
+    directory = tempfile.mkdtemp(prefix="bench_db_")
+    path = os.path.join(directory, f"{profile}.db")
+    seed(path, articles, attempts)
+    
+    if profile == "legacy":
+        make_legacy(path)
+        open_db = lambda: legacy_db(path)  # noqa: E731
+    else:
+        db.DB_PATH = path
+        open_db = db.get_db
+    
+    samples = [{} for _ in range(readers + writers)]
+    errors = [{} for _ in range(readers + writers)]
+    deadline = time.perf_counter() + seconds
+    
+    threads = [
+        threading.Thread(
+            target=_worker,
+            args=(open_db, READ_OPS if n < readers else [write_attempt], articles, deadline, samples[n], errors[n])
+        )
+        for n in range(readers + writers)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    
+    if profile == "tuned":
+        db.close_connections()
+    
+    results = []
+    for op in READ_OPS + [write_attempt]:
+        timings = [s for worker in samples for s in worker.get(op.__name__, [])]
+        failed = sum(worker.get(op.__name__, 0) for worker in errors)
+        if not timings:
+            continue
+        results.append({
+            "profile": profile,
+            "op": op.__name__,
+            "ops": len(timings),
+            "ops_per_sec": round(len(timings) / seconds, 1),
+            "p50_ms": round(statistics.median(timings) * 1000, 3),
+            "p95_ms": round(_percentile(timings, 95) * 1000, 3),
+            "p99_ms": round(_percentile(timings, 99) * 1000, 3),
+            "locked_errors": failed,
+        })
+    return results
+
+
+def print_table(results: list):
+    header = f"{'profile':<8}{'op':<22}{'ops':>8}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'locked':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['profile']:<8}{r['op']:<22}{r['ops']:>8}{r['ops_per_sec']:>10}"
+            f"{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['locked_errors']:>8}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", nargs="+", default=["legacy", "tuned"], choices=["legacy", "tuned"])
+    parser.add_argument("--readers", type=int, default=8, help="reader threads")
+    parser.add_argument("--writers", type=int, default=4, help="attempt-writer threads")
+    parser.add_argument("--seconds", type=float, default=5.0, help="duration per profile")
+    parser.add_argument("--articles", type=int, default=500, help="seeded articles (one quiz each)")
+    parser.add_argument("--attempts", type=int, default=20000, help="seeded attempts")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+    
+    results = []
+    for profile in args.profiles:
+        results += run_profile(profile, args.readers, args.writers, args.seconds, args.articles, args.attempts)
+    
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+Benchmark the HTML extraction engines in extract.py.
+
+Runs every engine over a corpus of saved Wikipedia pages and reports
+parse time and peak memory, and checks each engine's output against the
+original bs4 engine.
+
+The bundled fixtures are small; --scale repeats the parser-output body of
+each page to approximate large articles (500 KB - 2 MB). Pages saved from
+en.wikipedia.org (.html or .html.gz) can be added with --fixtures.
+
+Usage (from backend/):
+    python benchmarks/bench_extract.py
+    python benchmarks/bench_extract.py --scale 1 40 --repeat 10 --json
+    python benchmarks/bench_extract.py --fixtures ~/saved_wiki_pages
+"""
+import argparse
+import gzip
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, ".."))
+
+from extract import ENGINES, LXML_AVAILABLE, get_engine  # noqa: E402
+
+FIXTURES_DIR = os.path.join(BENCH_DIR, "fixtures")
+
+PARSER_OUTPUT_OPEN = re.compile(r'<div[^>]*class="[^"]*\bmw-parser-output\b[^"]*"[^>]*>')
+PARSER_OUTPUT_END = "<!-- \nNewPP limit report"
+
+
+def load_fixtures(directory: str) -> dict:
+    """Read every .html / .html.gz page in a directory."""
+    pages = {}
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if name.endswith(".html.gz"):
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                pages[name[:-len(".html.gz")]] = f.read()
+        elif name.endswith(".html"):
+            with open(path, encoding="utf-8") as f:
+                pages[name[:-len(".html")]] = f.read()
+    return pages
+
+
+def scale_page(html: str, factor: int) -> str:
+    """Repeat the article body factor times to simulate a larger article."""
+    if factor <= 1:
+        return html
+    opening = PARSER_OUTPUT_OPEN.search(html)
+    end = html.find(PARSER_OUTPUT_END)
+    if not opening or end == -1:
+        return html
+    body = html[opening.end():end]
+    return html[:end] + body * (factor - 1) + html[end:]
+
+
+def time_engine(engine: str, html: str, repeat: int) -> list:
+    """Wall-clock seconds for each of repeat runs."""
+    extract = get_engine(engine)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        extract(html)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _status_kb(field: str) -> int:
+    """Read a memory field (VmRSS, VmHWM) from /proc/self/status, in KB."""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    raise ValueError(field)
+
+
+def _reset_peak_rss() -> bool:
+    """Reset the kernel's peak-RSS counter (Linux >= 4.0)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def measure_memory(engine: str, html: str) -> dict:
+    """
+    Peak memory of one extraction, measured in this (fresh) process.
+    tracemalloc only sees Python allocations, so the growth of peak RSS over
+    the pre-parse RSS is reported as well to include C parsers (lxml/libxml2).
+    Where the peak counter cannot be reset, rss_growth_kb is None.
+    """
+    extract = get_engine(engine)
+    
+    try:
+        rss_before = _status_kb("VmRSS")
+        can_track_rss = _reset_peak_rss()
+    except (OSError, ValueError):
+        can_track_rss = False
+    
+    tracemalloc.start()
+    extract(html)
+    _, py_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    rss_growth = None
+    if can_track_rss:
+        rss_growth = max(0, _status_kb("VmHWM") - rss_before)
+    
+    return {
+        "py_peak_kb": round(py_peak / 1024, 1),
+        "rss_growth_kb": rss_growth,
+    }
+
+
+def measure_memory_isolated(engine: str, name: str, scale: int, fixtures: str) -> dict:
+    """Run measure_memory in a child process so engines do not share a heap."""
+    out = subprocess.run(
+        [
+            sys.executable, os.path.abspath(__file__),
+            "--memory-probe", engine, name, str(scale),
+            "--fixtures", fixtures,
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def run(fixtures: str, engines: list, scales: list, repeat: int) -> list:
+    pages = load_fixtures(fixtures)
+    results = []
+    
+    for name, page in pages.items():
+        for scale in scales:
+            html = scale_page(page, scale)
+            baseline = get_engine("bs4")(html)
+            
+            for engine in engines:
+                timings = time_engine(engine, html, repeat)
+                memory = measure_memory_isolated(engine, name, scale, fixtures)
+                results.append({
+                    "fixture": name,
+                    "scale": scale,
+                    "html_kb": round(len(html.encode("utf-8")) / 1024, 1),
+                    "engine": engine,
+                    "matches_bs4": get_engine(engine)(html) == baseline,
+                    "time_ms_median": round(statistics.median(timings) * 1000, 3),
+                    "time_ms_min": round(min(timings) * 1000, 3),
+                    **memory,
+                })
+    
+    return results
+
+
+def print_table(results: list):
+    header = f"{'fixture':<22}{'scale':>6}{'KB':>9}  {'engine':<8}{'median ms':>11}{'min ms':>10}{'py peak KB':>12}{'RSS +KB':>9}  same"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['fixture']:<22}{r['scale']:>6}{r['html_kb']:>9}  {r['engine']:<8}"
+            f"{r['time_ms_median']:>11}{r['time_ms_min']:>10}{r['py_peak_kb']:>12}"
+            f"{str(r['rss_growth_kb']):>9}  {'yes' if r['matches_bs4'] else 'NO'}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help="directory of saved .html/.html.gz pages")
+    parser.add_argument("--engines", nargs="+", default=None, help="engines to compare (default: all available)")
+    parser.add_argument("--scale", nargs="+", type=int, default=[1, 40], help="body repeat factors")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per engine and page")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--memory-probe", nargs=3, metavar=("ENGINE", "FIXTURE", "SCALE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.memory_probe:
+        engine, name, scale = args.memory_probe
+        html = scale_page(load_fixtures(args.fixtures)[name], int(scale))
+        print(json.dumps(measure_memory(engine, html)))
+        return
+    
+    engines = args.engines or [e for e in ENGINES if e != "lxml" or LXML_AVAILABLE]
+    results = run(args.fixtures, engines, args.scale, args.repeat)
+    
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,430 @@
+"""
+End-to-end benchmark suite for the quiz pipeline.
+
+Times each stage on its own, then the HTTP cycle a user goes through,
+and writes one JSON document that can be compared between commits:
+
+- parse:<fixture>       scraper.parse_wikipedia_html on a saved page
+- score_attempt         utils.score_attempt on a six-question quiz
+- db:*                  the database steps of main.py (store/load article,
+                        store/load quiz, quiz detail, score + store attempt)
+- http:*                POST /api/quizzes (cold and cached), GET history,
+                        GET /api/quizzes/{id} and POST .../attempt through
+                        FastAPI's TestClient
+- import:main           cold-start import of the app (`python -X importtime
+                        -c "import main"` in fresh interpreters, production
+                        provider settings); the report lists the modules
+                        with the largest own import time
+
+Wikipedia is replaced by a stub that parses a saved page and the LLM by
+the local stub provider (providers.StubProvider), so no network or API
+key is needed. The rate limiter and the LLM response cache are off;
+--llm-latency adds simulated model time to the cold create benchmark.
+
+Each benchmark reports p50/p95/mean latency, throughput (ops/s over the
+timed loop) and peak Python memory (tracemalloc, measured in a separate
+shorter pass so it does not slow the timed one).
+
+Usage (from backend/):
+    python benchmarks/bench_suite.py --output before.json
+    python benchmarks/bench_suite.py --compare before.json --threshold 15
+
+--compare exits with status 1 if a benchmark regressed.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, ".."))
+
+# No Gemini client is created: every call goes to the local stub
+os.environ["LLM_PROVIDER"] = "stub"
+# Every create must reach the model: cached replies would hide its latency
+os.environ["LLM_CACHE_ENABLED"] = "false"
+
+import db  # noqa: E402
+import llm  # noqa: E402
+import main  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from providers import StubProvider  # noqa: E402
+from ratelimit import TokenBucketLimiter  # noqa: E402
+from scraper import parse_wikipedia_html  # noqa: E402
+from utils import score_attempt  # noqa: E402
+
+FIXTURES_DIR = os.path.join(BENCH_DIR, "fixtures")
+PIPELINE_FIXTURE = "photosynthesis.html"
+
+QUIZ = [
+    {
+        "question": f"Question {i}?",
+        "options": ["A) a", "B) b", "C) c", "D) d"],
+        "answer": "ABCD"[i % 4],
+        "difficulty": d,
+        "explanation": "Because the article says so.",
+    }
+    for i, d in enumerate(["easy", "easy", "medium", "medium", "hard", "hard"])
+]
+ANSWERS = {str(i): "A" for i in range(len(QUIZ))}
+
+
+def measure(name: str, fn, iterations: int, warmup: int = 3, memory_iterations: int = 10) -> dict:
+    """
+    Time iterations calls of fn(), then measure peak traced memory over a
+    few more calls.
+    """
+    for _ in range(warmup):
+        fn()
+    
+    timings = []
+    loop_start = time.perf_counter()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    wall = time.perf_counter() - loop_start
+    
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    for _ in range(min(iterations, memory_iterations)):
+        fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    ordered = sorted(timings)
+    return {
+        "name": name,
+        "iterations": iterations,
+        "p50_ms": round(statistics.median(ordered) * 1000, 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "ops_per_sec": round(iterations / wall, 1),
+        "peak_kb": round(max(0, peak - baseline) / 1024, 1),
+    }
+
+
+def load_fixtures() -> dict:
+    pages = {}
+    for name in sorted(os.listdir(FIXTURES_DIR)):
+        if name.endswith(".html"):
+            with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+                pages[name] = f.read()
+    return pages
+
+
+def make_scraper(html: str):
+    async def scrape(url: str) -> dict:
+        scraped = await asyncio.to_thread(parse_wikipedia_html, html, url)
+        # Each benchmark URL is its own article
+        scraped["canonical_url"] = url
+        scraped["title"] = url.rsplit("/", 1)[-1]
+        return scraped
+    return scrape
+
+
+# ============ STAGES ============
+def bench_parse(pages: dict, iterations: int) -> list:
+    return [
+        measure(f"parse:{name[:-len('.html')]}", lambda html=html: parse_wikipedia_html(html, "https://en.wikipedia.org/wiki/Bench"), iterations)
+        for name, html in pages.items()
+    ]
+
+
+def bench_score(iterations: int) -> list:
+    return [measure("score_attempt", lambda: score_attempt(QUIZ, ANSWERS), iterations)]
+
+
+def bench_db(html: str, iterations: int) -> list:
+    scraped = parse_wikipedia_html(html, "https://en.wikipedia.org/wiki/Bench")
+    counter = itertools.count()
+    articles, quizzes = [], []
+
+    def store_article():
+        url = f"https://en.wikipedia.org/wiki/Db_{next(counter)}"
+        article_id, _, _ = main._store_scraped_article(url, url, {**scraped, "canonical_url": url, "title": url})
+        articles.append((article_id, url))
+
+    def load_article():
+        _, url = random.choice(articles)
+        main._load_cached_article(url, url)
+
+    def store_quiz():
+        article_id, _ = random.choice(articles)
+        quizzes.append(main._store_quiz(article_id, QUIZ))
+
+    def load_quiz():
+        article_id, _ = random.choice(articles)
+        main._load_quiz(article_id)
+
+    def load_quiz_detail():
+        main._load_quiz_detail(random.choice(quizzes))
+
+    def store_attempt():
+        main._score_and_store_attempt(random.choice(quizzes), ANSWERS)
+    
+    return [
+        measure("db:store_article", store_article, iterations),
+        measure("db:load_article", load_article, iterations),
+        measure("db:store_quiz", store_quiz, iterations),
+        measure("db:load_quiz", load_quiz, iterations),
+        measure("db:load_quiz_detail", load_quiz_detail, iterations),
+        measure("db:score_and_store_attempt", store_attempt, iterations),
+    ]
+
+
+def bench_http(html: str, iterations: int, llm_latency: float) -> list:
+    main.scrape_wikipedia = make_scraper(html)
+    llm.llm = StubProvider(latency=llm_latency)
+    counter = itertools.count()
+    quiz_ids, urls = [], []
+    
+    with TestClient(main.app) as client:
+        def create_cold():
+            url = f"https://en.wikipedia.org/wiki/Http_{next(counter)}"
+            response = client.post("/api/quizzes", json={"url": url})
+            response.raise_for_status()
+            quiz_ids.append(response.json()["id"])
+            urls.append(url)
+
+        def create_cached():
+            client.post("/api/quizzes", json={"url": random.choice(urls)}).raise_for_status()
+
+        def history():
+            client.get("/api/quizzes", params={"limit": 20}).raise_for_status()
+
+        def detail():
+            client.get(f"/api/quizzes/{random.choice(quiz_ids)}").raise_for_status()
+
+        def attempt():
+            client.post(f"/api/quizzes/{random.choice(quiz_ids)}/attempt", json={"answers": ANSWERS}).raise_for_status()
+        
+        return [
+            measure("http:create_quiz", create_cold, iterations),
+            measure("http:create_quiz_cached", create_cached, iterations),
+            measure("http:history_page", history, iterations),
+            measure("http:quiz_detail", detail, iterations),
+            measure("http:attempt", attempt, iterations),
+        ]
+
+
+# ============ IMPORT TIME ============
+def _parse_importtime(stderr: str) -> list:
+    """[(module, self us, cumulative us, depth), ...] from -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def bench_import(module: str, runs: int, top: int = 15):
+    """
+    Import module in runs fresh interpreters and time it with -X importtime.
+    
+    Returns:
+        (result entry, profile of the median run: total and the top
+        modules by own import time)
+    """
+    # The deployed configuration, so a heavy import on the production
+    # path shows up even though the rest of the suite runs on the stub
+    env = {**os.environ, "LLM_PROVIDER": "gemini"}
+    profiles = []
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=os.path.join(BENCH_DIR, ".."), env=env, capture_output=True, text=True, check=True
+        )
+        rows = _parse_importtime(completed.stderr)
+        total = next(cumulative for name, _, cumulative, depth in rows if name == module and depth == 0)
+        profiles.append((total, rows))
+    
+    profiles.sort(key=lambda p: p[0])
+    totals = [total / 1000 for total, _ in profiles]
+    median_total, median_rows = profiles[len(profiles) // 2]
+    heaviest = sorted(median_rows, key=lambda row: row[1], reverse=True)[:top]
+    
+    result = {
+        "name": f"import:{module}",
+        "iterations": runs,
+        "p50_ms": round(statistics.median(totals), 3),
+        "p95_ms": round(totals[min(len(totals) - 1, int(len(totals) * 0.95))], 3),
+        "mean_ms": round(statistics.fmean(totals), 3),
+        "ops_per_sec": round(1000 / statistics.fmean(totals), 1),
+        # Separate process: its memory is not traced
+        "peak_kb": 0.0,
+    }
+    profile = {
+        "module": module,
+        "total_ms": round(median_total / 1000, 3),
+        "modules_imported": len(median_rows),
+        "top_self": [
+            {"module": name, "self_ms": round(self_us / 1000, 3), "cumulative_ms": round(cumulative_us / 1000, 3)}
+            for name, self_us, cumulative_us, _ in heaviest
+        ],
+    }
+    return result, profile
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BENCH_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(iterations: int, llm_latency: float, import_runs: int = 5) -> dict:
+    db.DB_PATH = os.path.join(tempfile.mkdtemp(prefix="bench_suite_"), "quizzes.db")
+    db.init_db()
+    # Quota waits would dominate every LLM-bound number
+    llm.limiter = TokenBucketLimiter(0, 0)
+    random.seed(0)
+    
+    pages = load_fixtures()
+    html = pages[PIPELINE_FIXTURE]
+    
+    results = []
+    results += bench_parse(pages, max(1, iterations // 4))
+    results += bench_score(iterations * 10)
+    results += bench_db(html, iterations)
+    results += bench_http(html, max(1, iterations // 4), llm_latency)
+    db.close_connections()
+    
+    import_profile = None
+    if import_runs:
+        result, import_profile = bench_import("main", import_runs)
+        results.append(result)
+    
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "iterations": iterations,
+            "llm_latency_s": llm_latency,
+            # ru_maxrss is KiB on Linux
+            "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        },
+        "results": results,
+        "import_profile": import_profile,
+    }
+
+
+# ============ REPORTING ============
+def print_table(report: dict):
+    header = f"{'benchmark':<30}{'iters':>7}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}{'ops/s':>11}{'peak KB':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in report["results"]:
+        print(
+            f"{r['name']:<30}{r['iterations']:>7}{r['p50_ms']:>10}{r['p95_ms']:>10}"
+            f"{r['mean_ms']:>10}{r['ops_per_sec']:>11}{r['peak_kb']:>10}"
+        )
+    meta = report["meta"]
+    print(f"\ncommit {meta['commit']}, python {meta['python']}, max RSS {meta['max_rss_kb']} KB")
+    
+    profile = report.get("import_profile")
+    if profile:
+        print(f"\nimport {profile['module']}: {profile['total_ms']} ms, {profile['modules_imported']} modules; slowest (own time):")
+        for entry in profile["top_self"]:
+            print(f"  {entry['module']:<50}{entry['self_ms']:>10} ms{entry['cumulative_ms']:>12} ms cumulative")
+
+
+def compare(report: dict, baseline: dict, threshold: float, min_delta_ms: float) -> list:
+    """
+    Print the change of every benchmark against baseline.
+    
+    Returns:
+        list: Names of benchmarks whose p50 or p95 got more than threshold
+              percent (and more than min_delta_ms) slower
+    """
+    before = {r["name"]: r for r in baseline["results"]}
+    regressions = []
+
+    def change(new, old):
+        return (new - old) / old * 100 if old else 0.0
+    
+    print(f"Compared with {baseline['meta'].get('commit')} (threshold {threshold}%)\n")
+    header = f"{'benchmark':<30}{'p50 ms':>16}{'p95 ms':>16}{'ops/s':>18}{'peak KB':>16}"
+    print(header)
+    print("-" * len(header))
+    
+    for r in report["results"]:
+        old = before.get(r["name"])
+        if old is None:
+            print(f"{r['name']:<30}  (new)")
+            continue
+        
+        p50, p95 = change(r["p50_ms"], old["p50_ms"]), change(r["p95_ms"], old["p95_ms"])
+        ops = change(r["ops_per_sec"], old["ops_per_sec"])
+        peak = change(r["peak_kb"], old["peak_kb"])
+        # Sub-millisecond stages jitter by more than threshold percent
+        # between runs: small absolute changes never count
+        regressed = (
+            (p50 > threshold and r["p50_ms"] - old["p50_ms"] > min_delta_ms)
+            or (p95 > threshold and r["p95_ms"] - old["p95_ms"] > min_delta_ms)
+        )
+        if regressed:
+            regressions.append(r["name"])
+        
+        print(
+            f"{r['name']:<30}{r['p50_ms']:>9} {p50:+5.0f}%{r['p95_ms']:>9} {p95:+5.0f}%"
+            f"{r['ops_per_sec']:>11} {ops:+5.0f}%{r['peak_kb']:>9} {peak:+5.0f}%"
+            f"{'  REGRESSION' if regressed else ''}"
+        )
+    
+    return regressions
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200, help="timed calls per DB benchmark (others scale from it)")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds per stub LLM call")
+    parser.add_argument("--import-runs", type=int, default=5, help="fresh interpreters timing 'import main' (0 = skip)")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--json", action="store_true", help="print the JSON report instead of a table")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON report of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=20.0, help="percent slowdown counted as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=0.25, help="smaller slowdowns are never regressions")
+    args = parser.parse_args()
+    
+    report = run(args.iterations, args.llm_latency, args.import_runs)
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    
+    if args.json:
+        print(json.dumps(report, indent=2))
+    elif not args.compare:
+        print_table(report)
+    
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,169 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _int_env(name: str, default: int) -> int:
+    """Read an integer setting from the environment, falling back to default."""
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _float_env(name: str, default: float) -> float:
+    """Read a float setting from the environment, falling back to default."""
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+# ============ QUIZ GENERATION ============
+# Maximum number of question slots sent to Gemini at the same time
+QUIZ_GENERATION_CONCURRENCY = max(1, _int_env("QUIZ_GENERATION_CONCURRENCY", 6))
+
+# "single" sends one prompt per question, "batch" asks for all six in one prompt
+QUIZ_GENERATION_MODE = os.getenv("QUIZ_GENERATION_MODE", "single").lower()
+
+# Characters of article text sent with each question (one section excerpt per slot)
+QUESTION_CONTEXT_CHARS = max(300, _int_env("QUESTION_CONTEXT_CHARS", 1500))
+
+# ============ LLM PROVIDER ============
+# "gemini" calls the Google API; "stub" answers locally (benchmarks, load tests)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini").lower()
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+
+# Stub behaviour: mean seconds per call, and the fractions of calls that
+# fail, return malformed JSON or are rejected with a 429
+STUB_LLM_LATENCY_SECONDS = max(0.0, _float_env("STUB_LLM_LATENCY_SECONDS", 1.0))
+STUB_LLM_FAILURE_RATE = min(1.0, max(0.0, _float_env("STUB_LLM_FAILURE_RATE", 0.0)))
+STUB_LLM_MALFORMED_RATE = min(1.0, max(0.0, _float_env("STUB_LLM_MALFORMED_RATE", 0.0)))
+STUB_LLM_RATE_LIMIT_RATE = min(1.0, max(0.0, _float_env("STUB_LLM_RATE_LIMIT_RATE", 0.0)))
+STUB_LLM_SEED = _int_env("STUB_LLM_SEED", 0)
+
+# ============ LLM RATE LIMITS ============
+# Gemini quota, enforced before each call instead of waiting for 429s
+# (0 disables the bucket). Buckets hold one minute of quota, so bursts up
+# to the full limit go through at once
+GEMINI_RPM = max(0, _int_env("GEMINI_RPM", 60))
+GEMINI_TPM = max(0, _int_env("GEMINI_TPM", 250000))
+
+# Output tokens charged per call up front (corrected to actual usage afterwards)
+LLM_OUTPUT_TOKEN_ESTIMATE = max(0, _int_env("LLM_OUTPUT_TOKEN_ESTIMATE", 400))
+
+# Keep bucket levels in SQLite so all uvicorn workers share one quota
+RATE_LIMIT_PERSIST = os.getenv("RATE_LIMIT_PERSIST", "true").lower() in ("1", "true", "yes")
+
+# ============ RESILIENCE ============
+# End-to-end time one quiz generation may take (scrape and every LLM call,
+# retries included); past it the remaining calls fail fast
+GENERATION_DEADLINE_SECONDS = max(1.0, _float_env("GENERATION_DEADLINE_SECONDS", 90.0))
+
+# Retries allowed across all LLM calls of the process: this fraction of the
+# calls made in the last minute, but at least LLM_RETRY_BUDGET_MIN per minute
+LLM_RETRY_BUDGET_RATIO = max(0.0, _float_env("LLM_RETRY_BUDGET_RATIO", 0.2))
+LLM_RETRY_BUDGET_MIN = max(0, _int_env("LLM_RETRY_BUDGET_MIN", 30))
+
+# Exponential backoff with full jitter between retries of one call
+LLM_RETRY_BASE_SECONDS = max(0.0, _float_env("LLM_RETRY_BASE_SECONDS", 0.5))
+LLM_RETRY_MAX_SECONDS = max(0.0, _float_env("LLM_RETRY_MAX_SECONDS", 8.0))
+
+# Consecutive 429/5xx/timeout replies that open the circuit breaker, and
+# how long calls then fail fast before one probe call is let through
+LLM_BREAKER_FAILURE_THRESHOLD = max(1, _int_env("LLM_BREAKER_FAILURE_THRESHOLD", 5))
+LLM_BREAKER_RESET_SECONDS = max(0.1, _float_env("LLM_BREAKER_RESET_SECONDS", 30.0))
+
+# ============ LLM RESPONSE CACHE ============
+# Replies to identical prompts are served from SQLite instead of the API
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_TTL_SECONDS = max(0.0, _float_env("LLM_CACHE_TTL_SECONDS", 7 * 24 * 3600.0))
+
+# Rows kept before the least recently used ones are evicted
+LLM_CACHE_MAX_ENTRIES = max(1, _int_env("LLM_CACHE_MAX_ENTRIES", 10000))
+
+# ============ RELATED TOPICS ============
+# How long a create request waits for topic extraction once the quiz is ready
+RELATED_TOPICS_BUDGET_SECONDS = max(0.0, _float_env("RELATED_TOPICS_BUDGET_SECONDS", 5.0))
+
+# ============ REQUEST COALESCING ============
+# After this many seconds a crashed worker's generation lease can be taken over
+GENERATION_LEASE_SECONDS = max(1.0, _float_env("GENERATION_LEASE_SECONDS", 300.0))
+
+# ============ BACKGROUND JOBS ============
+# Workers per process running queued generation jobs (0: this process only
+# queues jobs, workers in another process run them)
+JOB_WORKERS = max(0, _int_env("JOB_WORKERS", 2))
+
+# Idle workers check the jobs table this often (new jobs in this process wake them at once)
+JOB_POLL_SECONDS = max(0.1, _float_env("JOB_POLL_SECONDS", 1.0))
+
+# Running jobs refresh their heartbeat this often; one silent for three
+# intervals belongs to a dead worker and is queued again
+JOB_HEARTBEAT_SECONDS = max(1.0, _float_env("JOB_HEARTBEAT_SECONDS", 10.0))
+
+# A job is marked failed after this many runs were interrupted
+JOB_MAX_ATTEMPTS = max(1, _int_env("JOB_MAX_ATTEMPTS", 3))
+
+# ============ ARTICLE FETCHING ============
+# Pooled keep-alive connections shared by all article fetches
+HTTP_MAX_CONNECTIONS = max(1, _int_env("HTTP_MAX_CONNECTIONS", 20))
+
+# Concurrent requests allowed to a single host (be polite to Wikipedia)
+HTTP_PER_HOST_LIMIT = max(1, _int_env("HTTP_PER_HOST_LIMIT", 4))
+
+HTTP_TIMEOUT_SECONDS = max(1.0, _float_env("HTTP_TIMEOUT_SECONDS", 10.0))
+
+# HTML extraction engine: auto (lxml if installed, else stream), lxml, stream or bs4
+HTML_EXTRACTOR = os.getenv("HTML_EXTRACTOR", "auto").lower()
+
+# ============ ARTICLE SOURCE ============
+# Where articles come from by default: http (fetch from Wikipedia) or dump
+# (a local offline dump, see dumpsource.py); requests may pick either
+ARTICLE_SOURCE = os.getenv("ARTICLE_SOURCE", "http").lower()
+
+# Offline dump: a pages-articles-multistream.xml.bz2 or an HTML pack
+WIKI_DUMP_PATH = os.getenv("WIKI_DUMP_PATH", "")
+
+# Its title index (built by dumpsource.py), by default next to the dump
+WIKI_DUMP_INDEX_PATH = os.getenv("WIKI_DUMP_INDEX_PATH", "") or (WIKI_DUMP_PATH + ".idx" if WIKI_DUMP_PATH else "")
+
+# ============ ARTICLE STORAGE ============
+# Keep the full page HTML (compressed) next to the extracted text
+STORE_RAW_HTML = os.getenv("STORE_RAW_HTML", "false").lower() in ("1", "true", "yes")
+
+# ============ QUIZ HISTORY ============
+# Page size of GET /api/quizzes when a client asks for pages without a limit
+HISTORY_PAGE_SIZE = max(1, _int_env("HISTORY_PAGE_SIZE", 20))
+
+# Largest limit a client may request
+HISTORY_MAX_PAGE_SIZE = max(1, _int_env("HISTORY_MAX_PAGE_SIZE", 100))
+
+# ============ DATABASE ============
+# Milliseconds to wait on a locked database before failing with "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = max(0, _int_env("SQLITE_BUSY_TIMEOUT_MS", 5000))
+
+# NORMAL is durable across application crashes in WAL mode (FULL also survives power loss)
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+if SQLITE_SYNCHRONOUS not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+    SQLITE_SYNCHRONOUS = "NORMAL"
+
+# Page cache per connection, in KiB
+SQLITE_CACHE_KB = max(0, _int_env("SQLITE_CACHE_KB", 16384))
+
+# Bytes of the database file read through mmap (0 disables)
+SQLITE_MMAP_BYTES = max(0, _int_env("SQLITE_MMAP_BYTES", 128 * 1024 * 1024))
+
+# Threads that run database work for the async request path (one connection each)
+DB_THREADS = max(1, _int_env("DB_THREADS", 4))
+
+# Prepared statements kept per connection
+SQLITE_STATEMENT_CACHE = max(0, _int_env("SQLITE_STATEMENT_CACHE", 256))
+
+# ============ OBSERVABILITY ============
+# Log level of the backend's own loggers: DEBUG, INFO, WARNING or ERROR
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+# text (one readable line per event) or json (one object per line, for log shippers)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
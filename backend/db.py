@@ -1,21 +1,63 @@
+import asyncio
+import functools
 import sqlite3
 import os
-from datetime import datetime
-from contextlib import contextmanager
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from contextlib import closing, contextmanager
+from config import (
+    DB_THREADS,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_CACHE_KB,
+    SQLITE_MMAP_BYTES,
+    SQLITE_STATEMENT_CACHE,
+    SQLITE_SYNCHRONOUS,
+)
+from logs import get_logger
+
+log = get_logger(__name__)
 
 
 # The path to our SQLite database file
 DB_PATH = os.path.join("/tmp","quizzes.db")
 
 
-def init_db():
+def init_db(force: bool = False) -> bool:
     """
     Initializes the database schema with thread-safe connection.
     This creates the necessary tables if they do not already exist.
+    
+    A file already at SCHEMA_VERSION is left alone after one PRAGMA read,
+    so every schema change must come with a migration (see MIGRATIONS),
+    even if the migration itself has nothing left to do.
+    
+    Args:
+        force: Run the DDL even if the schema version is current
+    
+    Returns:
+        bool: True if the DDL/migrations ran
     """
-    with sqlite3.connect(DB_PATH) as conn:
+    with closing(sqlite3.connect(DB_PATH)) as conn:
+        if not force and conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            _schema_ready.add(DB_PATH)
+            return False
+        
         cursor = conn.cursor()
         
+        # Readers keep working while a writer commits (persists in the file)
+        cursor.execute("PRAGMA journal_mode=WAL")
+        
+        # Workers starting together on a new file take turns: the column
+        # checks below would otherwise race ("duplicate column name")
+        cursor.execute("BEGIN IMMEDIATE")
+        if not force and cursor.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            conn.rollback()
+            _schema_ready.add(DB_PATH)
+            return False
+        
         # Table to store scraped Wikipedia articles and their raw content
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS articles (
@@ -54,28 +96,404 @@ def init_db():
             )
         """)
         
+        # Table mapping every URL variant seen (canonical form, redirect
+        # titles) to the article it resolved to
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS article_aliases (
+                alias TEXT PRIMARY KEY,
+                article_id INTEGER,
+                FOREIGN KEY(article_id) REFERENCES articles(id)
+            )
+        """)
+        
+        # Table of compressed article bodies, stored once per distinct content
+        # (see storage.py)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                hash TEXT PRIMARY KEY,
+                codec TEXT,
+                size INTEGER,
+                stored_size INTEGER,
+                data BLOB
+            )
+        """)
+        
+        # Table to coordinate generation across workers sharing this file
+        # (one row per article URL currently being scraped/generated)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS generation_leases (
+                key TEXT PRIMARY KEY,
+                owner TEXT,
+                expires_at REAL
+            )
+        """)
+        
+        # Background generation jobs (POST /api/quizzes?mode=job), worked
+        # through by the in-process pool in jobs.py
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT NOT NULL,
+                canonical_url TEXT NOT NULL,
+                status TEXT NOT NULL,
+                stage TEXT,
+                quiz_id INTEGER,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                owner TEXT,
+                heartbeat_at REAL,
+                created_at TEXT,
+                updated_at TEXT,
+                FOREIGN KEY (quiz_id) REFERENCES quizzes (id)
+            )
+        """)
+        
+        # LLM quota buckets (ratelimit.py), shared by every worker process
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+                name TEXT PRIMARY KEY,
+                tokens REAL,
+                updated_at REAL
+            )
+        """)
+        
+        # LLM responses by prompt hash (prompt_cache.py)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        
+        # Migration: related topics are generated once per article and stored with it
+        # (rows created before this column existed stay NULL until refreshed)
+        _add_column_if_missing(cursor, "articles", "related_topics", "TEXT")
+        _add_column_if_missing(cursor, "articles", "related_links", "TEXT")
+        _add_column_if_missing(cursor, "articles", "related_updated_at", "TEXT")
+        
+        # Migration: HTTP validators for conditional revalidation (304 checks)
+        _add_column_if_missing(cursor, "articles", "etag", "TEXT")
+        _add_column_if_missing(cursor, "articles", "last_modified", "TEXT")
+        _add_column_if_missing(cursor, "articles", "fetched_at", "TEXT")
+        
+        # Migration: article text/HTML live in blobs; scraped_text/raw_html stay
+        # for older rows until `python storage.py migrate` rewrites them
+        _add_column_if_missing(cursor, "articles", "text_hash", "TEXT")
+        _add_column_if_missing(cursor, "articles", "html_hash", "TEXT")
+        
+        # Migration: section breakdown ({name: text} JSON blob) for per-question excerpts
+        _add_column_if_missing(cursor, "articles", "sections_hash", "TEXT")
+        
+        conn.commit()
+        _run_migrations(conn)
+    
+    _schema_ready.add(DB_PATH)
+    return True
+
+
+# ============ VERSIONED MIGRATIONS ============
+def _migration_1_foreign_key_indexes(cursor):
+    # quizzes are looked up by article on every generate request,
+    # attempts by quiz for scoring history
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_quizzes_article_id ON quizzes(article_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_attempts_quiz_id ON attempts(quiz_id)")
+
+
+def _migration_2_history_indexes(cursor):
+    # History pages walk quizzes.id (primary key) backwards; date filters
+    # narrow by created_at first
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_quizzes_created_at ON quizzes(created_at)")
+
+
+def _migration_3_job_indexes(cursor):
+    # Workers pick the oldest queued job and look for stale running ones;
+    # POSTs reuse an unfinished job for the same article
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_canonical_url ON jobs(canonical_url)")
+
+
+def _migration_4_llm_cache_indexes(cursor):
+    # LRU eviction walks the cache by last use, TTL cleanup by age
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used_at ON llm_cache(last_used_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_created_at ON llm_cache(created_at)")
+
+
+# (version, migration) pairs, applied in order to files below that version
+# (the version is kept in PRAGMA user_version)
+MIGRATIONS = [
+    (1, _migration_1_foreign_key_indexes),
+    (2, _migration_2_history_indexes),
+    (3, _migration_3_job_indexes),
+    (4, _migration_4_llm_cache_indexes),
+]
+
+# Version of a file with the complete current schema
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+# Database paths whose schema this process has checked (see ensure_schema)
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+
+def ensure_schema():
+    """
+    Create or migrate the schema of DB_PATH, once per process.
+    
+    Called when a thread opens its first connection instead of at import,
+    so a cold start that never touches the database (health check) skips
+    it, and the first one that does pays a single PRAGMA read once the
+    file is current.
+    """
+    if DB_PATH in _schema_ready:
+        return
+    
+    with _schema_lock:
+        if DB_PATH in _schema_ready:
+            return
+        try:
+            init_db()
+        except Exception as e:
+            # Expected on read-only environments like Vercel Serverless
+            # (consider Vercel Postgres for persistent storage there)
+            log.warning("Database initialization failed", extra={"error": str(e), "path": DB_PATH})
+            # Do not retry on every new connection
+            _schema_ready.add(DB_PATH)
+
+
+def _run_migrations(conn):
+    """Apply the migrations newer than the file's PRAGMA user_version."""
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    
+    for version, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        cursor = conn.cursor()
+        migrate(cursor)
+        # PRAGMA does not take parameters; version is an int from MIGRATIONS
+        cursor.execute(f"PRAGMA user_version = {int(version)}")
         conn.commit()
+        log.info("Database migrated", extra={"schema_version": version})
+
+
+def _add_column_if_missing(cursor, table: str, column: str, column_type: str):
+    """Add a column to an existing table if an older schema does not have it yet."""
+    columns = [row[1] for row in cursor.execute(f"PRAGMA table_info({table})")]
+    if column not in columns:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+
+def find_article_id(cursor, *urls):
+    """
+    Look up a stored article by any of the given URLs.
+    Each URL is checked against the alias table first, then against
+    articles.url (rows stored before aliases existed).
+    
+    Returns:
+        int: Article id, or None if no URL is known
+    """
+    for url in urls:
+        row = cursor.execute(
+            "SELECT article_id FROM article_aliases WHERE alias = ?",
+            (url,)
+        ).fetchone()
+        if not row:
+            row = cursor.execute(
+                "SELECT id FROM articles WHERE url = ?",
+                (url,)
+            ).fetchone()
+        if row:
+            return row[0]
+    return None
+
+
+def save_article_aliases(cursor, article_id: int, *aliases) -> int:
+    """
+    Record URL variants that resolve to an article.
+    
+    Returns:
+        int: Number of new aliases stored
+    """
+    added = 0
+    for alias in set(aliases):
+        cursor.execute(
+            "INSERT OR IGNORE INTO article_aliases (alias, article_id) VALUES (?, ?)",
+            (alias, article_id)
+        )
+        added += cursor.rowcount
+    return added
+
+
+def save_quiz(cursor, article_id: int, quiz: list, llm_model: str, prompt_version: str = "v1") -> int:
+    """Store a generated quiz for an article and return its id (not committed here)."""
+    cursor.execute(
+        """
+        INSERT INTO quizzes (article_id, quiz_json, llm_model, prompt_version, created_at)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        (
+            article_id,
+            json.dumps(quiz),
+            llm_model,
+            prompt_version,
+            datetime.now(timezone.utc).isoformat()
+        )
+    )
+    return cursor.lastrowid
+
+
+def get_related_topics(cursor, article_id: int):
+    """
+    Load the stored related topics for an article.
+    
+    Returns:
+        dict: {'topics': [...], 'related_links': [...]} or None if never generated
+    """
+    row = cursor.execute(
+        "SELECT related_topics, related_links FROM articles WHERE id = ?",
+        (article_id,)
+    ).fetchone()
+    
+    if not row or row[0] is None:
+        return None
+    
+    return {
+        "topics": json.loads(row[0]),
+        "related_links": json.loads(row[1] or "[]")
+    }
+
+
+def save_related_topics(cursor, article_id: int, related: dict):
+    """Store generated related topics and links next to the article."""
+    cursor.execute(
+        """
+        UPDATE articles
+        SET related_topics = ?, related_links = ?, related_updated_at = ?
+        WHERE id = ?
+        """,
+        (
+            json.dumps(related.get("topics", [])),
+            json.dumps(related.get("related_links", [])),
+            datetime.now(timezone.utc).isoformat(),
+            article_id
+        )
+    )
+
+
+def claim_lease(conn, key: str, owner: str, ttl: float) -> bool:
+    """
+    Try to claim the generation lease for key.
+    An existing lease can only be taken over once it has expired.
+    
+    Returns:
+        bool: True if owner now holds the lease
+    """
+    now = time.time()
+    cursor = conn.execute(
+        """
+        INSERT INTO generation_leases (key, owner, expires_at)
+        VALUES (?, ?, ?)
+        ON CONFLICT(key) DO UPDATE
+        SET owner = excluded.owner, expires_at = excluded.expires_at
+        WHERE generation_leases.expires_at < ?
+        """,
+        (key, owner, now + ttl, now)
+    )
+    conn.commit()
+    return cursor.rowcount == 1
+
+
+def release_lease(conn, key: str, owner: str):
+    """Release the generation lease for key if owner still holds it."""
+    conn.execute(
+        "DELETE FROM generation_leases WHERE key = ? AND owner = ?",
+        (key, owner)
+    )
+    conn.commit()
+
+
+# ============ CONNECTIONS ============
+# One long-lived connection per thread: FastAPI's worker threads reuse it
+# across requests, so pragmas are applied once and sqlite3's per-connection
+# statement cache keeps hot queries prepared
+_local = threading.local()
+_connections = []
+_connections_lock = threading.Lock()
+
+
+def connect(path: str = None) -> sqlite3.Connection:
+    """Open a connection with the performance pragmas applied."""
+    conn = sqlite3.connect(
+        path or DB_PATH,
+        check_same_thread=False,
+        timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+        cached_statements=SQLITE_STATEMENT_CACHE
+    )
+    conn.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+    # Negative cache_size is in KiB rather than pages
+    conn.execute(f"PRAGMA cache_size = -{int(SQLITE_CACHE_KB)}")
+    conn.execute(f"PRAGMA mmap_size = {int(SQLITE_MMAP_BYTES)}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+
+def _thread_connection() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    # DB_PATH can be repointed (benchmarks, tests): reconnect if it moved
+    if conn is not None and _local.path == DB_PATH:
+        return conn
+    
+    ensure_schema()
+    conn = connect(DB_PATH)
+    _local.conn, _local.path, _local.depth = conn, DB_PATH, 0
+    with _connections_lock:
+        _connections.append(conn)
+    return conn
 
 
 @contextmanager
 def get_db():
     """
     Context manager for database connections.
-    Ensures that each thread or request gets its own connection
-    to avoid 'Recursive use of cursors' errors in FastAPI.
+    Each thread gets its own connection (reused across requests) to avoid
+    'Recursive use of cursors' errors in FastAPI. Work left uncommitted
+    when the outermost block exits is rolled back, as closing a fresh
+    connection used to do.
     """
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    conn = _thread_connection()
+    _local.depth += 1
     try:
         yield conn
     finally:
-        conn.close()
+        _local.depth -= 1
+        if _local.depth == 0 and conn.in_transaction:
+            conn.rollback()
 
 
-# Initialize the database schema immediately upon module import
-try:
-    init_db()
-except Exception as e:
-    print(f"⚠️  Database initialization warning: {e}")
-    print("This is expected on read-only environments like Vercel Serverless.")
-    print("Consider using Vercel Postgres for persistent storage.")
+# Async handlers never touch SQLite on the event loop: their queries run here.
+# A dedicated pool keeps DB work from queueing behind other blocking calls
+_db_executor = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix="db")
+
+
+async def run_db(fn, *args, **kwargs):
+    """
+    Run blocking database work on the DB thread pool and await the result.
+    fn opens its own get_db() block (each DB thread reuses its connection).
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, functools.partial(fn, *args, **kwargs))
+
 
+def close_connections():
+    """Close every pooled connection (server shutdown)."""
+    with _connections_lock:
+        for conn in _connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        _connections.clear()
+    _local.__dict__.clear()
@@ -0,0 +1,480 @@
+"""
+Offline article source: reads articles from a local Wikipedia dump
+instead of fetching them, for bulk and air-gapped deployments.
+
+Two dump formats are supported:
+
+- multistream: the official pages-articles-multistream.xml.bz2. It is a
+  series of independent bz2 streams of 100 pages each; a lookup
+  decompresses the one stream holding the page and converts its
+  wikitext to the same title/text/sections shape the scraper returns.
+- html pack: pre-extracted article HTML (saved Wikipedia pages), packed
+  into one file of zlib-compressed pages by the pack-html command and
+  parsed with scraper.parse_wikipedia_html on lookup.
+
+Both are found through a title index: fixed-size records (64-bit title
+hash, byte offset, byte length) sorted by hash and memory-mapped, so a
+lookup is a binary search over the mapped file plus one read, with
+nothing loaded at startup.
+
+Build the index of an official dump (its -index.txt.bz2 lists the
+stream offset of every title):
+    python dumpsource.py index enwiki-multistream.xml.bz2 enwiki-multistream-index.txt.bz2
+Pack a directory of saved pages:
+    python dumpsource.py pack-html pages/ articles.pack
+Look up an article:
+    python dumpsource.py lookup "Photosynthesis" --dump enwiki-multistream.xml.bz2
+
+The index is written next to the dump as <dump>.idx unless --index is given.
+"""
+import argparse
+import asyncio
+import bz2
+import hashlib
+import html
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from urllib.parse import unquote, urlsplit
+from xml.etree import ElementTree
+from config import WIKI_DUMP_PATH, WIKI_DUMP_INDEX_PATH
+from metrics import STAGE_SECONDS
+from scraper import parse_wikipedia_html
+from utils import canonicalize_wikipedia_url
+
+# (title hash, offset, length), big-endian so records sort bytewise by hash
+RECORD = struct.Struct(">QQQ")
+
+# Redirect pages followed before giving up (redirect loops)
+MAX_REDIRECTS = 3
+
+
+def normalize_title(title: str) -> str:
+    """MediaWiki title form: spaces for underscores, first letter upper-case."""
+    title = " ".join(title.replace("_", " ").split())
+    return title[:1].upper() + title[1:]
+
+
+def title_hash(title: str) -> int:
+    return int.from_bytes(hashlib.blake2b(normalize_title(title).encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def title_from_url(url: str) -> str:
+    """Article title of an en.wikipedia.org/wiki/* URL."""
+    return normalize_title(unquote(urlsplit(url).path[len("/wiki/"):]))
+
+
+# ============ TITLE INDEX ============
+def write_index(records, path: str, buckets: int = 256):
+    """
+    Write (title hash, offset, length) records as a sorted index file.
+    
+    Records are spread over bucket files by the top byte of their hash and
+    each bucket is sorted on its own, so the full title list of a dump
+    (tens of millions of entries) never has to fit in memory at once.
+    """
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(path))) as tmp:
+        files = [open(os.path.join(tmp, f"{n:03d}"), "wb") for n in range(buckets)]
+        try:
+            for record in records:
+                files[record[0] >> 56].write(RECORD.pack(*record))
+        finally:
+            for f in files:
+                f.close()
+        
+        with open(path + ".tmp", "wb") as out:
+            for n in range(buckets):
+                with open(os.path.join(tmp, f"{n:03d}"), "rb") as f:
+                    data = f.read()
+                chunks = sorted(data[i:i + RECORD.size] for i in range(0, len(data), RECORD.size))
+                out.write(b"".join(chunks))
+    # Readers never see a half-written index
+    os.replace(path + ".tmp", path)
+
+
+class TitleIndex:
+    """Memory-mapped, hash-sorted title index (see write_index)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self.count = size // RECORD.size
+
+    def _hash_at(self, i: int) -> int:
+        return int.from_bytes(self._map[i * RECORD.size:i * RECORD.size + 8], "big")
+
+    def find(self, title: str) -> list:
+        """[(offset, length), ...] stored under the title's hash (usually one)."""
+        key = title_hash(title)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._hash_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        
+        found = []
+        while lo < self.count and self._hash_at(lo) == key:
+            _, offset, length = RECORD.unpack_from(self._map, lo * RECORD.size)
+            found.append((offset, length))
+            lo += 1
+        return found
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+
+# ============ WIKITEXT ============
+TEMPLATE = re.compile(r"\{\{[^{}]*\}\}")
+LINK = re.compile(r"\[\[([^\[\]|]*)(?:\|([^\[\]]*))?\]\]")
+EXTERNAL_LINK = re.compile(r"\[(?:https?:)?//[^\s\]]+(?:\s([^\]]*))?\]")
+REF = re.compile(r"<ref[^>/]*/>|<ref[^>]*>.*?</ref>", re.S | re.I)
+DROPPED_TAGS = re.compile(r"<(math|gallery|timeline|score|syntaxhighlight|imagemap)[^>]*>.*?</\1>", re.S | re.I)
+COMMENT = re.compile(r"<!--.*?-->", re.S)
+TAG = re.compile(r"</?[a-zA-Z][^>]*>")
+HEADING = re.compile(r"^(={2,6})\s*(.*?)\s*\1\s*$")
+# Link namespaces whose links are media or page metadata, not text
+DROPPED_LINK_PREFIXES = ("file:", "image:", "category:", "media:")
+
+
+def _replace_link(match) -> str:
+    target, label = match.group(1), match.group(2)
+    if target.strip().lower().startswith(DROPPED_LINK_PREFIXES):
+        return ""
+    # Interlanguage links ([[de:Foo]]) carry no text either
+    if re.match(r"^:?[a-z]{2,3}(-[a-z]+)?:", target):
+        return ""
+    return label if label is not None else target.lstrip(":")
+
+
+def wikitext_to_sections(wikitext: str):
+    """
+    Plain text of an article's wikitext, split like the scraper splits HTML.
+    
+    Only prose paragraphs are kept (as the scraper only keeps <p> blocks):
+    templates, tables, lists, references, media and categories are dropped.
+    
+    Returns:
+        (full text, {section name: text}) with an "Introduction" section first
+    """
+    text = COMMENT.sub("", wikitext)
+    text = REF.sub("", text)
+    text = DROPPED_TAGS.sub("", text)
+    
+    # Innermost first, until nested templates and links are all resolved
+    previous = None
+    while previous != text:
+        previous = text
+        text = TEMPLATE.sub("", text)
+    previous = None
+    while previous != text:
+        previous = text
+        text = LINK.sub(_replace_link, text)
+    
+    text = EXTERNAL_LINK.sub(lambda m: m.group(1) or "", text)
+    text = re.sub(r"'{2,}", "", text)
+    text = re.sub(r"__[A-Z]+__", "", text)
+    text = TAG.sub("", text)
+    text = html.unescape(text).replace("\xa0", " ")
+    
+    sections = {"Introduction": []}
+    current = "Introduction"
+    paragraph = []
+    table_depth = 0
+
+    def end_paragraph():
+        if paragraph:
+            joined = " ".join(" ".join(paragraph).split())
+            # Leftovers of removed markup ("( , )", " ." )
+            joined = re.sub(r"\(\s*[,;]?\s*\)", "", joined)
+            joined = re.sub(r"\s+([,.;:])", r"\1", joined).strip()
+            if joined:
+                sections[current].append(joined)
+            paragraph.clear()
+    
+    for line in text.split("\n"):
+        stripped = line.strip()
+        if stripped.startswith("{|"):
+            table_depth += 1
+            end_paragraph()
+            continue
+        if table_depth:
+            if stripped.startswith("|}"):
+                table_depth -= 1
+            continue
+        
+        heading = HEADING.match(stripped)
+        if heading:
+            end_paragraph()
+            # Only h2/h3 start a section, as in the scraper
+            if len(heading.group(1)) <= 3 and heading.group(2):
+                current = heading.group(2)
+                sections.setdefault(current, [])
+            continue
+        
+        if not stripped or stripped[0] in "*#:;|!" or stripped.startswith("----"):
+            end_paragraph()
+            continue
+        paragraph.append(stripped)
+    end_paragraph()
+    
+    section_texts = {name: "\n".join(paragraphs) for name, paragraphs in sections.items() if paragraphs}
+    full_text = "\n\n".join(p for paragraphs in sections.values() for p in paragraphs)
+    return full_text, section_texts
+
+
+def _article(title: str, text: str, section_texts: dict) -> dict:
+    """Article dict in the shape of scraper.parse_wikipedia_html."""
+    return {
+        "title": title,
+        "canonical_url": canonicalize_wikipedia_url("https://en.wikipedia.org/wiki/" + title.replace(" ", "_")),
+        "text": text,
+        "sections": list(section_texts),
+        "section_texts": section_texts,
+        "raw_html": None,
+    }
+
+
+# ============ SOURCES ============
+PAGE_TITLE = re.compile(r"<title>(.*?)</title>")
+
+class MultistreamDumpSource:
+    """Articles from a pages-articles-multistream.xml.bz2 dump."""
+
+    def __init__(self, dump_path: str, index_path: str):
+        self.dump_path = dump_path
+        self.index = TitleIndex(index_path)
+        self._local = threading.local()
+
+    def _read(self, offset: int, length: int) -> bytes:
+        # One file handle per thread: reads seek independently
+        f = getattr(self._local, "file", None)
+        if f is None:
+            f = self._local.file = open(self.dump_path, "rb")
+        f.seek(offset)
+        return f.read(length)
+
+    def _find_page(self, title: str):
+        """(title, redirect target or None, wikitext) of a page, or None."""
+        wanted = normalize_title(title)
+        for offset, length in self.index.find(title):
+            chunk = bz2.decompress(self._read(offset, length)).decode("utf-8")
+            # A stream holds ~100 <page> elements: parse only the wanted one
+            marker = next(
+                (m.start() for m in PAGE_TITLE.finditer(chunk) if html.unescape(m.group(1)) == wanted),
+                None
+            )
+            if marker is None:
+                continue
+            start = chunk.rfind("<page>", 0, marker)
+            end = chunk.find("</page>", marker) + len("</page>")
+            page = ElementTree.fromstring(chunk[start:end])
+            redirect = page.find("redirect")
+            return (
+                page.findtext("title"),
+                redirect.get("title") if redirect is not None else None,
+                page.findtext("revision/text") or ""
+            )
+        return None
+
+    def get(self, title: str):
+        """Article dict for a title (following redirects), or None if it is not in the dump."""
+        for _ in range(MAX_REDIRECTS + 1):
+            page = self._find_page(title)
+            if page is None:
+                return None
+            page_title, redirect, wikitext = page
+            if redirect is None:
+                text, section_texts = wikitext_to_sections(wikitext)
+                return _article(page_title, text, section_texts)
+            title = redirect.split("#", 1)[0]
+        return None
+
+    def close(self):
+        self.index.close()
+
+
+class HtmlPackSource:
+    """Articles from an HTML pack written by pack_html."""
+
+    def __init__(self, pack_path: str, index_path: str):
+        self.pack_path = pack_path
+        self.index = TitleIndex(index_path)
+        self._local = threading.local()
+
+    def get(self, title: str):
+        """Article dict for a title, or None if it is not in the pack."""
+        wanted = normalize_title(title)
+        f = getattr(self._local, "file", None)
+        if f is None:
+            f = self._local.file = open(self.pack_path, "rb")
+        
+        for offset, length in self.index.find(title):
+            f.seek(offset)
+            page = zlib.decompress(f.read(length)).decode("utf-8")
+            url = "https://en.wikipedia.org/wiki/" + wanted.replace(" ", "_")
+            article = parse_wikipedia_html(page, url)
+            # A hash collision would return some other page
+            if normalize_title(article["title"]) == wanted:
+                return article
+        return None
+
+    def close(self):
+        self.index.close()
+
+
+def open_dump_source(dump_path: str, index_path: str = None):
+    """Open a dump: .bz2 files are multistream dumps, anything else an HTML pack."""
+    index_path = index_path or dump_path + ".idx"
+    if not os.path.exists(index_path):
+        raise FileNotFoundError(f"No title index at {index_path}: build it with 'python dumpsource.py'")
+    if dump_path.endswith(".bz2"):
+        return MultistreamDumpSource(dump_path, index_path)
+    return HtmlPackSource(dump_path, index_path)
+
+
+_source = None
+_source_lock = threading.Lock()
+
+
+def get_dump_source():
+    """The dump configured by WIKI_DUMP_PATH, opened on first use (None if not configured)."""
+    global _source
+    if not WIKI_DUMP_PATH:
+        return None
+    with _source_lock:
+        if _source is None:
+            _source = open_dump_source(WIKI_DUMP_PATH, WIKI_DUMP_INDEX_PATH)
+        return _source
+
+
+def load_article(url: str) -> dict:
+    """
+    Blocking lookup of a Wikipedia URL in the configured dump.
+    
+    Raises:
+        LookupError: No dump is configured or the article is not in it
+    """
+    source = get_dump_source()
+    if source is None:
+        raise LookupError("No offline dump configured (set WIKI_DUMP_PATH)")
+    
+    article = source.get(title_from_url(url))
+    if article is None:
+        raise LookupError(f"Article not found in the offline dump: {title_from_url(url)}")
+    article["etag"] = None
+    article["last_modified"] = None
+    return article
+
+
+async def scrape_from_dump(url: str) -> dict:
+    """Async counterpart of scraper.scrape_wikipedia that reads the offline dump."""
+    with STAGE_SECONDS.time(stage="dump_lookup"):
+        return await asyncio.to_thread(load_article, url)
+
+
+# ============ BUILDING ============
+def _multistream_records(dump_path: str, index_txt_path: str):
+    """Index records of an official dump from its offset:page_id:title index file."""
+    dump_size = os.path.getsize(dump_path)
+    opener = bz2.open if index_txt_path.endswith(".bz2") else open
+    
+    group_offset, group_titles = None, []
+    with opener(index_txt_path, "rt", encoding="utf-8") as f:
+        for line in f:
+            offset, _, title = line.rstrip("\n").split(":", 2)
+            offset = int(offset)
+            # Lines come in stream order: a new offset ends the previous stream
+            if offset != group_offset:
+                for t in group_titles:
+                    yield title_hash(t), group_offset, offset - group_offset
+                group_offset, group_titles = offset, []
+            group_titles.append(title)
+    
+    for t in group_titles:
+        yield title_hash(t), group_offset, dump_size - group_offset
+
+
+def build_multistream_index(dump_path: str, index_txt_path: str, index_path: str = None) -> int:
+    """Write the title index of a multistream dump; returns the number of titles."""
+    count = 0
+
+    def counted(records):
+        nonlocal count
+        for record in records:
+            count += 1
+            yield record
+    
+    write_index(counted(_multistream_records(dump_path, index_txt_path)), index_path or dump_path + ".idx")
+    return count
+
+
+def pack_html(directory: str, pack_path: str, index_path: str = None) -> int:
+    """Pack every *.html page of a directory with its title index; returns the page count."""
+    records = []
+    with open(pack_path, "wb") as pack:
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".html"):
+                continue
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                page = f.read()
+            title = parse_wikipedia_html(page, "https://en.wikipedia.org/wiki/" + name[:-len(".html")])["title"]
+            data = zlib.compress(page.encode("utf-8"), 6)
+            records.append((title_hash(title), pack.tell(), len(data)))
+            pack.write(data)
+    
+    write_index(records, index_path or pack_path + ".idx")
+    return len(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    
+    index = sub.add_parser("index", help="build the title index of a multistream dump")
+    index.add_argument("dump", help="pages-articles-multistream.xml.bz2")
+    index.add_argument("index_txt", help="the dump's multistream-index.txt(.bz2)")
+    index.add_argument("--index", help="output path (default <dump>.idx)")
+    
+    pack = sub.add_parser("pack-html", help="pack a directory of saved article pages")
+    pack.add_argument("directory")
+    pack.add_argument("pack", help="output pack file")
+    pack.add_argument("--index", help="output path (default <pack>.idx)")
+    
+    lookup = sub.add_parser("lookup", help="print an article from a dump")
+    lookup.add_argument("title")
+    lookup.add_argument("--dump", default=WIKI_DUMP_PATH, required=not WIKI_DUMP_PATH)
+    lookup.add_argument("--index")
+    
+    args = parser.parse_args()
+    start = time.perf_counter()
+    
+    if args.command == "index":
+        count = build_multistream_index(args.dump, args.index_txt, args.index)
+        print(f"✅ Indexed {count} titles in {time.perf_counter() - start:.1f}s")
+    elif args.command == "pack-html":
+        count = pack_html(args.directory, args.pack, args.index)
+        print(f"✅ Packed {count} pages in {time.perf_counter() - start:.1f}s")
+    else:
+        source = open_dump_source(args.dump, args.index)
+        article = source.get(args.title)
+        elapsed = (time.perf_counter() - start) * 1000
+        if article is None:
+            print(f"❌ Not found: {args.title} ({elapsed:.1f} ms)")
+            raise SystemExit(1)
+        print(f"✅ {article['title']} ({elapsed:.1f} ms): {len(article['text'])} chars, sections: {', '.join(article['sections'])}")
+        print(article["text"][:500])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+"""
+Pluggable HTML extraction engines for Wikipedia article pages.
+
+Every engine reads the same few things from a page and returns them in
+the same shape, so scraper.parse_wikipedia_html can build the article
+dict without caring which parser ran:
+
+    {
+        "title": text of #firstHeading (None if missing),
+        "canonical_href": href of <link rel="canonical"> (None if missing),
+        "blocks": [(tag, text), ...] for the h2/h3/p direct children of
+                  .mw-parser-output inside #mw-content-text (None if missing)
+    }
+
+Current Wikipedia markup wraps section headings in <div class="mw-heading
+mw-heading2"> rather than emitting a bare <h2>; such wrappers are reported
+with the tag of the heading level they hold ("h2"/"h3").
+
+Engines:
+- bs4:    BeautifulSoup + html.parser (the original implementation)
+- lxml:   lxml.html (C parser, optional dependency)
+- stream: stdlib HTMLParser event handler that builds no tree and stops
+          reading once the parser output has closed
+
+Text follows BeautifulSoup's get_text semantics: comments and the
+contents of style/script/template/rt/rp are skipped.
+"""
+import importlib.util
+from html.parser import HTMLParser
+from config import HTML_EXTRACTOR
+
+# bs4 and lxml are imported by their engines on first use, not at startup
+LXML_AVAILABLE = importlib.util.find_spec("lxml") is not None
+
+
+# Block elements collected from the parser output
+BLOCK_TAGS = ("h2", "h3", "p")
+
+# Heading wrapper classes (current skin) and the heading tag they stand for
+HEADING_WRAPPER_CLASSES = {"mw-heading2": "h2", "mw-heading3": "h3"}
+
+# Elements whose text BeautifulSoup's get_text leaves out
+SKIPPED_TEXT_TAGS = {"style", "script", "template", "rt", "rp"}
+
+# Elements html.parser/BeautifulSoup treat as having no end tag
+VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "keygen",
+    "link", "menuitem", "meta", "param", "source", "track", "wbr",
+    "basefont", "bgsound", "command", "frame", "image", "isindex",
+    "nextid", "spacer",
+}
+
+
+def _collapse_whitespace_node(text: str) -> str:
+    """Whitespace-only text nodes become a single space/newline, as in BeautifulSoup."""
+    if text.strip(" \t\n\r\f"):
+        return text
+    return "\n" if "\n" in text else " "
+
+
+def _block_tag(tag: str, classes) -> str:
+    """Block tag a parser-output child counts as, or None if it is skipped."""
+    if tag in BLOCK_TAGS:
+        return tag
+    if tag == "div":
+        for cls in classes or ():
+            if cls in HEADING_WRAPPER_CLASSES:
+                return HEADING_WRAPPER_CLASSES[cls]
+    return None
+
+
+def _join_stripped(chunks) -> str:
+    """Equivalent of get_text(" ", strip=True) over a list of text nodes."""
+    return " ".join(c.strip() for c in chunks if c.strip())
+
+
+# ============ BS4 ENGINE ============
+def extract_bs4(html: str) -> dict:
+    """Original BeautifulSoup/html.parser extraction (builds the full tree)."""
+    from bs4 import BeautifulSoup
+    
+    soup = BeautifulSoup(html, 'html.parser')
+    
+    title_tag = soup.find(id="firstHeading")
+    canonical_tag = soup.find("link", rel="canonical")
+    
+    content_div = soup.find(id="mw-content-text")
+    parser_output = content_div.find(class_="mw-parser-output") if content_div else None
+    
+    blocks = None
+    if parser_output:
+        blocks = []
+        for el in parser_output.children:
+            tag = _block_tag(el.name, el.get("class")) if el.name else None
+            if tag:
+                blocks.append((tag, el.get_text(" ", strip=True)))
+    
+    return {
+        "title": title_tag.get_text() if title_tag else None,
+        "canonical_href": canonical_tag.get("href") if canonical_tag else None,
+        "blocks": blocks,
+    }
+
+
+# ============ LXML ENGINE ============
+def _lxml_text_nodes(el):
+    """Yield the text nodes under an lxml element in document order."""
+    if not isinstance(el.tag, str):
+        # Comments / processing instructions: only their tail is document text
+        return
+    if el.tag in SKIPPED_TEXT_TAGS:
+        return
+    if el.text:
+        yield el.text
+    for child in el:
+        yield from _lxml_text_nodes(child)
+        if child.tail:
+            yield child.tail
+
+
+def extract_lxml(html: str) -> dict:
+    """lxml.html extraction; much faster than bs4 for large pages."""
+    if not LXML_AVAILABLE:
+        raise RuntimeError("lxml is not installed")
+    import lxml.html
+    
+    doc = lxml.html.document_fromstring(html)
+    
+    title_tag = next(iter(doc.xpath('//*[@id="firstHeading"]')), None)
+    
+    canonical_href = None
+    for link in doc.iter("link"):
+        if "canonical" in (link.get("rel") or "").split():
+            canonical_href = link.get("href")
+            break
+    
+    blocks = None
+    content_div = next(iter(doc.xpath('//*[@id="mw-content-text"]')), None)
+    if content_div is not None:
+        parser_output = next(iter(content_div.xpath(
+            './/*[contains(concat(" ", normalize-space(@class), " "), " mw-parser-output ")]'
+        )), None)
+        if parser_output is not None:
+            blocks = []
+            for el in parser_output:
+                if not isinstance(el.tag, str):
+                    continue
+                tag = _block_tag(el.tag, (el.get("class") or "").split())
+                if tag:
+                    blocks.append((tag, _join_stripped(_lxml_text_nodes(el))))
+    
+    title = None
+    if title_tag is not None:
+        title = "".join(_collapse_whitespace_node(t) for t in _lxml_text_nodes(title_tag))
+    
+    return {
+        "title": title,
+        "canonical_href": canonical_href,
+        "blocks": blocks,
+    }
+
+
+# ============ STREAMING ENGINE ============
+class _StreamExtractor(HTMLParser):
+    """
+    Event-based extractor: keeps only a stack of open tag names and the
+    text of the blocks it needs. Tag nesting follows html.parser/bs4 rules
+    (void elements never open, an end tag closes back to its most recent
+    matching start tag), so the result matches the bs4 engine.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack = []
+        self.skip_depth = 0
+        self.pending_data = []
+        
+        self.title = None
+        self.title_chunks = None
+        self.title_depth = None
+        
+        self.canonical_href = None
+        
+        self.content_seen = False
+        self.content_depth = None
+        self.output_depth = None
+        self.output_done = False
+        self.blocks = None
+        
+        self.block_tag = None
+        self.block_chunks = None
+        self.block_depth = None
+
+    def handle_starttag(self, tag, attrs):
+        self._flush_data()
+        attrs = dict(attrs)
+        
+        if tag == "link" and self.canonical_href is None:
+            if "canonical" in (attrs.get("rel") or "").split():
+                self.canonical_href = attrs.get("href")
+        
+        if tag in VOID_TAGS:
+            return
+        
+        self.stack.append(tag)
+        depth = len(self.stack)
+        
+        if tag in SKIPPED_TEXT_TAGS:
+            self.skip_depth += 1
+        
+        if self.title_depth is None and self.title is None and attrs.get("id") == "firstHeading":
+            self.title_depth = depth
+            self.title_chunks = []
+        
+        if not self.content_seen and attrs.get("id") == "mw-content-text":
+            self.content_seen = True
+            self.content_depth = depth
+        elif (
+            self.content_depth is not None
+            and self.output_depth is None
+            and not self.output_done
+            and "mw-parser-output" in (attrs.get("class") or "").split()
+        ):
+            self.output_depth = depth
+            self.blocks = []
+        elif (
+            self.output_depth is not None
+            and depth == self.output_depth + 1
+            and _block_tag(tag, (attrs.get("class") or "").split())
+        ):
+            self.block_tag = _block_tag(tag, (attrs.get("class") or "").split())
+            self.block_depth = depth
+            self.block_chunks = []
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        self._flush_data()
+        if tag not in self.stack:
+            return
+        
+        while self.stack:
+            depth = len(self.stack)
+            closed = self.stack.pop()
+            
+            if closed in SKIPPED_TEXT_TAGS:
+                self.skip_depth -= 1
+            
+            if depth == self.block_depth:
+                self.blocks.append((self.block_tag, _join_stripped(self.block_chunks)))
+                self.block_tag = self.block_depth = self.block_chunks = None
+            if depth == self.title_depth:
+                self.title = "".join(self.title_chunks)
+                self.title_depth = self.title_chunks = None
+            if depth == self.output_depth:
+                self.output_depth = None
+                self.output_done = True
+            if depth == self.content_depth:
+                self.content_depth = None
+            
+            if closed == tag:
+                break
+
+    def handle_comment(self, data):
+        self._flush_data()
+
+    def handle_data(self, data):
+        # Feeding in chunks can split one text node across several calls;
+        # buffer until the next markup event so it is seen as one node
+        self.pending_data.append(data)
+
+    def _flush_data(self):
+        if not self.pending_data:
+            return
+        data = "".join(self.pending_data)
+        self.pending_data = []
+        
+        if self.skip_depth:
+            return
+        if self.title_chunks is not None:
+            self.title_chunks.append(_collapse_whitespace_node(data))
+        if self.block_chunks is not None:
+            self.block_chunks.append(data)
+
+    def finish(self):
+        """Close anything still open at end of input (as bs4 does)."""
+        self._flush_data()
+        while self.stack:
+            self.handle_endtag(self.stack[-1])
+
+
+def extract_stream(html: str, chunk_size: int = 64 * 1024) -> dict:
+    """Streaming extraction: stops reading once the parser output is done."""
+    parser = _StreamExtractor()
+    
+    for start in range(0, len(html), chunk_size):
+        parser.feed(html[start:start + chunk_size])
+        # Title and canonical link sit above the content in Wikipedia pages,
+        # so once all three are found the rest (navboxes, footer) is skipped
+        if parser.output_done and parser.title is not None and parser.canonical_href is not None:
+            break
+    else:
+        parser.close()
+    
+    parser.finish()
+    
+    return {
+        "title": parser.title,
+        "canonical_href": parser.canonical_href,
+        "blocks": parser.blocks,
+    }
+
+
+# ============ ENGINE SELECTION ============
+ENGINES = {
+    "bs4": extract_bs4,
+    "lxml": extract_lxml,
+    "stream": extract_stream,
+}
+
+
+def get_engine(name: str = None):
+    """
+    Return the extraction function for an engine name.
+    "auto" picks lxml when installed and the streaming engine otherwise.
+    """
+    name = (name or HTML_EXTRACTOR).lower()
+    if name == "auto":
+        name = "lxml" if LXML_AVAILABLE else "stream"
+    if name not in ENGINES:
+        raise ValueError(f"Unknown HTML extractor '{name}' (choose from: auto, {', '.join(ENGINES)})")
+    if name == "lxml" and not LXML_AVAILABLE:
+        raise ValueError("HTML extractor 'lxml' requested but lxml is not installed")
+    return ENGINES[name]
+
+
+def extract_page(html: str, engine: str = None) -> dict:
+    """Extract title, canonical link and content blocks with the chosen engine."""
+    return get_engine(engine)(html)
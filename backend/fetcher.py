@@ -0,0 +1,155 @@
+import asyncio
+import importlib.util
+import threading
+from urllib.parse import urlsplit
+from config import HTTP_MAX_CONNECTIONS, HTTP_PER_HOST_LIMIT, HTTP_TIMEOUT_SECONDS
+
+# h2 enables HTTP/2 in httpx when installed. httpx itself is imported with
+# the first client, so requests that never fetch do not load it
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+USER_AGENT = 'WikiQuizGenerator/1.0 (Educational Project; contact: your@email.com)'
+
+
+class FetchResult:
+    """Outcome of a (possibly conditional) GET."""
+
+    def __init__(self, url: str, status_code: int, text: str = None, etag: str = None, last_modified: str = None):
+        self.url = url
+        self.status_code = status_code
+        self.text = text
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status_code == 304
+
+
+class Fetcher:
+    """
+    Pooled keep-alive HTTP client for article fetches.
+    
+    One httpx.AsyncClient (HTTP/2 when the h2 package is installed) is
+    shared by every request, so repeat fetches reuse TCP+TLS connections.
+    Concurrent requests to the same host are capped by a per-host semaphore.
+    
+    The client lives on a private event loop thread. Coroutines on other
+    loops (the FastAPI request path) await it through fetch_async, sync
+    callers go through fetch_sync.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = HTTP_MAX_CONNECTIONS,
+        per_host_limit: int = HTTP_PER_HOST_LIMIT,
+        timeout: float = HTTP_TIMEOUT_SECONDS,
+        transport=None
+    ):
+        self.max_connections = max_connections
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.transport = transport
+        self._client = None
+        self._host_limits = {}
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def _get_client(self) -> "httpx.AsyncClient":
+        if self._client is None:
+            import httpx
+            
+            self._client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE and self.transport is None,
+                headers={"User-Agent": USER_AGENT},
+                timeout=self.timeout,
+                follow_redirects=True,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                ),
+                transport=self.transport
+            )
+        return self._client
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.per_host_limit)
+        return self._host_limits[host]
+
+    async def fetch(self, url: str, etag: str = None, last_modified: str = None) -> FetchResult:
+        """
+        GET url, conditionally if a validator from an earlier fetch is given.
+        
+        Args:
+            url: Page URL
+            etag: ETag stored from the last fetch (sent as If-None-Match)
+            last_modified: Last-Modified stored from the last fetch (sent as If-Modified-Since)
+        
+        Returns:
+            FetchResult: status 304 with no text if the page is unchanged
+        
+        Raises:
+            httpx.HTTPError: On network errors and 4xx/5xx responses
+        """
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        
+        async with self._host_limit(url):
+            response = await self._get_client().get(url, headers=headers)
+        
+        if response.status_code == 304:
+            return FetchResult(str(response.url), 304, etag=etag, last_modified=last_modified)
+        
+        response.raise_for_status()
+        return FetchResult(
+            str(response.url),
+            response.status_code,
+            text=response.text,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified")
+        )
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self._loop.run_forever,
+                    name="fetcher-loop",
+                    daemon=True
+                ).start()
+            return self._loop
+
+    def run(self, coro):
+        """Run a coroutine on the fetcher's event loop and wait for the result."""
+        return asyncio.run_coroutine_threadsafe(coro, self._get_loop()).result()
+
+    async def fetch_async(self, url: str, etag: str = None, last_modified: str = None) -> FetchResult:
+        """Await fetch from any event loop without blocking it."""
+        future = asyncio.run_coroutine_threadsafe(self.fetch(url, etag, last_modified), self._get_loop())
+        return await asyncio.wrap_future(future)
+
+    def fetch_sync(self, url: str, etag: str = None, last_modified: str = None) -> FetchResult:
+        """Blocking wrapper around fetch for the sync request path."""
+        return self.run(self.fetch(url, etag, last_modified))
+
+    def close(self):
+        """Close pooled connections and stop the event loop thread."""
+        if self._loop is None:
+            return
+        if self._client is not None:
+            self.run(self._client.aclose())
+            self._client = None
+        self._host_limits = {}
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop = None
+
+
+# Shared fetcher used by the scraper
+fetcher = Fetcher()
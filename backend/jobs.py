@@ -0,0 +1,288 @@
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from config import JOB_WORKERS, JOB_POLL_SECONDS, JOB_HEARTBEAT_SECONDS, JOB_MAX_ATTEMPTS
+from db import get_db, run_db
+from logs import get_logger
+
+log = get_logger(__name__)
+
+# Job lifecycle: queued -> running -> succeeded | failed
+# (a running job whose worker died goes back to queued)
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+JOB_COLUMNS = "id, url, status, stage, quiz_id, error, attempts, created_at, updated_at"
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _job_dict(row) -> dict:
+    return dict(zip([c.strip() for c in JOB_COLUMNS.split(",")], row))
+
+
+# ============ JOBS TABLE ============
+def create_job(url: str, canonical_url: str):
+    """
+    Queue a generation job for url, unless one for the same article is unfinished.
+    
+    Returns:
+        (job dict, created) - created is False when an existing job was reused
+    """
+    with get_db() as conn:
+        row = conn.execute(
+            f"""
+            SELECT {JOB_COLUMNS} FROM jobs
+            WHERE canonical_url = ? AND status IN (?, ?)
+            ORDER BY id LIMIT 1
+            """,
+            (canonical_url, QUEUED, RUNNING)
+        ).fetchone()
+        if row is not None:
+            return _job_dict(row), False
+        
+        now = _now()
+        cursor = conn.execute(
+            """
+            INSERT INTO jobs (url, canonical_url, status, stage, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (url, canonical_url, QUEUED, QUEUED, now, now)
+        )
+        conn.commit()
+        return get_job(cursor.lastrowid), True
+
+
+def get_job(job_id: int):
+    """Return a job as a dict, or None if it does not exist."""
+    with get_db() as conn:
+        row = conn.execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return _job_dict(row) if row else None
+
+
+def claim_next_job(owner: str):
+    """Mark the oldest queued job as running for owner; (id, url) or None if the queue is empty."""
+    with get_db() as conn:
+        while True:
+            row = conn.execute(
+                "SELECT id, url FROM jobs WHERE status = ? ORDER BY id LIMIT 1",
+                (QUEUED,)
+            ).fetchone()
+            if row is None:
+                return None
+            
+            # The status check makes the claim atomic across workers and processes
+            cursor = conn.execute(
+                """
+                UPDATE jobs
+                SET status = ?, stage = NULL, owner = ?, attempts = attempts + 1,
+                    heartbeat_at = ?, updated_at = ?
+                WHERE id = ? AND status = ?
+                """,
+                (RUNNING, owner, time.time(), _now(), row[0], QUEUED)
+            )
+            conn.commit()
+            if cursor.rowcount == 1:
+                return row
+
+
+def set_job_stage(job_id: int, owner: str, stage: str):
+    """Record the pipeline stage a running job has reached (also a heartbeat)."""
+    with get_db() as conn:
+        conn.execute(
+            "UPDATE jobs SET stage = ?, heartbeat_at = ?, updated_at = ? WHERE id = ? AND owner = ?",
+            (stage, time.time(), _now(), job_id, owner)
+        )
+        conn.commit()
+
+
+def heartbeat_job(job_id: int, owner: str):
+    with get_db() as conn:
+        conn.execute(
+            "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND owner = ?",
+            (time.time(), job_id, owner)
+        )
+        conn.commit()
+
+
+def finish_job(job_id: int, owner: str, quiz_id: int):
+    with get_db() as conn:
+        conn.execute(
+            """
+            UPDATE jobs SET status = ?, stage = 'done', quiz_id = ?, error = NULL, updated_at = ?
+            WHERE id = ? AND owner = ?
+            """,
+            (SUCCEEDED, quiz_id, _now(), job_id, owner)
+        )
+        conn.commit()
+
+
+def fail_job(job_id: int, owner: str, error: str):
+    with get_db() as conn:
+        conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ? AND owner = ?",
+            (FAILED, error, _now(), job_id, owner)
+        )
+        conn.commit()
+
+
+def requeue_job(job_id: int, owner: str):
+    """Hand a job back to the queue (worker shut down); the interrupted run is not counted."""
+    with get_db() as conn:
+        conn.execute(
+            """
+            UPDATE jobs
+            SET status = ?, stage = ?, owner = NULL, attempts = attempts - 1, updated_at = ?
+            WHERE id = ? AND owner = ? AND status = ?
+            """,
+            (QUEUED, QUEUED, _now(), job_id, owner, RUNNING)
+        )
+        conn.commit()
+
+
+def recover_stale_jobs(stale_after: float, max_attempts: int = JOB_MAX_ATTEMPTS) -> int:
+    """
+    Requeue running jobs whose worker stopped sending heartbeats (crash or
+    restart), or fail them once they have been interrupted max_attempts times.
+    
+    Returns:
+        Number of jobs recovered
+    """
+    cutoff = time.time() - stale_after
+    now = _now()
+    
+    with get_db() as conn:
+        failed = conn.execute(
+            """
+            UPDATE jobs SET status = ?, error = ?, owner = NULL, updated_at = ?
+            WHERE status = ? AND heartbeat_at < ? AND attempts >= ?
+            """,
+            (FAILED, "Generation was interrupted too many times", now, RUNNING, cutoff, max_attempts)
+        ).rowcount
+        requeued = conn.execute(
+            """
+            UPDATE jobs SET status = ?, stage = ?, owner = NULL, updated_at = ?
+            WHERE status = ? AND heartbeat_at < ?
+            """,
+            (QUEUED, QUEUED, now, RUNNING, cutoff)
+        ).rowcount
+        conn.commit()
+    
+    if failed or requeued:
+        log.info("Recovered stale jobs", extra={"requeued": requeued, "failed": failed})
+    return failed + requeued
+
+
+# ============ WORKER POOL ============
+class JobWorkerPool:
+    """
+    In-process workers that run queued generation jobs.
+    
+    Every worker loops: claim the oldest queued job, run it through
+    run_job while a heartbeat keeps its claim fresh, record the result.
+    Jobs are claimed through the jobs table, so pools in several uvicorn
+    workers share one queue, and a job left running by a dead process is
+    picked up again once its heartbeat goes stale.
+    """
+
+    def __init__(
+        self,
+        run_job,
+        workers: int = JOB_WORKERS,
+        poll_interval: float = JOB_POLL_SECONDS,
+        heartbeat_interval: float = JOB_HEARTBEAT_SECONDS
+    ):
+        """
+        Args:
+            run_job: Coroutine function (url, report_stage) -> quiz id;
+                report_stage is a coroutine function taking the stage name
+            workers: Number of concurrent workers
+            poll_interval: Seconds an idle worker waits before checking the table again
+            heartbeat_interval: Seconds between heartbeats of a running job
+        """
+        self.run_job = run_job
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self._prefix = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._tasks = []
+        self._wakeup = None
+
+    def start(self):
+        """Start the workers on the running event loop (server startup)."""
+        if self._tasks or self.workers == 0:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.ensure_future(self._worker(n)) for n in range(self.workers)]
+        log.info("Job workers started", extra={"workers": self.workers})
+
+    async def stop(self):
+        """Cancel the workers; jobs they were running go back to the queue."""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def notify(self):
+        """Wake an idle worker (a job was just queued in this process)."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _worker(self, n: int):
+        owner = f"{self._prefix}-{n}"
+        
+        while True:
+            try:
+                await run_db(recover_stale_jobs, self.heartbeat_interval * 3)
+                # Cleared before claiming, so a job queued after this point
+                # is either claimed now or wakes the wait below
+                self._wakeup.clear()
+                job = await run_db(claim_next_job, owner)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning("Job worker could not read the queue", extra={"worker": n, "error": str(e)})
+                job = None
+            
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            
+            await self._run(*job, owner)
+
+    async def _run(self, job_id: int, url: str, owner: str):
+        heartbeat = asyncio.ensure_future(self._heartbeat(job_id, owner))
+
+        async def report_stage(stage: str):
+            await run_db(set_job_stage, job_id, owner, stage)
+        
+        try:
+            log.info("Job started", extra={"job_id": job_id, "url": url})
+            quiz_id = await self.run_job(url, report_stage)
+        except asyncio.CancelledError:
+            await run_db(requeue_job, job_id, owner)
+            raise
+        except Exception as e:
+            # HTTPExceptions from the pipeline carry the user-facing message
+            error = getattr(e, "detail", None) or str(e)
+            await run_db(fail_job, job_id, owner, str(error))
+            log.error("Job failed", extra={"job_id": job_id, "error": str(error)})
+        else:
+            await run_db(finish_job, job_id, owner, quiz_id)
+            log.info("Job finished", extra={"job_id": job_id, "quiz_id": quiz_id})
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(self, job_id: int, owner: str):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            await run_db(heartbeat_job, job_id, owner)
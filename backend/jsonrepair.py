@@ -0,0 +1,421 @@
+"""
+Tolerant parsing of LLM replies.
+
+The model is asked for bare JSON but now and then wraps it in prose or a
+code fence, leaves a trailing comma, quotes with smart or single quotes,
+forgets a comma between items or is cut off mid-reply. Each of those used
+to cost another paid call; here they are repaired locally:
+
+- parse_llm_json extracts the first balanced JSON value of a reply and,
+  if it does not parse as-is, re-tokenises it leniently (see _repair).
+- coerce_question normalises a parsed question (answer to A-D, options
+  given as a dict, key aliases, difficulty case) and validates it
+  against schemas.QuizQuestion.
+
+Both report what they fixed, and failures come with structured errors
+([{"stage" or "field": ..., "message": ...}]), so only replies that
+cannot be recovered are sent again. OutputStats counts the outcomes
+(exposed through GET /api/metrics/llm).
+"""
+import json
+import re
+import threading
+from pydantic import ValidationError
+from schemas import QuizQuestion
+
+ANSWER_LETTERS = ("A", "B", "C", "D")
+
+# Quote characters that may open a string, and those that may close it
+QUOTES = {
+    '"': '"',
+    "'": "'",
+    "“": "”“\"",
+    "”": "”“\"",
+    "‘": "’‘'",
+    "’": "’‘'",
+}
+ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t", "'": "'"}
+LITERALS = {"true": "true", "false": "false", "null": "null", "True": "true", "False": "false", "None": "null"}
+NUMBER = re.compile(r"-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?")
+WORD = re.compile(r"[A-Za-z_$][\w$-]*")
+FENCE = re.compile(r"```[a-zA-Z]*")
+
+# Keys the model sometimes uses instead of the schema's
+KEY_ALIASES = {
+    "correct_answer": "answer",
+    "correctanswer": "answer",
+    "correct": "answer",
+    "choices": "options",
+    "answers": "options",
+    "level": "difficulty",
+    "rationale": "explanation",
+    "reason": "explanation",
+}
+OPTION_PREFIX = re.compile(r"^\s*\(?([A-Da-d])[.):]\s*")
+ANSWER_LETTER = re.compile(r"^\s*(?:option\s*|answer\s*:?\s*)?\(?([A-Da-d])\)?\s*(?:[.):]|$)", re.I)
+
+
+class MalformedOutputError(ValueError):
+    """An LLM reply that could not be recovered; errors says why."""
+
+    def __init__(self, message: str, errors: list):
+        super().__init__(message)
+        self.errors = errors
+
+
+# ============ JSON ============
+def parse_llm_json(content: str):
+    """
+    Parse the first JSON object or array in an LLM reply.
+    
+    Args:
+        content: Raw reply text
+    
+    Returns:
+        (parsed value, [repairs applied]); no repairs for clean JSON
+    
+    Raises:
+        MalformedOutputError: No JSON value could be recovered
+    """
+    repairs = []
+    text = content.strip()
+    if "```" in text:
+        text = FENCE.sub("", text).strip()
+    
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        raise MalformedOutputError("Reply contains no JSON", [
+            {"stage": "extract", "message": "no '{' or '[' in the reply", "excerpt": text[:80]}
+        ])
+    start = min(starts)
+    
+    try:
+        data, end = json.JSONDecoder().raw_decode(text, start)
+        if start > 0 or text[end:].strip():
+            repairs.append("surrounding text")
+        return data, repairs
+    except json.JSONDecodeError:
+        pass
+    
+    repaired, fixes = _repair(text[start:])
+    if start > 0:
+        fixes.insert(0, "surrounding text")
+    try:
+        return json.loads(repaired), fixes
+    except json.JSONDecodeError as e:
+        raise MalformedOutputError(f"Reply is not valid JSON: {e.msg}", [
+            {"stage": "syntax", "message": e.msg, "position": e.pos, "excerpt": repaired[max(0, e.pos - 40):e.pos + 40]}
+        ])
+
+
+def _is_value_end(token: str) -> bool:
+    return token in ("}", "]", "true", "false", "null") or token[0] == '"' or token[0] == "-" or token[0].isdigit()
+
+
+def _next_significant(text: str, i: int) -> int:
+    while i < len(text) and text[i].isspace():
+        i += 1
+    return i
+
+
+def _read_string(text: str, i: int, fixes: list):
+    """Read a string starting at a quote; returns (value, index after it)."""
+    opener = text[i]
+    closers = QUOTES[opener]
+    if opener != '"':
+        fixes.append("quotes")
+    
+    chars = []
+    j = i + 1
+    while j < len(text):
+        ch = text[j]
+        if ch == "\\" and j + 1 < len(text):
+            escape = text[j + 1]
+            if escape == "u" and re.match(r"[0-9a-fA-F]{4}", text[j + 2:j + 6]):
+                chars.append(chr(int(text[j + 2:j + 6], 16)))
+                j += 6
+                continue
+            if escape in ESCAPES:
+                chars.append(ESCAPES[escape])
+            else:
+                fixes.append("invalid escape")
+                chars.append(escape)
+            j += 2
+            continue
+        
+        if ch in closers:
+            # A quote only ends the string where JSON syntax may follow;
+            # anything else is a quote inside the text the model left unescaped
+            k = _next_significant(text, j + 1)
+            if k >= len(text) or text[k] in ",:}]" or ("\n" in text[j + 1:k] and text[k] in QUOTES):
+                return "".join(chars), j + 1
+            fixes.append("unescaped quote")
+        elif ch in "\n\r\t":
+            fixes.append("control character")
+        chars.append(ch)
+        j += 1
+    
+    fixes.append("truncated")
+    return "".join(chars), j
+
+
+def _repair(text: str):
+    """
+    Re-tokenise broken JSON into valid JSON.
+    
+    Fixes smart and single quotes, unescaped quotes and raw newlines in
+    strings, unquoted keys and values, Python literals, comments, trailing
+    and missing commas, mismatched closing brackets, and closes what a
+    truncated reply left open. Stops after the first complete value.
+    
+    Returns:
+        (JSON text, [repairs applied])
+    """
+    tokens = []
+    stack = []
+    fixes = []
+    i = 0
+
+    def add_value(token: str):
+        if stack and tokens and _is_value_end(tokens[-1]):
+            fixes.append("missing comma")
+            tokens.append(",")
+        tokens.append(token)
+    
+    while i < len(text):
+        ch = text[i]
+        
+        if ch.isspace():
+            i += 1
+        elif ch in QUOTES:
+            value, i = _read_string(text, i, fixes)
+            add_value(json.dumps(value, ensure_ascii=False))
+        elif ch in "{[":
+            add_value(ch)
+            stack.append("}" if ch == "{" else "]")
+            i += 1
+        elif ch in "}]":
+            i += 1
+            if not stack:
+                continue
+            if tokens[-1] == ",":
+                fixes.append("trailing comma")
+                tokens.pop()
+            if tokens[-1] == ":":
+                fixes.append("missing value")
+                tokens.append("null")
+            closer = stack.pop()
+            if ch != closer:
+                fixes.append("mismatched bracket")
+            tokens.append(closer)
+            if not stack:
+                break
+        elif ch == ",":
+            i += 1
+            if tokens and tokens[-1] in (",", "{", "["):
+                fixes.append("extra comma")
+                continue
+            tokens.append(",")
+        elif ch == ":":
+            tokens.append(":")
+            i += 1
+        elif text.startswith("//", i):
+            fixes.append("comment")
+            end = text.find("\n", i)
+            i = len(text) if end < 0 else end
+        elif text.startswith("/*", i):
+            fixes.append("comment")
+            end = text.find("*/", i + 2)
+            i = len(text) if end < 0 else end + 2
+        elif NUMBER.match(text, i):
+            number = NUMBER.match(text, i).group()
+            add_value(number)
+            i += len(number)
+        elif WORD.match(text, i):
+            word = WORD.match(text, i).group()
+            i += len(word)
+            if stack and stack[-1] == "}" and text[_next_significant(text, i):].startswith(":"):
+                fixes.append("unquoted key")
+                add_value(json.dumps(word))
+            elif word in LITERALS:
+                if word != LITERALS[word]:
+                    fixes.append("python literal")
+                add_value(LITERALS[word])
+            else:
+                fixes.append("unquoted value")
+                add_value(json.dumps(word))
+        else:
+            # Stray prose or punctuation between tokens
+            fixes.append("stray character")
+            i += 1
+    
+    if stack:
+        fixes.append("truncated")
+        while tokens and tokens[-1] == ",":
+            tokens.pop()
+        if tokens and tokens[-1] == ":":
+            tokens.append("null")
+        tokens.extend(reversed(stack))
+    
+    return "".join(tokens), list(dict.fromkeys(fixes))
+
+
+# ============ QUESTIONS ============
+def normalize_answer(answer, options: list):
+    """
+    The A-D letter of an answer given as a letter in any form ("b", "B)",
+    "Option B", "B) text") or as the text of one of the options.
+    
+    Returns:
+        str: "A".."D", or None if the answer cannot be matched
+    """
+    if not isinstance(answer, str):
+        return None
+    
+    text = answer.strip()
+    if text in ANSWER_LETTERS:
+        return text
+    
+    # Option text first: "A tree" may be an option, not the letter A
+    bare = OPTION_PREFIX.sub("", text).strip().lower()
+    for letter, option in zip(ANSWER_LETTERS, options):
+        if isinstance(option, str) and OPTION_PREFIX.sub("", option).strip().lower() == bare:
+            return letter
+    
+    match = ANSWER_LETTER.match(text)
+    return match.group(1).upper() if match else None
+
+
+def coerce_question(data, difficulty: str = None):
+    """
+    Normalise a parsed question and validate it against QuizQuestion.
+    
+    Args:
+        data: Parsed JSON value for one question
+        difficulty: Expected difficulty of the slot (optional)
+    
+    Returns:
+        (question or None, [errors], [fixes]); errors are
+        {"field": ..., "message": ...} dicts, fixes name what was normalised
+    """
+    fixes = []
+    
+    # A single question wrapped in a list or a {"questions": [...]} object
+    if isinstance(data, dict) and isinstance(data.get("questions"), list) and len(data["questions"]) == 1:
+        data = data["questions"][0]
+        fixes.append("unwrapped")
+    elif isinstance(data, list) and len(data) == 1:
+        data = data[0]
+        fixes.append("unwrapped")
+    
+    if not isinstance(data, dict):
+        return None, [{"field": None, "message": f"expected an object, got {type(data).__name__}"}], fixes
+    
+    question = {}
+    for key, value in data.items():
+        name = str(key).strip().lower()
+        name = KEY_ALIASES.get(name.replace(" ", "_"), name)
+        if name != key:
+            fixes.append("key names")
+        if isinstance(value, str) and value != value.strip():
+            value = value.strip()
+            fixes.append("whitespace")
+        question.setdefault(name, value)
+    
+    options = question.get("options")
+    if isinstance(options, dict):
+        # {"A": "...", ...} or {"a": "..."}: keep the letters as prefixes
+        options = [f"{str(letter).strip().upper()}) {text}" for letter, text in sorted(options.items())]
+        fixes.append("options object")
+    if isinstance(options, list):
+        options = [option.strip() if isinstance(option, str) else option for option in options]
+        question["options"] = options
+    
+    if isinstance(question.get("difficulty"), str):
+        level = question["difficulty"].lower()
+        if level != question["difficulty"]:
+            fixes.append("difficulty case")
+        question["difficulty"] = level
+    
+    if isinstance(options, list) and "answer" in question:
+        letter = normalize_answer(question["answer"], options)
+        if letter is not None and letter != question["answer"]:
+            fixes.append("answer")
+            question["answer"] = letter
+    
+    errors = []
+    try:
+        QuizQuestion(**question)
+    except ValidationError as e:
+        errors = [
+            {"field": ".".join(str(part) for part in error["loc"]), "message": error["msg"]}
+            for error in e.errors()
+        ]
+    
+    if not errors:
+        if len(options) != 4:
+            errors.append({"field": "options", "message": f"expected 4 options, got {len(options)}"})
+        elif not all(option.strip() for option in options):
+            errors.append({"field": "options", "message": "empty option"})
+        if question["answer"] not in ANSWER_LETTERS:
+            errors.append({"field": "answer", "message": f"not one of A-D: {question['answer']!r}"})
+        if difficulty and question["difficulty"] != difficulty:
+            errors.append({"field": "difficulty", "message": f"expected {difficulty}, got {question['difficulty']}"})
+    
+    return (None if errors else question), errors, list(dict.fromkeys(fixes))
+
+
+def format_errors(errors: list) -> str:
+    """One-line summary of structured errors, for logs."""
+    return "; ".join(
+        f"{error.get('field') or error.get('stage') or 'reply'}: {error['message']}" for error in errors
+    )
+
+
+# ============ METRICS ============
+class OutputStats:
+    """Counters of how LLM replies were parsed and validated."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {
+            "json_clean": 0,
+            "json_repaired": 0,
+            "json_failed": 0,
+            "questions_valid": 0,
+            "questions_coerced": 0,
+            "questions_rejected": 0,
+        }
+        self._repairs = {}
+
+    def record_json(self, repairs):
+        """repairs: the list parse_llm_json returned, or None if it raised."""
+        with self._lock:
+            if repairs is None:
+                self._counts["json_failed"] += 1
+                return
+            self._counts["json_repaired" if repairs else "json_clean"] += 1
+            for repair in repairs:
+                self._repairs[repair] = self._repairs.get(repair, 0) + 1
+
+    def record_question(self, question, fixes: list):
+        with self._lock:
+            if question is None:
+                self._counts["questions_rejected"] += 1
+            else:
+                self._counts["questions_coerced" if fixes else "questions_valid"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+            repairs = dict(self._repairs)
+        
+        broken = counts["json_repaired"] + counts["json_failed"]
+        fixable = counts["questions_coerced"] + counts["questions_rejected"]
+        return {
+            **counts,
+            "repairs": repairs,
+            # Share of malformed replies recovered locally instead of re-requested
+            "repair_success_rate": round(counts["json_repaired"] / broken, 3) if broken else 0.0,
+            "coerce_success_rate": round(counts["questions_coerced"] / fixable, 3) if fixable else 0.0,
+        }
@@ -2,35 +2,252 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-from tenacity import retry, stop_after_attempt, wait_fixed
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.prompts import PromptTemplate
+from config import (
+    QUIZ_GENERATION_CONCURRENCY,
+    QUIZ_GENERATION_MODE,
+    QUESTION_CONTEXT_CHARS,
+    GEMINI_RPM,
+    GEMINI_TPM,
+    LLM_OUTPUT_TOKEN_ESTIMATE,
+    RATE_LIMIT_PERSIST,
+    LLM_PROVIDER,
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_TTL_SECONDS,
+    LLM_CACHE_MAX_ENTRIES,
+    LLM_RETRY_BUDGET_RATIO,
+    LLM_RETRY_BUDGET_MIN,
+    LLM_RETRY_BASE_SECONDS,
+    LLM_RETRY_MAX_SECONDS,
+    LLM_BREAKER_FAILURE_THRESHOLD,
+    LLM_BREAKER_RESET_SECONDS,
+)
+from db import run_db
+from jsonrepair import MalformedOutputError, OutputStats, parse_llm_json, coerce_question, format_errors
+from logs import get_logger
+from metrics import (
+    CACHE_LOOKUPS,
+    FALLBACK_GENERATIONS,
+    LLM_CALL_SECONDS,
+    LLM_CALLS_IN_FLIGHT,
+    LLM_RETRIES,
+    STAGE_SECONDS,
+    Gauge,
+)
+from prompt_cache import PromptCache
+from providers import create_provider
+from ratelimit import TokenBucketLimiter, PRIORITY_BACKGROUND
+from resilience import (
+    CircuitBreaker,
+    RetryBudget,
+    ResilienceError,
+    DeadlineExceeded,
+    RetryBudgetExhausted,
+    backoff_delay,
+    clamp_timeout,
+    within_deadline,
+    retrying,
+)
+from sections import select_question_chunks
+import asyncio
 import json
 import os
 import time
 
+log = get_logger(__name__)
+
 # ============ API KEY VERIFICATION ============
-print("\n" + "="*50)
-api_key_check = os.getenv("GOOGLE_API_KEY")
-if api_key_check:
-    masked_key = api_key_check[:10] + "..." + api_key_check[-5:]
-    print(f"✅ GOOGLE_API_KEY LOADED: {masked_key}")
+if LLM_PROVIDER == "gemini":
+    api_key_check = os.getenv("GOOGLE_API_KEY")
+    if api_key_check:
+        masked_key = api_key_check[:10] + "..." + api_key_check[-5:]
+        log.info("GOOGLE_API_KEY loaded", extra={"key": masked_key})
+    else:
+        log.error("GOOGLE_API_KEY not found: add GOOGLE_API_KEY=your_key to the .env file")
 else:
-    print("❌ ERROR: GOOGLE_API_KEY NOT FOUND!")
-    print("   Make sure you have .env file with: GOOGLE_API_KEY=your_key")
-print("="*50 + "\n")
+    log.info("No API key needed", extra={"provider": LLM_PROVIDER})
 
 # ============ LLM INITIALIZATION ============
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash",
-    google_api_key=os.getenv("GOOGLE_API_KEY"),
-    temperature=0.3
+# Gemini or the local stub (LLM_PROVIDER); see providers.py
+llm = create_provider(LLM_PROVIDER)
+
+# Every call waits here for Gemini quota before it is sent
+limiter = TokenBucketLimiter(GEMINI_RPM, GEMINI_TPM, persist=RATE_LIMIT_PERSIST)
+
+# Replies to prompts already answered are reused instead of re-sent
+prompt_cache = PromptCache(LLM_CACHE_TTL_SECONDS, LLM_CACHE_MAX_ENTRIES, enabled=LLM_CACHE_ENABLED)
+
+# How often replies needed local repair (see jsonrepair.py)
+output_stats = OutputStats()
+
+# While Gemini keeps answering 429/5xx or timing out, calls fail fast
+breaker = CircuitBreaker(LLM_BREAKER_FAILURE_THRESHOLD, LLM_BREAKER_RESET_SECONDS)
+
+# Retries of all calls in this process, as a share of the calls made
+retry_budget = RetryBudget(LLM_RETRY_BUDGET_RATIO, LLM_RETRY_BUDGET_MIN)
+
+BREAKER_STATE = Gauge(
+    "wikiquiz_llm_circuit_open",
+    "1 while the LLM circuit breaker is open (failing fast), else 0",
+    function=lambda: int(breaker.state == CircuitBreaker.OPEN)
 )
 
+
+async def _invoke(prompt: str, timeout: float, priority: int = None, kind: str = "question"):
+    """
+    Call the LLM once the rate limiter has granted quota for the prompt.
+    
+    Waiting for quota and the call itself are cut short at the request
+    deadline (resilience.request_deadline), and refused while the circuit
+    breaker is open.
+    
+    Args:
+        prompt: Full prompt text
+        timeout: Request timeout in seconds
+        priority: ratelimit.PRIORITY_* (default: the current task's llm_priority)
+        kind: What the call generates (question, title_question, batch, topics), for metrics
+    
+    Raises:
+        DeadlineExceeded: The request's deadline passed
+        CircuitOpenError: Gemini has been failing; nothing was sent
+    """
+    # Under an outage, fail before queueing for quota
+    breaker.check()
+    
+    # ~4 characters per token, plus the expected answer
+    estimate = len(prompt) // 4 + LLM_OUTPUT_TOKEN_ESTIMATE
+    with STAGE_SECONDS.time(stage="quota_wait"):
+        await within_deadline(limiter.acquire(estimate, priority))
+    
+    breaker.check()
+    retry_budget.record_call()
+    start = time.perf_counter()
+    try:
+        with LLM_CALLS_IN_FLIGHT.track():
+            resp = await within_deadline(llm.ainvoke(prompt, timeout=clamp_timeout(timeout)))
+    except DeadlineExceeded:
+        # Our deadline, not a verdict on Gemini
+        LLM_CALL_SECONDS.observe(time.perf_counter() - start, kind=kind, outcome="deadline")
+        raise
+    except Exception as e:
+        LLM_CALL_SECONDS.observe(time.perf_counter() - start, kind=kind, outcome="error")
+        # Other errors (bad key, bad request) say nothing about an outage:
+        # the breaker stays as it is
+        if _is_outage_error(e):
+            breaker.record_failure()
+        if _is_rate_limit_error(str(e)):
+            await limiter.record_rate_limit_error()
+        raise
+    LLM_CALL_SECONDS.observe(time.perf_counter() - start, kind=kind, outcome="ok")
+    breaker.record_success()
+    
+    # Correct the estimate once the real usage is known
+    usage = getattr(resp, "usage_metadata", None) or {}
+    if usage.get("total_tokens"):
+        await limiter.adjust(usage["total_tokens"] - estimate)
+    return resp
+
+
+async def _invoke_json(
+    prompt: str,
+    timeout: float,
+    priority: int = None,
+    accept=None,
+    use_cache: bool = True,
+    variant: int = 0,
+    kind: str = "question"
+):
+    """
+    Call the LLM with a prompt asking for JSON and return the parsed reply.
+    
+    Replies with prose around the JSON or syntax faults are repaired
+    locally (jsonrepair.parse_llm_json) rather than asked for again.
+    A reply that parses and passes accept is stored in the prompt cache,
+    as the repaired JSON; the same prompt is then answered from the cache
+    without an API call. Rejected or unrecoverable replies are never
+    stored, so a retry asks again.
+    
+    Args:
+        prompt: Full prompt text
+        timeout: Request timeout in seconds
+        priority: ratelimit.PRIORITY_* (default: the current task's llm_priority)
+        accept: Optional check (parsed reply -> bool) a reply must pass to be cached
+        use_cache: False for callers that want a fresh answer every time
+        variant: Distinguishes calls that send the same prompt but need
+                 different answers (e.g. two quiz slots)
+        kind: What the call generates, for metrics (see _invoke)
+    
+    Returns:
+        Parsed JSON reply
+    
+    Raises:
+        MalformedOutputError: No JSON could be recovered from the reply
+    """
+    key = None
+    if use_cache and prompt_cache.enabled:
+        key = PromptCache.key(model_name(), getattr(llm, "temperature", None), prompt, variant)
+        cached = await run_db(prompt_cache.get, key)
+        CACHE_LOOKUPS.inc(cache="llm_response", result="miss" if cached is None else "hit")
+        if cached is not None:
+            return json.loads(cached)
+    
+    resp = await _invoke(prompt, timeout, priority, kind)
+    try:
+        data, repairs = parse_llm_json(resp.content)
+    except MalformedOutputError:
+        output_stats.record_json(None)
+        raise
+    output_stats.record_json(repairs)
+    if repairs:
+        log.debug("Repaired LLM reply locally", extra={"kind": kind, "repairs": ", ".join(repairs)})
+    
+    if key is not None and (accept is None or accept(data)):
+        await run_db(prompt_cache.put, key, model_name(), json.dumps(data, ensure_ascii=False))
+    return data
+
+
+def model_name() -> str:
+    """Model behind the current provider (stored with each generated quiz)."""
+    return getattr(llm, "model_name", "unknown")
+
+
+def rate_limit_stats() -> dict:
+    """Quota settings and waiting-time metrics of the LLM rate limiter."""
+    return limiter.stats()
+
+
+def prompt_cache_stats() -> dict:
+    """Hit/miss counters and size of the LLM response cache."""
+    return prompt_cache.stats()
+
+
+def resilience_stats() -> dict:
+    """Circuit breaker state and retry budget usage of the LLM calls."""
+    return {"circuit_breaker": breaker.stats(), "retry_budget": retry_budget.stats()}
+
+
+def output_repair_stats() -> dict:
+    """How many replies parsed cleanly, were repaired locally or had to be re-requested."""
+    return output_stats.stats()
+
+
+def _accept_question(data, difficulty: str, label: str):
+    """
+    Coerce a parsed reply into a valid question, or None (counted in output_stats).
+    
+    Args:
+        data: Parsed reply
+        difficulty: Difficulty the slot asked for
+        label: What was generated, for the log line
+    """
+    question, errors, fixes = coerce_question(data, difficulty)
+    output_stats.record_question(question, fixes)
+    if question is None:
+        log.warning("Invalid question", extra={"question": label, "errors": format_errors(errors)})
+    return question
+
 # ============ PROMPT TEMPLATE (FROM TEXT) ============
-PROMPT = PromptTemplate(
-    input_variables=["section", "text", "difficulty"],
-    template="""
+# Filled in with str.format: section, text, difficulty
+PROMPT = """
 You are an expert educator.
 
 Create EXACTLY 1 multiple-choice question from the SECTION below.
@@ -56,12 +273,10 @@ JSON:
 SECTION TEXT:
 {text}
 """
-)
 
 # ============ PROMPT TEMPLATE (FROM TITLE - FALLBACK) ============
-PROMPT_FALLBACK = PromptTemplate(
-    input_variables=["title", "difficulty"],
-    template="""
+# Filled in with str.format: title, difficulty
+PROMPT_FALLBACK = """
 You are an expert educator creating educational quiz questions about "{title}".
 
 Create EXACTLY 1 multiple-choice question at {difficulty} level.
@@ -83,12 +298,10 @@ JSON:
   "explanation": "..."
 }}
 """
-)
 
 # ============ PROMPT FOR EXTRACTING RELATED TOPICS ============
-PROMPT_EXTRACT_TOPICS = PromptTemplate(
-    input_variables=["title", "content"],
-    template="""
+# Filled in with str.format: title, content
+PROMPT_EXTRACT_TOPICS = """
 You are an expert content analyst analyzing a Wikipedia article.
 
 Article Title: "{title}"
@@ -125,51 +338,140 @@ JSON Format:
 
 Create proper Wikipedia URLs by replacing spaces with underscores.
 """
-)
+
+# ============ PROMPT TEMPLATE (BATCH - ALL QUESTIONS IN ONE CALL) ============
+# Filled in with str.format: title, text, count, slots
+PROMPT_BATCH = """
+You are an expert educator creating a quiz about "{title}".
+
+Create EXACTLY {count} multiple-choice questions from the ARTICLE TEXT below,
+one for each slot, in this order:
+{slots}
+
+Rules:
+- Use ONLY the ARTICLE TEXT, and for each slot the section it names
+- Each question must cover a different fact
+- Set "section" to the section named in the slot
+- 4 options (A–D)
+- Correct answer must be one of A–D
+- Difficulty of each question MUST match its slot
+- Add a 1–2 line explanation quoting the article
+- Return ONLY valid JSON (no markdown)
+
+JSON:
+{{
+  "questions": [
+    {{
+      "question": "...",
+      "options": ["A) ...", "B) ...", "C) ...", "D) ..."],
+      "answer": "A|B|C|D",
+      "difficulty": "easy|medium|hard",
+      "section": "...",
+      "explanation": "..."
+    }}
+  ]
+}}
+
+ARTICLE TEXT:
+{text}
+"""
+
+# ============ PROMPT TEMPLATE (BATCH FROM TITLE - FALLBACK) ============
+# Filled in with str.format: title, count, slots
+PROMPT_BATCH_FALLBACK = """
+You are an expert educator creating educational quiz questions about "{title}".
+
+Create EXACTLY {count} multiple-choice questions, one for each slot, in this order:
+{slots}
+
+Rules:
+- Questions must be factual about "{title}"
+- Each question must cover a different fact
+- 4 options (A–D)
+- Correct answer must be one of A–D
+- Difficulty of each question MUST match its slot
+- Add a 1–2 line explanation
+- Return ONLY valid JSON (no markdown)
+
+JSON:
+{{
+  "questions": [
+    {{
+      "question": "...",
+      "options": ["A) ...", "B) ...", "C) ...", "D) ..."],
+      "answer": "A|B|C|D",
+      "difficulty": "easy|medium|hard",
+      "section": "{title}",
+      "explanation": "..."
+    }}
+  ]
+}}
+"""
 
 # ============ RETRY DECORATOR FOR ROBUSTNESS ============
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
-def generate_one(section: str, text: str, difficulty: str):
+def _is_transient_error(e: Exception) -> bool:
+    """Retry timeouts and server errors; quota and key errors are handled by the callers."""
+    error_msg = str(e)
+    return not (_is_rate_limit_error(error_msg) or _is_auth_error(error_msg))
+
+
+# Jittered exponential backoff, bounded by the retry budget and the deadline.
+# Only for calls with no retry loop of their own (topics): quiz slots are
+# retried by the rounds in _generate_quiz_*, so retries never multiply
+retry_transient = retrying(
+    attempts=3,
+    retry_if=_is_transient_error,
+    budget=retry_budget,
+    base=LLM_RETRY_BASE_SECONDS,
+    cap=LLM_RETRY_MAX_SECONDS,
+    on_retry=lambda e: LLM_RETRIES.inc(scope="call")
+)
+
+
+async def _back_off(attempt: int):
+    """Wait before re-sending slots after transient errors (jittered, within the deadline)."""
+    await within_deadline(asyncio.sleep(backoff_delay(attempt, LLM_RETRY_BASE_SECONDS, LLM_RETRY_MAX_SECONDS)))
+
+
+async def generate_one(section: str, text: str, difficulty: str, variant: int = 0):
     """
-    Generate a single multiple-choice question with retry logic.
+    Generate a single multiple-choice question (one attempt: the slot
+    rounds of _generate_quiz_per_question retry it).
     
     Args:
         section: Section name or title
         text: The text content to generate question from
         difficulty: easy, medium, or hard
+        variant: Cache variant (slot index), so two slots sending the same
+                 prompt do not get the same cached question
     
     Returns:
-        dict: Question object or None if failed
+        dict: Validated question object or None if the reply was unusable
     """
     try:
-        # Invoke LLM with prompt
-        resp = llm.invoke(
+        # Invoke LLM with prompt (parsed JSON, possibly from the cache)
+        data = await _invoke_json(
             PROMPT.format(
                 section=section,
                 text=text[:2500],
                 difficulty=difficulty
             ),
-            timeout=20
+            timeout=20,
+            accept=lambda data: validate_question(data, difficulty) is not None,
+            variant=variant
         )
-        
-        # Extract and clean response
-        raw = resp.content.strip()
-        if raw.startswith("```"):
-            raw = raw.replace("```json", "").replace("```", "").strip()
-        
-        # Parse JSON
-        return json.loads(raw)
+        return _accept_question(data, difficulty, f"{section} ({difficulty})")
     
-    except json.JSONDecodeError:
-        print(f"⚠️  Failed to parse JSON for {section} ({difficulty})")
+    except MalformedOutputError as e:
+        log.warning("Unparseable question reply", extra={"section": section, "difficulty": difficulty, "errors": format_errors(e.errors)})
         return None
     except Exception as e:
-        print(f"⚠️  Error generating question for {section}: {str(e)}")
-        return None
+        # Raised, so the slot round can retry it and sees quota/key errors
+        log.warning("Question generation failed", extra={"section": section, "difficulty": difficulty, "error": str(e)})
+        raise
 
 # ============ FALLBACK: GENERATE FROM TITLE ============
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
-def generate_one_from_title(title: str, difficulty: str):
+async def generate_one_from_title(title: str, difficulty: str, variant: int = 0):
     """
     Fallback: Generate a single question from just the title.
     Used when article text is too short.
@@ -177,40 +479,36 @@ def generate_one_from_title(title: str, difficulty: str):
     Args:
         title: The Wikipedia article title
         difficulty: easy, medium, or hard
+        variant: Cache variant (slot index); both slots of a difficulty
+                 send the same prompt
     
     Returns:
-        dict: Question object or None if failed
+        dict: Validated question object or None if the reply was unusable
     """
     try:
-        print(f"📝 Using fallback mode: Generating from title '{title}'")
-        
         # Invoke LLM with fallback prompt
-        resp = llm.invoke(
+        data = await _invoke_json(
             PROMPT_FALLBACK.format(
                 title=title,
                 difficulty=difficulty
             ),
-            timeout=20
+            timeout=20,
+            accept=lambda data: validate_question(data, difficulty) is not None,
+            variant=variant,
+            kind="title_question"
         )
-        
-        # Extract and clean response
-        raw = resp.content.strip()
-        if raw.startswith("```"):
-            raw = raw.replace("```json", "").replace("```", "").strip()
-        
-        # Parse JSON
-        return json.loads(raw)
+        return _accept_question(data, difficulty, f"title '{title}' ({difficulty})")
     
-    except json.JSONDecodeError:
-        print(f"⚠️  Failed to parse JSON from title ({difficulty})")
+    except MalformedOutputError as e:
+        log.warning("Unparseable question reply", extra={"title": title, "difficulty": difficulty, "errors": format_errors(e.errors)})
         return None
     except Exception as e:
-        print(f"⚠️  Error generating question from title: {str(e)}")
-        return None
+        log.warning("Question generation from title failed", extra={"title": title, "difficulty": difficulty, "error": str(e)})
+        raise
 
 # ============ EXTRACT RELATED TOPICS FROM CONTENT USING AI ============
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
-def extract_related_topics_from_content(title: str, content: str) -> dict:
+@retry_transient
+async def extract_related_topics_from_content(title: str, content: str, use_cache: bool = True) -> dict:
     """
     Use AI to extract 5 related topics from article content.
     Topics are extracted from actual article content, NOT metadata.
@@ -218,137 +516,429 @@ def extract_related_topics_from_content(title: str, content: str) -> dict:
     Args:
         title: Article title
         content: Full article text
+        use_cache: False to ask the model again instead of reusing a
+                   cached answer (explicit refresh)
     
     Returns:
         dict: {'topics': [5 topics], 'related_links': [5 Wikipedia URLs]}
     """
     try:
-        print(f"🤖 Using AI to extract related topics from '{title}'")
-        
         # Limit content to first 3000 chars for API efficiency
         content_excerpt = content[:3000] if len(content) > 3000 else content
         
-        # Invoke LLM to extract topics
-        resp = llm.invoke(
+        # Invoke LLM to extract topics (runs next to quiz generation,
+        # so it yields quota to the quiz questions)
+        result = await _invoke_json(
             PROMPT_EXTRACT_TOPICS.format(
                 title=title,
                 content=content_excerpt
             ),
-            timeout=20
+            timeout=20,
+            priority=PRIORITY_BACKGROUND,
+            accept=_has_five_topics,
+            use_cache=use_cache,
+            kind="topics"
         )
         
-        # Extract and clean response
-        raw = resp.content.strip()
-        if raw.startswith("```"):
-            raw = raw.replace("```json", "").replace("```", "").strip()
-        
-        # Parse JSON
-        result = json.loads(raw)
-        
         # Validate structure
         if "topics" in result and "wiki_links" in result:
             topics = result.get("topics", [])[:5]
             links = result.get("wiki_links", [])[:5]
             
             if len(topics) >= 5 and len(links) >= 5:
-                print(f"✅ AI extracted 5 related topics from content")
                 return {
                     "topics": topics,
                     "related_links": links
                 }
         
-        print(f"⚠️  Extracted topics but structure invalid")
+        log.warning("Related topics reply has an invalid structure", extra={"title": title})
         return None
         
-    except json.JSONDecodeError:
-        print(f"⚠️  Failed to parse AI-extracted topics JSON")
+    except MalformedOutputError as e:
+        log.warning("Unparseable related topics reply", extra={"title": title, "errors": format_errors(e.errors)})
         return None
     except Exception as e:
-        print(f"⚠️  Error extracting topics: {str(e)}")
-        return None
+        log.warning("Related topics extraction failed", extra={"title": title, "error": str(e)})
+        raise
+
+def _has_five_topics(data) -> bool:
+    return (
+        isinstance(data, dict)
+        and len(data.get("topics") or []) >= 5
+        and len(data.get("wiki_links") or []) >= 5
+    )
 
 # ============ BATCH GENERATION (WITH FALLBACK) - 6 QUESTIONS ============
-def generate_quiz_from_text(text: str, title: str = "Wikipedia Article", retries: int = 3) -> list:
+# 2 questions for each difficulty level, in the order they appear in the quiz
+DIFFICULTIES = ["easy", "easy", "medium", "medium", "hard", "hard"]
+
+
+def plan_excerpts(text: str, title: str, sections: dict = None, budget: int = None) -> list:
+    """
+    Pick the article excerpt each quiz slot is generated from.
+    
+    Args:
+        text: Full Wikipedia article text
+        title: Article title
+        sections: {section name: text} from the scraper (None for articles
+                  stored without a section breakdown; the text is then
+                  treated as one section)
+        budget: Max characters per excerpt (default QUESTION_CONTEXT_CHARS)
+    
+    Returns:
+        list: [(section name, excerpt), ...] aligned with DIFFICULTIES
+    """
+    excerpts = select_question_chunks(title, sections or {title: text}, len(DIFFICULTIES), budget)
+    for (section, excerpt), difficulty in zip(excerpts, DIFFICULTIES):
+        log.debug("Excerpt planned", extra={"difficulty": difficulty, "section": section, "chars": len(excerpt)})
+    return excerpts
+
+
+async def _generate_slot(index: int, difficulty: str, excerpt, title: str, use_fallback: bool):
+    """
+    Generate the question for a single quiz slot.
+    
+    Args:
+        index: Position of the slot in the quiz (0-based)
+        difficulty: easy, medium, or hard
+        excerpt: (section name, excerpt text) planned for this slot
+        title: Article title (for fallback mode)
+        use_fallback: Generate from the title instead of the text
+    
+    Returns:
+        dict: Question object or None if failed
+    """
+    # No excerpt planned for the slot: the title prompt needs none
+    if use_fallback or excerpt is None:
+        return await generate_one_from_title(title=title, difficulty=difficulty, variant=index)
+    
+    section, text = excerpt
+    return await generate_one(
+        section=section,
+        text=text,
+        difficulty=difficulty,
+        variant=index
+    )
+
+
+def _is_rate_limit_error(error_msg: str) -> bool:
+    """Check whether an LLM error message means the quota was exhausted."""
+    return "429" in error_msg or "RESOURCE_EXHAUSTED" in error_msg
+
+
+def _is_auth_error(error_msg: str) -> bool:
+    """Check whether an LLM error message means the API key was rejected."""
+    return "401" in error_msg or "UNAUTHENTICATED" in error_msg
+
+
+def _is_outage_error(e: Exception) -> bool:
+    """Check whether an LLM error counts against the circuit breaker (429, 5xx, timeout)."""
+    if isinstance(e, asyncio.TimeoutError):
+        return True
+    error_msg = str(e)
+    return _is_rate_limit_error(error_msg) or any(
+        marker in error_msg for marker in ("500", "502", "503", "504", "UNAVAILABLE", "DEADLINE_EXCEEDED", "INTERNAL")
+    )
+
+
+def validate_question(data, difficulty: str = None):
+    """
+    Check a generated question against the QuizQuestion schema, after
+    normalising what can be fixed locally (see jsonrepair.coerce_question).
+    
+    Args:
+        data: Parsed JSON object returned by the LLM
+        difficulty: Expected difficulty of the slot (optional)
+    
+    Returns:
+        dict: The normalised question if valid, otherwise None
+    """
+    return coerce_question(data, difficulty)[0]
+
+
+async def _generate_quiz_per_question(
+    excerpts: list,
+    title: str,
+    retries: int,
+    concurrency: int,
+    use_fallback: bool,
+    on_question=None
+) -> list:
+    """
+    Generate the quiz with one LLM call per slot.
+    
+    All slots are sent to the LLM at once, at most concurrency in flight.
+    Each round only re-sends the slots that failed in the previous one,
+    and questions are returned in slot order regardless of completion order
+    (on_question sees them in completion order).
+    """
+    slots = [None] * len(DIFFICULTIES)
+    pending = list(range(len(DIFFICULTIES)))
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    
+    async def run_slot(i):
+        async with semaphore:
+            try:
+                return i, await _generate_slot(i, DIFFICULTIES[i], excerpts[i] if excerpts else None, title, use_fallback)
+            except Exception as e:
+                return i, e
+    
+    for attempt in range(retries):
+        # A round re-sending failed slots is a retry of each of them
+        if attempt > 0 and not retry_budget.allow_retry(len(pending)):
+            raise RetryBudgetExhausted(f"LLM retry budget spent with {len(pending)} question(s) missing")
+        if attempt > 0:
+            LLM_RETRIES.inc(len(pending), scope="slot")
+        
+        log.debug("Generating questions", extra={"pending": len(pending), "fallback": use_fallback, "attempt": attempt + 1})
+        
+        rate_limited = False
+        auth_error = None
+        fatal = None
+        errors = []
+        
+        # Slots are handled as they finish, so each question can be
+        # reported without waiting for the slowest one
+        for finished in asyncio.as_completed([run_slot(i) for i in pending]):
+            i, question = await finished
+            difficulty = DIFFICULTIES[i]
+            
+            # Deadline passed or circuit open: the other slots fail fast too
+            if isinstance(question, ResilienceError):
+                fatal = question
+                continue
+            
+            if isinstance(question, Exception):
+                error_msg = str(question)
+                
+                # API Key issues - no point retrying any slot
+                if _is_auth_error(error_msg):
+                    auth_error = error_msg
+                    continue
+                
+                # Rate limit handling
+                if _is_rate_limit_error(error_msg):
+                    rate_limited = True
+                else:
+                    log.warning("Question slot failed", extra={"slot": i + 1, "difficulty": difficulty, "attempt": attempt + 1, "error": error_msg})
+                    errors.append(error_msg)
+                continue
+            
+            if question and "question" in question:
+                slots[i] = question
+                log.debug("Question generated", extra={"slot": i + 1, "difficulty": difficulty})
+                if on_question is not None:
+                    on_question(i, question)
+        
+        if auth_error:
+            raise Exception(f"API Key Error: {auth_error}")
+        if fatal is not None:
+            raise fatal
+        
+        pending = [i for i, q in enumerate(slots) if q is None]
+        if not pending:
+            break
+        
+        if attempt == retries - 1:
+            if rate_limited:
+                raise Exception("Rate limit exceeded. Free tier: 60 requests/minute. Wait 1-2 minutes and try again.")
+            if errors:
+                raise Exception(f"Failed to generate questions: {errors[-1]}")
+            for i in pending:
+                log.warning("Question slot gave up", extra={"slot": i + 1, "difficulty": DIFFICULTIES[i], "attempts": retries})
+        elif rate_limited:
+            # The limiter has paused the shared bucket; the retry waits there
+            log.warning("Rate limit hit, retrying once the quota has refilled")
+        elif errors:
+            await _back_off(attempt)
+    
+    return [q for q in slots if q is not None]
+
+
+async def generate_batch(excerpts: list, title: str, slots: list, use_fallback: bool) -> dict:
+    """
+    Generate questions for several quiz slots with a single LLM call.
+    
+    Args:
+        excerpts: [(section name, excerpt text), ...] aligned with DIFFICULTIES
+        title: Article title
+        slots: Slot indices (into DIFFICULTIES) to generate
+        use_fallback: Generate from the title instead of the text
+    
+    Returns:
+        dict: {slot index: question} for every question that passed validation
+    """
+    if use_fallback:
+        slot_lines = "\n".join(
+            f"{n}. {DIFFICULTIES[i]}" for n, i in enumerate(slots, start=1)
+        )
+        prompt = PROMPT_BATCH_FALLBACK.format(
+            title=title,
+            count=len(slots),
+            slots=slot_lines
+        )
+    else:
+        slot_lines = "\n".join(
+            f'{n}. {DIFFICULTIES[i]} - from section "{excerpts[i][0]}"'
+            for n, i in enumerate(slots, start=1)
+        )
+        # Each distinct excerpt is sent once, under its section heading
+        chosen = dict.fromkeys(excerpts[i] for i in slots)
+        text = "\n\n".join(f"== {section} ==\n{excerpt}" for section, excerpt in chosen)
+        prompt = PROMPT_BATCH.format(
+            title=title,
+            text=text,
+            count=len(slots),
+            slots=slot_lines
+        )
+    
+    def complete(data):
+        # Only a batch whose every question is valid is worth reusing
+        items = data.get("questions") if isinstance(data, dict) else data
+        return (
+            isinstance(items, list)
+            and len(items) == len(slots)
+            and all(validate_question(item, DIFFICULTIES[i]) for i, item in zip(slots, items))
+        )
+    
+    try:
+        data = await _invoke_json(prompt, timeout=40, accept=complete, kind="batch")
+    except MalformedOutputError as e:
+        log.warning("Unparseable batch reply", extra={"questions": len(slots), "errors": format_errors(e.errors)})
+        return {}
+    
+    items = data.get("questions") if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        log.warning("Batch reply has no question list")
+        return {}
+    
+    # Questions are matched to slots by position
+    result = {}
+    for i, item in zip(slots, items):
+        question = _accept_question(item, DIFFICULTIES[i], f"batch slot #{i+1} ({DIFFICULTIES[i]})")
+        if question:
+            result[i] = question
+    
+    return result
+
+
+async def _generate_quiz_batched(excerpts: list, title: str, retries: int, use_fallback: bool, on_question=None) -> list:
+    """
+    Generate the quiz with one LLM call for all slots.
+    
+    Only the slots whose questions failed validation are sent again,
+    so a partly malformed batch costs one small follow-up call.
+    """
+    slots = [None] * len(DIFFICULTIES)
+    pending = list(range(len(DIFFICULTIES)))
+    
+    for attempt in range(retries):
+        # Charged per re-sent slot, as in _generate_quiz_per_question
+        if attempt > 0 and not retry_budget.allow_retry(len(pending)):
+            raise RetryBudgetExhausted(f"LLM retry budget spent with {len(pending)} question(s) missing")
+        if attempt > 0:
+            LLM_RETRIES.inc(len(pending), scope="slot")
+        
+        log.debug("Generating questions in one batch", extra={"pending": len(pending), "fallback": use_fallback, "attempt": attempt + 1})
+        
+        try:
+            for i, question in (await generate_batch(excerpts, title, pending, use_fallback)).items():
+                slots[i] = question
+                log.debug("Question generated", extra={"slot": i + 1, "difficulty": DIFFICULTIES[i]})
+                if on_question is not None:
+                    on_question(i, question)
+        
+        except ResilienceError:
+            raise
+        except Exception as e:
+            error_msg = str(e)
+            
+            # API Key issues
+            if _is_auth_error(error_msg):
+                raise Exception(f"API Key Error: {error_msg}")
+            
+            # Rate limit handling
+            if _is_rate_limit_error(error_msg):
+                if attempt < retries - 1:
+                    log.warning("Rate limit hit, retrying once the quota has refilled")
+                    continue
+                raise Exception("Rate limit exceeded. Free tier: 60 requests/minute. Wait 1-2 minutes and try again.")
+            
+            # Other errors
+            if attempt == retries - 1:
+                raise Exception(f"Failed to generate questions: {error_msg}")
+            log.warning("Batch attempt failed", extra={"attempt": attempt + 1, "error": error_msg})
+            await _back_off(attempt)
+        
+        pending = [i for i, q in enumerate(slots) if q is None]
+        if not pending:
+            break
+    
+    return [q for q in slots if q is not None]
+
+
+async def generate_quiz_from_text(
+    text: str,
+    title: str = "Wikipedia Article",
+    retries: int = 3,
+    concurrency: int = None,
+    mode: str = None,
+    sections: dict = None,
+    on_question=None
+) -> list:
     """
     Generate a complete quiz from Wikipedia article text.
     Generates 6 questions: 2 easy, 2 medium, 2 hard
+    Each question is generated from its own excerpt (see sections.py).
     Falls back to title-based generation if text is too short.
     
     Args:
         text: Full Wikipedia article text
         title: Article title (for fallback mode)
-        retries: Number of retry attempts (default 3)
+        sections: {section name: text} breakdown of the article (optional)
+        retries: Number of retry attempts per slot (default 3)
+        concurrency: Max slots in flight in "single" mode (default QUIZ_GENERATION_CONCURRENCY)
+        mode: "single" (one call per question) or "batch" (one call per quiz),
+              default QUIZ_GENERATION_MODE
+        on_question: Optional callback (slot index, question) called as soon
+              as each question is accepted, before the whole quiz is done
     
     Returns:
         list: Array of 6 quiz questions (2 easy, 2 medium, 2 hard)
     """
     
-    quiz = []
-    # 2 questions for each difficulty level
-    difficulties = ["easy", "easy", "medium", "medium", "hard", "hard"]
+    if concurrency is None:
+        concurrency = QUIZ_GENERATION_CONCURRENCY
+    if mode is None:
+        mode = QUIZ_GENERATION_MODE
+    
     use_fallback = False
     
     # Check if text is too short
     if not text or len(text) < 500:
-        print(f"⚠️  Text too short ({len(text)} chars). Switching to title-based generation.")
+        log.warning("Text too short, generating from the title", extra={"title": title, "chars": len(text or "")})
         use_fallback = True
+        FALLBACK_GENERATIONS.inc()
     
-    # Try to generate 6 questions (2 easy, 2 medium, 2 hard)
-    for i, difficulty in enumerate(difficulties):
-        for attempt in range(retries):
-            try:
-                if use_fallback:
-                    # Use fallback: generate from title
-                    print(f"🤖 Generating {difficulty} question #{i+1} from title (attempt {attempt + 1}/{retries})...")
-                    
-                    question = generate_one_from_title(
-                        title=title,
-                        difficulty=difficulty
-                    )
-                else:
-                    # Use normal: generate from text
-                    print(f"🤖 Generating {difficulty} question #{i+1} (attempt {attempt + 1}/{retries})...")
-                    
-                    question = generate_one(
-                        section=f"Section {i+1}",
-                        text=text,
-                        difficulty=difficulty
-                    )
-                
-                if question and "question" in question:
-                    quiz.append(question)
-                    print(f"✅ Generated {difficulty} question")
-                    break
-                else:
-                    if attempt == retries - 1:
-                        print(f"⚠️  Failed to generate {difficulty} question after {retries} attempts")
-            
-            except Exception as e:
-                error_msg = str(e)
-                
-                # Rate limit handling
-                if "429" in error_msg or "RESOURCE_EXHAUSTED" in error_msg:
-                    if attempt < retries - 1:
-                        print(f"⏱️  Rate limit hit. Waiting before retry...")
-                        time.sleep(5)
-                        continue
-                    else:
-                        raise Exception("Rate limit exceeded. Free tier: 60 requests/minute. Wait 1-2 minutes and try again.")
-                
-                # API Key issues
-                elif "401" in error_msg or "UNAUTHENTICATED" in error_msg:
-                    raise Exception(f"API Key Error: {error_msg}")
-                
-                # Other errors
-                else:
-                    if attempt < retries - 1:
-                        print(f"⚠️  Attempt {attempt + 1} failed: {error_msg}")
-                        continue
-                    else:
-                        raise Exception(f"Failed to generate questions: {error_msg}")
+    excerpts = None
+    if not use_fallback:
+        # A batch prompt carries every excerpt, so each one gets half the budget
+        budget = QUESTION_CONTEXT_CHARS // 2 if mode == "batch" else QUESTION_CONTEXT_CHARS
+        # Ranking is CPU work: keep it off the event loop
+        excerpts = await asyncio.to_thread(plan_excerpts, text, title, sections, budget)
+        if not excerpts:
+            # Only markup or whitespace: nothing to pick excerpts from
+            log.warning("No usable excerpts, generating from the title", extra={"title": title})
+            use_fallback = True
+            FALLBACK_GENERATIONS.inc()
+    
+    if mode == "batch":
+        quiz = await _generate_quiz_batched(excerpts, title, retries, use_fallback, on_question)
+    else:
+        quiz = await _generate_quiz_per_question(excerpts, title, retries, concurrency, use_fallback, on_question)
     
     if len(quiz) < 6:
         raise ValueError(f"Generated only {len(quiz)} questions (need at least 6: 2 easy, 2 medium, 2 hard)")
     
-    print(f"✅ Quiz complete: {len(quiz)} questions generated (2 easy, 2 medium, 2 hard)")
-    return quiz
\ No newline at end of file
+    log.info("Quiz generated", extra={"title": title, "questions": len(quiz), "mode": mode, "fallback": use_fallback})
+    return quiz
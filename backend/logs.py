@@ -0,0 +1,100 @@
+"""
+Structured, level-controlled logging.
+
+Every module logs through get_logger(__name__) into the "wikiquiz" logger
+tree, which is configured once from LOG_LEVEL and LOG_FORMAT:
+
+    text: 2026-01-01 12:00:00 INFO    llm: Question generated slot=1 difficulty=easy
+    json: {"ts": "...", "level": "info", "logger": "llm", "msg": "Question generated", "slot": 1, ...}
+
+Context goes into extra={...} rather than into the message, so messages
+stay constant and the fields can be filtered and aggregated on.
+"""
+import json
+import logging
+import sys
+import threading
+from config import LOG_LEVEL, LOG_FORMAT
+
+ROOT = "wikiquiz"
+
+# Attributes every LogRecord has; anything else was passed through extra
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+_configured = False
+_lock = threading.Lock()
+
+
+def _fields(record: logging.LogRecord) -> dict:
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS}
+
+
+def _short_name(record: logging.LogRecord) -> str:
+    return record.name[len(ROOT) + 1:] if record.name.startswith(ROOT + ".") else record.name
+
+
+def _text_value(value) -> str:
+    text = str(value)
+    return json.dumps(text, ensure_ascii=False) if not text or any(c.isspace() or c == '"' for c in text) else text
+
+
+class TextFormatter(logging.Formatter):
+    """One line per event: time, level, logger, message, then key=value fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = (
+            f"{self.formatTime(record, '%Y-%m-%d %H:%M:%S')} {record.levelname:<7} "
+            f"{_short_name(record)}: {record.getMessage()}"
+        )
+        fields = _fields(record)
+        if fields:
+            line += " " + " ".join(f"{key}={_text_value(value)}" for key, value in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per event, with the extra fields at the top level."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname.lower(),
+            "logger": _short_name(record),
+            "msg": record.getMessage(),
+            **_fields(record),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_logging(level: str = None, fmt: str = None):
+    """
+    (Re)configure the backend's loggers.
+    
+    Args:
+        level: Log level name (default LOG_LEVEL)
+        fmt: "text" or "json" (default LOG_FORMAT)
+    """
+    global _configured
+    with _lock:
+        root = logging.getLogger(ROOT)
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(JsonFormatter() if (fmt or LOG_FORMAT) == "json" else TextFormatter())
+        root.addHandler(handler)
+        root.setLevel(getattr(logging, (level or LOG_LEVEL).upper(), logging.INFO))
+        # Own handler: uvicorn's logging config neither duplicates nor drops these
+        root.propagate = False
+        _configured = True
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger of a backend module (pass __name__)."""
+    if not _configured:
+        configure_logging()
+    return logging.getLogger(f"{ROOT}.{name}")
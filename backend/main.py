@@ -1,23 +1,63 @@
+import asyncio
 import json
+import time
 from datetime import datetime, timezone
-from typing import List
-from fastapi import FastAPI
+from typing import List, Optional, Union
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from db import get_db
-from schemas import QuizRequest, QuizResponse, AttemptRequest, QuizHistoryItem
-from scraper import scrape_wikipedia
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from config import (
+    ARTICLE_SOURCE,
+    WIKI_DUMP_PATH,
+    RELATED_TOPICS_BUDGET_SECONDS,
+    GENERATION_LEASE_SECONDS,
+    GENERATION_DEADLINE_SECONDS,
+    HISTORY_PAGE_SIZE,
+    HISTORY_MAX_PAGE_SIZE,
+)
+from db import (
+    get_db,
+    run_db,
+    close_connections,
+    find_article_id,
+    save_article_aliases,
+    get_related_topics,
+    save_related_topics,
+    save_quiz,
+)
+from schemas import QuizRequest, QuizResponse, AttemptRequest, QuizHistoryItem, QuizHistoryPage, JobStatus
+from scraper import scrape_wikipedia, revalidate_wikipedia
+from dumpsource import scrape_from_dump
+from singleflight import SingleFlight, run_with_lease
+from resilience import ResilienceError, CircuitOpenError, DeadlineExceeded, deadline_scope
+from jobs import JobWorkerPool, create_job, get_job
+from logs import get_logger
+from metrics import (
+    CACHE_LOOKUPS,
+    FAIL_FAST,
+    GENERATIONS_IN_FLIGHT,
+    HTTP_REQUEST_SECONDS,
+    STAGE_SECONDS,
+    render as render_metrics,
+)
+from storage import store_article_content, save_article, get_article_text, get_article_sections
 from utils import (
     validate_wikipedia_url,
+    canonicalize_wikipedia_url,
     http_422,
     http_404,
     http_500,
+    http_503,
+    http_504,
     score_attempt,
 )
 from quiz import build_quiz_from_text, get_related_topics_from_content
-from llm import extract_related_topics_from_content
+from llm import rate_limit_stats, prompt_cache_stats, output_repair_stats, resilience_stats, model_name
 
 app = FastAPI(title="AI Wiki Quiz Generator")
 
+log = get_logger(__name__)
+
 # ========================
 # CORS Configuration
 # ========================
@@ -35,43 +75,238 @@ app.add_middleware(
 # ========================
 
 @app.get("/", operation_id="health_check")
-def health():
+async def health():
     return {
         "status": "running",
         "message": "Backend is alive 🚀",
         "version": "1.0"
     }
 
+
+@app.get("/api/metrics/llm", operation_id="llm_metrics")
+async def llm_metrics():
+    """
+    Gemini quota waiting times per priority, response cache hit rates,
+    reply repairs, circuit breaker state and retry budget.
+    """
+    # The cache size is a COUNT(*) on the shared table
+    cache = await run_db(prompt_cache_stats)
+    return {
+        **rate_limit_stats(),
+        "prompt_cache": cache,
+        "output_repair": output_repair_stats(),
+        **resilience_stats(),
+    }
+
+# ========================
+# Prometheus Metrics
+# ========================
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    """
+    Time every request by route template (/api/quizzes/{quiz_id}, not the
+    raw path, so the label set stays small). Streaming responses are
+    timed until their headers are sent.
+    """
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status
+        )
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Stage latencies, LLM calls, cache hits and in-flight work, for Prometheus to scrape."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+# ========================
+# Related Topics (Background)
+# ========================
+
+# Topic extraction runs as a task next to quiz generation instead of after it.
+# Tasks are referenced here until done so a request returning early does not
+# let them be garbage-collected mid-flight
+topics_tasks = set()
+
+
+def _store_related_topics(article_id: int, related: dict):
+    with STAGE_SECONDS.time(stage="db_write"), get_db() as conn:
+        save_related_topics(conn.cursor(), article_id, related)
+        conn.commit()
+
+
+async def _extract_and_store_related_topics(article_id: int, title: str, text: str) -> dict:
+    """Extract related topics in the background and store complete results."""
+    # Outlives the request that started it, so it gets a deadline of its own
+    with deadline_scope(GENERATION_DEADLINE_SECONDS):
+        related = await get_related_topics_from_content(title, text)
+    
+    if related.get("topics"):
+        await run_db(_store_related_topics, article_id, related)
+    
+    return related
+
+
+def start_related_topics(article_id: int, title: str, text: str) -> asyncio.Task:
+    """Start topic extraction as a background task."""
+    task = asyncio.ensure_future(_extract_and_store_related_topics(article_id, title, text))
+    topics_tasks.add(task)
+    task.add_done_callback(topics_tasks.discard)
+    return task
+
+
+async def wait_for_related_topics(task, timeout: float) -> dict:
+    """
+    Wait for a background topic extraction, but never longer than timeout.
+    A late result is still stored by the task and served on the next read.
+    """
+    try:
+        # shield: timing out here must not cancel the extraction itself
+        return await asyncio.wait_for(asyncio.shield(task), timeout)
+    except asyncio.TimeoutError:
+        log.warning("Related topics not ready, returning quiz without them", extra={"timeout": timeout})
+    except Exception as e:
+        log.warning("Related topics extraction failed", extra={"error": str(e)})
+    
+    return {"topics": [], "related_links": []}
+
+# ========================
+# Request Coalescing
+# ========================
+
+# One pipeline run per article URL at a time in this process
+generation_flights = SingleFlight()
+
 # ========================
 # Quiz History
 # ========================
 
-@app.get("/api/quizzes", response_model=List[QuizHistoryItem], operation_id="list_quizzes")
-def list_quizzes():
-    """Retrieve all previously generated quizzes from database"""
+def _parse_history_date(name: str, value: str) -> str:
+    """Normalize a since/until filter to the UTC ISO format created_at is stored in."""
     try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        http_422(f"Invalid '{name}' date. Use ISO format, e.g. 2024-05-01 or 2024-05-01T12:00:00+00:00.")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).isoformat()
+
+
+@app.get(
+    "/api/quizzes",
+    response_model=Union[QuizHistoryPage, List[QuizHistoryItem]],
+    operation_id="list_quizzes"
+)
+async def list_quizzes(
+    limit: Optional[int] = Query(None, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    after_id: Optional[int] = Query(None, ge=1),
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    title: Optional[str] = None
+):
+    """
+    Retrieve previously generated quizzes, newest first.
+    
+    Pages are keyset-based: pass the previous page's next_after_id as
+    after_id to continue below it. Optional filters:
+    - since / until: created_at range (ISO date or datetime; until is exclusive)
+    - title: case-insensitive substring of the article title
+    
+    Without limit, after_id or a filter the response is the plain list of
+    every quiz, as older clients expect.
+    """
+    paged = any(v is not None for v in (limit, after_id, since, until, title))
+    
+    conditions = []
+    params = []
+    if after_id is not None:
+        conditions.append("q.id < ?")
+        params.append(after_id)
+    if since:
+        conditions.append("q.created_at >= ?")
+        params.append(_parse_history_date("since", since))
+    if until:
+        conditions.append("q.created_at < ?")
+        params.append(_parse_history_date("until", until))
+    if title:
+        escaped = title.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        conditions.append("a.title LIKE ? ESCAPE '\\'")
+        params.append(f"%{escaped}%")
+    
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    
+    # One extra row tells whether another page follows
+    page_size = limit or HISTORY_PAGE_SIZE
+    limit_clause = "LIMIT ?" if paged else ""
+    if paged:
+        params.append(page_size + 1)
+    
+    def query():
         with get_db() as conn:
-            cursor = conn.cursor()
-            rows = cursor.execute("""
+            return conn.execute(f"""
                 SELECT q.id, a.title, a.url, q.created_at
                 FROM quizzes q
                 JOIN articles a ON q.article_id = a.id
+                {where}
                 ORDER BY q.id DESC
-            """).fetchall()
-            
-            return [
-                {"id": r[0], "title": r[1], "url": r[2], "created_at": r[3]}
-                for r in rows
-            ]
+                {limit_clause}
+            """, params).fetchall()
+    
+    try:
+        rows = await run_db(query)
     except Exception as e:
         http_500(f"Failed to retrieve quizzes: {str(e)}")
+    
+    items = [
+        {"id": r[0], "title": r[1], "url": r[2], "created_at": r[3]}
+        for r in rows
+    ]
+    
+    if not paged:
+        return items
+    
+    has_more = len(items) > page_size
+    items = items[:page_size]
+    return {
+        "items": items,
+        "next_after_id": items[-1]["id"] if has_more else None
+    }
 
 # ========================
 # Generate Quiz (Main Endpoint)
 # ========================
 
+ARTICLE_SOURCES = ("http", "dump")
+
+
+def _validate_request(payload: QuizRequest):
+    """Step 1: validate the URL and settle the article source (422 otherwise)."""
+    if not validate_wikipedia_url(payload.url):
+        http_422("Invalid URL. Only en.wikipedia.org/wiki/* URLs are supported.")
+    
+    payload.source = (payload.source or ARTICLE_SOURCE).lower()
+    if payload.source not in ARTICLE_SOURCES:
+        http_422(f"Invalid source. Use one of: {', '.join(ARTICLE_SOURCES)}.")
+    if payload.source == "dump" and not WIKI_DUMP_PATH:
+        http_422("The offline dump source is not configured (WIKI_DUMP_PATH).")
+
+
 @app.post("/api/quizzes", operation_id="create_quiz")
-def generate_quiz(payload: QuizRequest):
+async def generate_quiz(
+    payload: QuizRequest,
+    mode: Optional[str] = Query(None, description="'job' to queue the generation and return 202 with a job")
+):
     """
     Generate a quiz from a Wikipedia article URL.
     
@@ -81,265 +316,695 @@ def generate_quiz(payload: QuizRequest):
     - 5 related Wikipedia links (AI-generated)
     
     Process:
-    1. Validate the Wikipedia URL
-    2. Check if article is cached (avoid re-scraping)
+    1. Validate the Wikipedia URL and the article source
+    2. Check if article is cached under any known URL variant (avoid re-scraping)
     3. Check if quiz is cached (avoid re-generation)
-    4. If needed: Scrape article
+    4. If needed: Scrape article (or read it from the offline dump with
+       source "dump", see dumpsource.py)
     5. If needed: Generate quiz via Gemini AI
-    6. Use AI to extract related topics from article content
-    7. Cache result in database
+    6. Use AI to extract related topics from article content (once per article),
+       in parallel with step 5
+    7. Cache result in database (topics wait at most RELATED_TOPICS_BUDGET_SECONDS)
     8. Return quiz + AI-extracted related topics + links to frontend
+    
+    With ?mode=job the request returns 202 with a job right after step 1;
+    a background worker runs the rest and GET /api/jobs/{id} reports its
+    progress and, once it succeeded, the quiz id.
     """
     
-    # Step 1: Validate URL
-    if not validate_wikipedia_url(payload.url):
-        http_422("Invalid URL. Only en.wikipedia.org/wiki/* URLs are supported.")
+    # Step 1: Validate URL and source
+    _validate_request(payload)
     
-    try:
-        with get_db() as conn:
-            cursor = conn.cursor()
-            
-            # ========== STEP 2: Check Article Cache ==========
-            article = cursor.execute(
-                "SELECT id, title, scraped_text FROM articles WHERE url = ?",
-                (payload.url,)
-            ).fetchone()
-            
-            if article:
-                article_id, title, text = article
-                print(f"✅ Using cached article: {title}")
-            else:
-                # ========== STEP 4: Scrape Article ==========
-                try:
-                    print(f"🔄 Scraping: {payload.url}")
-                    scraped = scrape_wikipedia(payload.url)
-                    
-                    cursor.execute(
-                        """
-                        INSERT INTO articles (url, title, scraped_text, raw_html, created_at)
-                        VALUES (?, ?, ?, ?, ?)
-                        """,
-                        (
-                            payload.url,
-                            scraped["title"],
-                            scraped["text"],
-                            scraped["raw_html"],
-                            datetime.now(timezone.utc).isoformat()
-                        )
-                    )
-                    conn.commit()
-                    
-                    article_id = cursor.lastrowid
-                    title = scraped["title"]
-                    text = scraped["text"]
-                    print(f"✅ Article scraped: {title}")
-                    
-                except Exception as e:
-                    error_msg = str(e)
-                    if "timeout" in error_msg.lower():
-                        http_500("Wikipedia request timed out. Please try again.")
-                    else:
-                        http_500(f"Scraping failed: {error_msg}")
+    # Concurrent requests for the same article share one pipeline run:
+    # in this process via single-flight, across workers via the DB lease
+    canonical_url = canonicalize_wikipedia_url(payload.url)
+    
+    if mode == "job":
+        # Queued jobs store only the URL and always use ARTICLE_SOURCE
+        if payload.source != ARTICLE_SOURCE:
+            http_422(f"Jobs use the configured source ({ARTICLE_SOURCE}); leave source out.")
+        job, created = await run_db(create_job, payload.url, canonical_url)
+        if created:
+            job_pool.notify()
+        return JSONResponse(
+            status_code=202,
+            content=job,
+            headers={"Location": f"/api/jobs/{job['id']}"}
+        )
+    if mode is not None:
+        http_422("Invalid mode. Use 'job' or leave it out.")
+    
+    return await _run_generation(payload, canonical_url)
+
+
+async def _run_generation(payload: QuizRequest, canonical_url: str, on_stage=None):
+    """
+    Run the pipeline for a validated request, coalesced with others for the same article.
+    
+    The deadline starts here, so time spent waiting for another worker's
+    lease counts against it too (504 when it passes).
+    """
+    with deadline_scope(GENERATION_DEADLINE_SECONDS):
+        try:
+            if await run_db(_is_fully_cached, canonical_url, payload.url):
+                return await _generate_quiz_pipeline(payload, on_stage)
             
-            # ========== STEP 3: Check Quiz Cache ==========
-            quiz_row = cursor.execute(
-                "SELECT id, quiz_json FROM quizzes WHERE article_id = ?",
-                (article_id,)
-            ).fetchone()
+            # The coalesced task keeps the first caller's deadline; later
+            # callers started after it, so theirs is never earlier
+            return await generation_flights.do(
+                canonical_url,
+                lambda: run_with_lease(
+                    canonical_url,
+                    lambda: _generate_quiz_pipeline(payload, on_stage),
+                    ttl=GENERATION_LEASE_SECONDS
+                )
+            )
+        except DeadlineExceeded as e:
+            _raise_resilience_error(e)
+
+
+def _is_fully_cached(*urls) -> bool:
+    """Check whether the article, its quiz and its topics are all stored already."""
+    with get_db() as conn:
+        article_id = find_article_id(conn.cursor(), *urls)
+        if article_id is None:
+            return False
+        
+        row = conn.execute("""
+            SELECT 1
+            FROM articles a
+            JOIN quizzes q ON q.article_id = a.id
+            WHERE a.id = ? AND a.related_topics IS NOT NULL
+            LIMIT 1
+        """, (article_id,)).fetchone()
+    return row is not None
+
+
+# Database steps of the pipeline; each runs on the DB thread pool via run_db
+def _load_cached_article(canonical_url: str, url: str):
+    """Step 2: (article_id, title, text) if any URL variant is stored, else None."""
+    with STAGE_SECONDS.time(stage="cache_lookup"), get_db() as conn:
+        cursor = conn.cursor()
+        article_id = find_article_id(cursor, canonical_url, url)
+        CACHE_LOOKUPS.inc(cache="article", result="miss" if article_id is None else "hit")
+        if article_id is None:
+            return None
+        
+        title, text = get_article_text(cursor, article_id)
+        if save_article_aliases(cursor, article_id, canonical_url):
+            conn.commit()
+        return article_id, title, text
+
+
+def _store_scraped_article(url: str, canonical_url: str, scraped: dict):
+    """Step 4: store a scraped article (unless its redirect target is known)."""
+    with STAGE_SECONDS.time(stage="db_write"), get_db() as conn:
+        cursor = conn.cursor()
+        target_url = scraped["canonical_url"]
+        
+        # A redirect title may point at an article we already have
+        article_id = find_article_id(cursor, target_url)
+        
+        if article_id is None:
+            article_id = save_article(cursor, scraped)
+            log.info("Article stored", extra={"title": scraped["title"]})
+        else:
+            log.info("URL redirects to a stored article", extra={"url": url, "target": target_url})
+        
+        save_article_aliases(cursor, article_id, canonical_url, target_url)
+        conn.commit()
+        
+        title, text = get_article_text(cursor, article_id)
+        return article_id, title, text
+
+
+def _load_related_topics(article_id: int):
+    with STAGE_SECONDS.time(stage="cache_lookup"), get_db() as conn:
+        related = get_related_topics(conn.cursor(), article_id)
+    CACHE_LOOKUPS.inc(cache="related_topics", result="miss" if related is None else "hit")
+    return related
+
+
+def _load_quiz(article_id: int):
+    """Step 3: (quiz_id, quiz_json) of the article's stored quiz, or None."""
+    with STAGE_SECONDS.time(stage="cache_lookup"), get_db() as conn:
+        row = conn.execute(
+            "SELECT id, quiz_json FROM quizzes WHERE article_id = ?",
+            (article_id,)
+        ).fetchone()
+    CACHE_LOOKUPS.inc(cache="quiz", result="miss" if row is None else "hit")
+    return row
+
+
+def _load_sections(article_id: int):
+    with get_db() as conn:
+        return get_article_sections(conn.cursor(), article_id)
+
+
+def _store_quiz(article_id: int, quiz: list) -> int:
+    """Step 5: store a generated quiz and return its id."""
+    with STAGE_SECONDS.time(stage="db_write"), get_db() as conn:
+        quiz_id = save_quiz(conn.cursor(), article_id, quiz, model_name())
+        conn.commit()
+        return quiz_id
+
+
+async def _scrape_article(url: str, source: Optional[str]) -> dict:
+    """Step 4: load an article from Wikipedia or the offline dump."""
+    if (source or ARTICLE_SOURCE) == "dump":
+        try:
+            return await scrape_from_dump(url)
+        except LookupError as e:
+            # Not an error of ours: the offline dump just lacks the title
+            http_404(str(e))
+    return await scrape_wikipedia(url)
+
+
+async def _report_stage(on_stage, stage: str):
+    if on_stage is not None:
+        await on_stage(stage)
+
+
+def _emit(on_event, event: str, data: dict):
+    if on_event is not None:
+        on_event(event, data)
+
+
+def _raise_resilience_error(e: ResilienceError):
+    """Answer a fail-fast error: 504 past the deadline, 503 while Gemini is failing."""
+    if isinstance(e, DeadlineExceeded):
+        reason = "deadline"
+    elif isinstance(e, CircuitOpenError):
+        reason = "circuit_open"
+    else:
+        reason = "retry_budget"
+    FAIL_FAST.inc(reason=reason)
+    log.warning("Generation failed fast", extra={"reason": reason, "error": str(e)})
+    
+    if isinstance(e, DeadlineExceeded):
+        http_504(f"Quiz generation took longer than {GENERATION_DEADLINE_SECONDS:.0f}s. Please try again.")
+    if isinstance(e, CircuitOpenError):
+        http_503(
+            f"⏱️ Gemini is failing right now. Try again in {max(1, round(e.retry_after))}s; "
+            "already generated quizzes are still served.",
+            e.retry_after
+        )
+    http_503(f"⏱️ Gemini is overloaded: {str(e)}. Please try again in a minute.")
+
+
+async def _generate_quiz_pipeline(payload: QuizRequest, on_stage=None, on_event=None):
+    """
+    Steps 2-8 of generate_quiz (see its docstring).
+    
+    The whole run shares the deadline its caller opened with deadline_scope
+    (GENERATION_DEADLINE_SECONDS): every scrape and LLM call below is cut
+    short when it passes, and retries stop, so a failing run ends with 504
+    instead of hanging (503 while the Gemini circuit breaker is open).
+    
+    Args:
+        payload: Validated request
+        on_stage: Optional coroutine function called with the name of each
+            stage as it starts (background jobs record it as progress)
+        on_event: Optional callback (event, data) for partial results as they
+            become available: "article", each "question", "related_topics"
+            (the streaming endpoint forwards them as server-sent events)
+    """
+    with GENERATIONS_IN_FLIGHT.track():
+        return await _run_pipeline_steps(payload, on_stage, on_event)
+
+
+async def _run_pipeline_steps(payload: QuizRequest, on_stage, on_event):
+    try:
+        # ========== STEP 2: Check Article Cache ==========
+        await _report_stage(on_stage, "checking_cache")
+        # Any URL variant (encoding, scheme, redirect title) seen before
+        # resolves through the alias table to the same article
+        canonical_url = canonicalize_wikipedia_url(payload.url)
+        cached = await run_db(_load_cached_article, canonical_url, payload.url)
+        
+        if cached is not None:
+            article_id, title, text = cached
+            log.info("Using stored article", extra={"title": title})
+        else:
+            # ========== STEP 4: Scrape Article ==========
+            try:
+                await _report_stage(on_stage, "scraping")
+                log.info("Scraping article", extra={"url": payload.url, "source": payload.source or ARTICLE_SOURCE})
+                scraped = await _scrape_article(payload.url, payload.source)
+                article_id, title, text = await run_db(_store_scraped_article, payload.url, canonical_url, scraped)
             
-            if quiz_row:
-                quiz_id, quiz_json = quiz_row
-                quiz = json.loads(quiz_json)
-                print(f"✅ Using cached quiz for: {title}")
-            else:
-                # ========== STEP 5: Generate Quiz ==========
-                try:
-                    print(f"🤖 Generating quiz for: {title}")
-                    # Pass title to quiz generation for fallback mode
-                    quiz = build_quiz_from_text(text, title)
-                    
-                    cursor.execute(
-                        """
-                        INSERT INTO quizzes (article_id, quiz_json, llm_model, prompt_version, created_at)
-                        VALUES (?, ?, ?, ?, ?)
-                        """,
-                        (
-                            article_id,
-                            json.dumps(quiz),
-                            "gemini-2.5-flash",
-                            "v1",
-                            datetime.now(timezone.utc).isoformat()
-                        )
+            except (ResilienceError, HTTPException):
+                raise
+            except Exception as e:
+                error_msg = str(e)
+                if "timeout" in error_msg.lower():
+                    http_500("Wikipedia request timed out. Please try again.")
+                else:
+                    http_500(f"Scraping failed: {error_msg}")
+        
+        _emit(on_event, "article", {"url": payload.url, "title": title})
+        
+        # ========== STEP 6: Related Topics (runs alongside quiz generation) ==========
+        related = await run_db(_load_related_topics, article_id)
+        topics_task = None
+        
+        if related is not None:
+            log.debug("Using stored related topics", extra={"title": title})
+        else:
+            log.debug("Extracting related topics in the background", extra={"title": title})
+            topics_task = start_related_topics(article_id, title, text)
+            related = {"topics": [], "related_links": []}
+        
+        # ========== STEP 3: Check Quiz Cache ==========
+        quiz_row = await run_db(_load_quiz, article_id)
+        
+        if quiz_row:
+            quiz_id, quiz_json = quiz_row
+            quiz = json.loads(quiz_json)
+            log.info("Using stored quiz", extra={"title": title, "quiz_id": quiz_id})
+            for index, question in enumerate(quiz):
+                _emit(on_event, "question", {"index": index, "question": question})
+        else:
+            # ========== STEP 5: Generate Quiz ==========
+            try:
+                await _report_stage(on_stage, "generating_quiz")
+                log.info("Generating quiz", extra={"title": title})
+                # Pass title to quiz generation for fallback mode, and the
+                # section breakdown so each question gets its own excerpt
+                sections = await run_db(_load_sections, article_id)
+                quiz = await build_quiz_from_text(
+                    text, title, sections,
+                    on_question=lambda index, question: _emit(
+                        on_event, "question", {"index": index, "question": question}
                     )
-                    conn.commit()
-                    quiz_id = cursor.lastrowid
-                    print(f"✅ Quiz generated: {len(quiz)} questions")
-                    
-                except Exception as e:
-                    error_msg = str(e)
-                    
-                    # Error categorization for better UX
-                    if "Rate limit" in error_msg:
-                        http_500(
-                            "⏱️ Gemini API rate limit reached (60 requests/minute free tier). "
-                            "Please wait 1-2 minutes and try again. Already generated quizzes are cached."
-                        )
-                    elif "API Key" in error_msg or "UNAUTHENTICATED" in error_msg:
-                        http_500(
-                            "❌ Google API Key is invalid or missing. "
-                            "Check your .env file: GOOGLE_API_KEY=your_key_here"
-                        )
-                    elif "Authentication" in error_msg or "401" in error_msg or "403" in error_msg:
-                        http_500(
-                            "❌ Google API authentication failed. "
-                            "Verify your API Key has Gemini AI permissions enabled."
-                        )
-                    elif "Model" in error_msg or "NOT_FOUND" in error_msg:
-                        http_500(
-                            "❌ Gemini 2.5 Flash model not available. "
-                            "Verify your API project has Gemini enabled."
-                        )
-                    elif "quota" in error_msg.lower():
-                        http_500(
-                            "⏱️ API quota exceeded. Upgrade to paid tier for higher limits. "
-                            "Free tier: 60 requests/minute, 1500 requests/day"
-                        )
-                    else:
-                        http_500(f"Quiz generation failed: {error_msg}")
+                )
+                quiz_id = await run_db(_store_quiz, article_id, quiz)
+                log.info("Quiz stored", extra={"title": title, "quiz_id": quiz_id})
             
-            # ========== STEP 6: AI Extract Related Topics from Content ==========
-            try:
-                print(f"🤖 AI extracting related topics from article content for: {title}")
-                related = extract_related_topics_from_content(title, text)
+            except ResilienceError:
+                raise
+            except Exception as e:
+                error_msg = str(e)
                 
-                if related and len(related.get("topics", [])) >= 5:
-                    print(f"✅ AI extracted 5 related topics from content")
+                # Error categorization for better UX
+                if "Rate limit" in error_msg:
+                    http_500(
+                        "⏱️ Gemini API rate limit reached (60 requests/minute free tier). "
+                        "Please wait 1-2 minutes and try again. Already generated quizzes are cached."
+                    )
+                elif "API Key" in error_msg or "UNAUTHENTICATED" in error_msg:
+                    http_500(
+                        "❌ Google API Key is invalid or missing. "
+                        "Check your .env file: GOOGLE_API_KEY=your_key_here"
+                    )
+                elif "Authentication" in error_msg or "401" in error_msg or "403" in error_msg:
+                    http_500(
+                        "❌ Google API authentication failed. "
+                        "Verify your API Key has Gemini AI permissions enabled."
+                    )
+                elif "Model" in error_msg or "NOT_FOUND" in error_msg:
+                    http_500(
+                        "❌ Gemini 2.5 Flash model not available. "
+                        "Verify your API project has Gemini enabled."
+                    )
+                elif "quota" in error_msg.lower():
+                    http_500(
+                        "⏱️ API quota exceeded. Upgrade to paid tier for higher limits. "
+                        "Free tier: 60 requests/minute, 1500 requests/day"
+                    )
                 else:
-                    print(f"⚠️  AI could not extract enough topics, using empty arrays")
-                    related = {
-                        "topics": [],
-                        "related_links": []
-                    }
-            except Exception as e:
-                print(f"⚠️  Error during AI topic extraction: {str(e)}")
-                related = {
-                    "topics": [],
-                    "related_links": []
-                }
-            
-            # ========== STEP 8: Return Quiz + AI-Extracted Topics ==========
-            return {
-                "id": quiz_id,
-                "url": payload.url,
-                "title": title,
-                "quiz": quiz,
-                "related_topics": related.get("topics", []),
-                "related_links": related.get("related_links", [])
-            }
-            
+                    http_500(f"Quiz generation failed: {error_msg}")
+        
+        # ========== STEP 7: Collect Related Topics (bounded wait) ==========
+        if topics_task is not None:
+            await _report_stage(on_stage, "collecting_topics")
+            related = await wait_for_related_topics(topics_task, RELATED_TOPICS_BUDGET_SECONDS)
+        
+        _emit(on_event, "related_topics", {
+            "related_topics": related.get("topics", []),
+            "related_links": related.get("related_links", [])
+        })
+        
+        # ========== STEP 8: Return Quiz + AI-Extracted Topics ==========
+        return {
+            "id": quiz_id,
+            "url": payload.url,
+            "title": title,
+            "quiz": quiz,
+            "related_topics": related.get("topics", []),
+            "related_links": related.get("related_links", [])
+        }
+        
+    except ResilienceError as e:
+        _raise_resilience_error(e)
+    except HTTPException:
+        raise
     except Exception as e:
         # Catch-all for unexpected database errors
         http_500(f"Backend error: {str(e)}")
 
+# ========================
+# Generate Quiz (Streaming)
+# ========================
+
+# Streamed generations keep running if the client disconnects (the quiz is
+# still stored); they are referenced here until done
+stream_tasks = set()
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _run_streamed_generation(payload: QuizRequest, canonical_url: str, on_event):
+    # Not single-flighted: every stream needs its own events. The lease still
+    # makes a concurrent request for the article wait, then stream the cache
+    with deadline_scope(GENERATION_DEADLINE_SECONDS):
+        try:
+            if await run_db(_is_fully_cached, canonical_url, payload.url):
+                return await _generate_quiz_pipeline(payload, on_event=on_event)
+            
+            return await run_with_lease(
+                canonical_url,
+                lambda: _generate_quiz_pipeline(payload, on_event=on_event),
+                ttl=GENERATION_LEASE_SECONDS
+            )
+        except DeadlineExceeded as e:
+            _raise_resilience_error(e)
+
+
+async def _stream_events(task: asyncio.Task, events: asyncio.Queue):
+    """Yield queued pipeline events as SSE, then the final done or error event."""
+    while True:
+        item = await events.get()
+        if item is None:
+            break
+        yield _sse(*item)
+    
+    try:
+        result = task.result()
+    except HTTPException as e:
+        yield _sse("error", {"detail": e.detail})
+        return
+    except Exception as e:
+        yield _sse("error", {"detail": f"Backend error: {str(e)}"})
+        return
+    
+    yield _sse("done", {
+        "id": result["id"],
+        "url": result["url"],
+        "title": result["title"],
+        "questions": len(result["quiz"])
+    })
+
+
+@app.post("/api/quizzes/stream", operation_id="create_quiz_stream")
+async def generate_quiz_stream(payload: QuizRequest):
+    """
+    Streaming variant of POST /api/quizzes, as server-sent events.
+    
+    Events, in order:
+    - article: {url, title} once the article is loaded or scraped
+    - question: {index, question} for each question as soon as it is
+      accepted (completion order; index is its position in the quiz)
+    - related_topics: {related_topics, related_links}
+    - done: {id, url, title, questions} after the quiz is stored
+    - error: {detail} instead of done if generation failed
+    """
+    _validate_request(payload)
+    
+    canonical_url = canonicalize_wikipedia_url(payload.url)
+    events = asyncio.Queue()
+    
+    def finished(task):
+        stream_tasks.discard(task)
+        # Mark the exception retrieved in case the client already left
+        if not task.cancelled():
+            task.exception()
+        events.put_nowait(None)
+    
+    task = asyncio.ensure_future(_run_streamed_generation(
+        payload, canonical_url, lambda event, data: events.put_nowait((event, data))
+    ))
+    stream_tasks.add(task)
+    task.add_done_callback(finished)
+    
+    return StreamingResponse(
+        _stream_events(task, events),
+        media_type="text/event-stream",
+        # Proxies must pass each event through as it is written
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # ========================
 # Quiz Detail (Retrieve Specific Quiz)
 # ========================
 
+def _load_quiz_detail(quiz_id: int) -> dict:
+    with get_db() as conn:
+        cursor = conn.cursor()
+        row = cursor.execute("""
+            SELECT a.id, a.title, a.url, q.quiz_json
+            FROM quizzes q
+            JOIN articles a ON q.article_id = a.id
+            WHERE q.id = ?
+        """, (quiz_id,)).fetchone()
+        
+        if not row:
+            http_404("Quiz not found")
+        
+        article_id, title, url, quiz_json = row
+        
+        # Related topics are read from the database, never generated here
+        related = get_related_topics(cursor, article_id) or {"topics": [], "related_links": []}
+        
+        return {
+            "id": quiz_id,
+            "title": title,
+            "url": url,
+            "quiz": json.loads(quiz_json),
+            "related_topics": related.get("topics", []),
+            "related_links": related.get("related_links", [])
+        }
+
+
 @app.get("/api/quizzes/{quiz_id}", operation_id="quiz_detail")
-def quiz_detail(quiz_id: int):
+async def quiz_detail(quiz_id: int):
     """Retrieve a specific quiz by ID"""
     try:
-        with get_db() as conn:
-            cursor = conn.cursor()
-            row = cursor.execute("""
-                SELECT a.title, a.url, a.scraped_text, q.quiz_json
-                FROM quizzes q
-                JOIN articles a ON q.article_id = a.id
-                WHERE q.id = ?
-            """, (quiz_id,)).fetchone()
-            
-            if not row:
-                http_404("Quiz not found")
-            
-            title, url, text, quiz_json = row
-            
-            # Extract related topics for this quiz
-            try:
-                related = extract_related_topics_from_content(title, text)
-                if not related or len(related.get("topics", [])) < 5:
-                    related = {"topics": [], "related_links": []}
-            except:
-                related = {"topics": [], "related_links": []}
-            
-            return {
-                "id": quiz_id,
-                "title": title,
-                "url": url,
-                "quiz": json.loads(quiz_json),
-                "related_topics": related.get("topics", []),
-                "related_links": related.get("related_links", [])
-            }
+        return await run_db(_load_quiz_detail, quiz_id)
+    except HTTPException:
+        raise
     except Exception as e:
         http_500(f"Failed to retrieve quiz: {str(e)}")
 
+# ========================
+# Refresh Related Topics
+# ========================
+
+def _load_quiz_article(quiz_id: int):
+    """(article_id, title, text) of a quiz's article; 404 if the quiz does not exist."""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        row = cursor.execute(
+            "SELECT article_id FROM quizzes WHERE id = ?",
+            (quiz_id,)
+        ).fetchone()
+        
+        if not row:
+            http_404("Quiz not found")
+        
+        article_id = row[0]
+        title, text = get_article_text(cursor, article_id)
+        return article_id, title, text
+
+
+@app.post("/api/quizzes/{quiz_id}/related-topics/refresh", operation_id="refresh_related_topics")
+async def refresh_related_topics(quiz_id: int):
+    """Re-extract related topics for the quiz's article and store them"""
+    try:
+        article_id, title, text = await run_db(_load_quiz_article, quiz_id)
+        # A refresh asks for new topics: a cached answer would repeat the old ones
+        related = await get_related_topics_from_content(title, text, use_cache=False)
+        
+        if not related.get("topics"):
+            http_500("Could not extract related topics. Please try again.")
+        
+        await run_db(_store_related_topics, article_id, related)
+        
+        return {
+            "id": quiz_id,
+            "related_topics": related.get("topics", []),
+            "related_links": related.get("related_links", [])
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        http_500(f"Failed to refresh related topics: {str(e)}")
+
+# ========================
+# Revalidate Article (Conditional GET)
+# ========================
+
+def _load_article_validators(quiz_id: int):
+    """(article_id, url, etag, last_modified) of a quiz's article; 404 if missing."""
+    with get_db() as conn:
+        row = conn.execute("""
+            SELECT a.id, a.url, a.etag, a.last_modified
+            FROM quizzes q
+            JOIN articles a ON q.article_id = a.id
+            WHERE q.id = ?
+        """, (quiz_id,)).fetchone()
+        
+        if not row:
+            http_404("Quiz not found")
+        return row
+
+
+def _touch_article(article_id: int, fetched_at: str):
+    with get_db() as conn:
+        conn.execute(
+            "UPDATE articles SET fetched_at = ? WHERE id = ?",
+            (fetched_at, article_id)
+        )
+        conn.commit()
+
+
+def _update_article(article_id: int, scraped: dict, fetched_at: str):
+    with get_db() as conn:
+        cursor = conn.cursor()
+        content = store_article_content(
+            cursor, scraped["text"], scraped["raw_html"], sections=scraped["section_texts"]
+        )
+        cursor.execute(
+            """
+            UPDATE articles
+            SET title = ?, text_hash = ?, html_hash = ?, sections_hash = ?, scraped_text = NULL, raw_html = NULL,
+                etag = ?, last_modified = ?, fetched_at = ?
+            WHERE id = ?
+            """,
+            (
+                scraped["title"],
+                content["text_hash"],
+                content["html_hash"],
+                content["sections_hash"],
+                scraped.get("etag"),
+                scraped.get("last_modified"),
+                fetched_at,
+                article_id
+            )
+        )
+        conn.commit()
+
+
+@app.post("/api/quizzes/{quiz_id}/article/revalidate", operation_id="revalidate_article")
+async def revalidate_article(quiz_id: int):
+    """Check with Wikipedia whether the quiz's article changed, and store it if so"""
+    try:
+        article_id, url, etag, last_modified = await run_db(_load_article_validators, quiz_id)
+        now = datetime.now(timezone.utc).isoformat()
+        
+        # Sends If-None-Match / If-Modified-Since; 304 means nothing to download
+        scraped = await revalidate_wikipedia(url, etag, last_modified)
+        
+        if scraped is None:
+            await run_db(_touch_article, article_id, now)
+            return {"id": quiz_id, "changed": False, "fetched_at": now}
+        
+        await run_db(_update_article, article_id, scraped, now)
+        return {"id": quiz_id, "changed": True, "fetched_at": now}
+    except HTTPException:
+        raise
+    except Exception as e:
+        http_500(f"Failed to revalidate article: {str(e)}")
+
 # ========================
 # Attempt Quiz (Submit Answers)
 # ========================
 
+def _score_and_store_attempt(quiz_id: int, answers: dict) -> dict:
+    with get_db() as conn:
+        cursor = conn.cursor()
+        
+        row = cursor.execute(
+            "SELECT quiz_json FROM quizzes WHERE id = ?",
+            (quiz_id,)
+        ).fetchone()
+        
+        if not row:
+            http_404("Quiz not found")
+        
+        quiz = json.loads(row[0])
+        score, total, breakdown = score_attempt(quiz, answers)
+        
+        cursor.execute(
+            """
+            INSERT INTO attempts (quiz_id, score, total, user_answers, created_at)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (
+                quiz_id,
+                score,
+                total,
+                json.dumps(answers),
+                datetime.now(timezone.utc).isoformat()
+            )
+        )
+        conn.commit()
+        
+        return {
+            "quiz_id": quiz_id,
+            "score": score,
+            "total": total,
+            "percentage": round((score / total * 100) if total > 0 else 0, 2),
+            "breakdown": breakdown
+        }
+
+
 @app.post("/api/quizzes/{quiz_id}/attempt", operation_id="attempt_quiz")
-def attempt_quiz(quiz_id: int, payload: AttemptRequest):
+async def attempt_quiz(quiz_id: int, payload: AttemptRequest):
     """Submit answers and get score"""
     try:
-        with get_db() as conn:
-            cursor = conn.cursor()
-            
-            row = cursor.execute(
-                "SELECT quiz_json FROM quizzes WHERE id = ?",
-                (quiz_id,)
-            ).fetchone()
-            
-            if not row:
-                http_404("Quiz not found")
-            
-            quiz = json.loads(row[0])
-            score, total, breakdown = score_attempt(quiz, payload.answers)
-            
-            cursor.execute(
-                """
-                INSERT INTO attempts (quiz_id, score, total, user_answers, created_at)
-                VALUES (?, ?, ?, ?, ?)
-                """,
-                (
-                    quiz_id,
-                    score,
-                    total,
-                    json.dumps(payload.answers),
-                    datetime.now(timezone.utc).isoformat()
-                )
-            )
-            conn.commit()
-            
-            return {
-                "quiz_id": quiz_id,
-                "score": score,
-                "total": total,
-                "percentage": round((score / total * 100) if total > 0 else 0, 2),
-                "breakdown": breakdown
-            }
+        return await run_db(_score_and_store_attempt, quiz_id, payload.answers)
+    except HTTPException:
+        raise
     except Exception as e:
         http_500(f"Failed to process attempt: {str(e)}")
 
+# ========================
+# Background Generation Jobs
+# ========================
+
+async def _run_generation_job(url: str, report_stage) -> int:
+    """Run a queued job's generation (the URL was validated when it was queued)."""
+    payload = QuizRequest(url=url)
+    result = await _run_generation(payload, canonicalize_wikipedia_url(url), report_stage)
+    return result["id"]
+
+
+job_pool = JobWorkerPool(_run_generation_job)
+
+
+@app.get("/api/jobs/{job_id}", response_model=JobStatus, operation_id="job_status")
+async def job_status(job_id: int):
+    """Status of a generation job queued with POST /api/quizzes?mode=job."""
+    job = await run_db(get_job, job_id)
+    if job is None:
+        http_404("Job not found")
+    return job
+
 # ========================
 # Server Startup Message
 # ========================
 
 @app.on_event("startup")
 async def startup_event():
-    print("\n" + "="*50)
-    print("🚀 AI Wiki Quiz Generator Backend")
-    print("="*50)
-    print("✅ Server started successfully")
-    print("📚 API Docs: http://127.0.0.1:8000/docs")
-    print("🤖 AI Features: Quiz generation + AI topic extraction")
-    print("📊 Response: 6 questions + AI-extracted topics + Wikipedia links")
-    print("="*50 + "\n")
\ No newline at end of file
+    log.info("AI Wiki Quiz Generator backend started", extra={"docs": "/docs", "metrics": "/metrics"})
+    # Also resumes jobs left unfinished by a previous run
+    job_pool.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await job_pool.stop()
+    close_connections()
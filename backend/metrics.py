@@ -0,0 +1,207 @@
+"""
+In-process metrics, exposed in the Prometheus text format on GET /metrics.
+
+Counters, gauges and histograms are plain dicts of numbers behind a lock,
+so recording one costs about a microsecond and instrumentation can stay
+on in production. Values are per process: with several uvicorn workers,
+scrape each one (or aggregate with sum() in PromQL).
+
+The backend's metrics are declared at the bottom of this module, so the
+full set is visible in one place.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds: from a cached SQLite lookup (ms) up to a slow Gemini call
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        # Unlabelled counters and gauges are shown (as 0) before first use
+        self._values = {} if self.labelnames or self.kind == "histogram" else {(): 0}
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: tuple, extra: tuple = ()) -> str:
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def _samples(self) -> list:
+        with self._lock:
+            return [f"{self.name}{self._labels(key)} {_number(value)}" for key, value in sorted(self._values.items())]
+
+    def render(self) -> str:
+        return "\n".join([f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self._samples()])
+
+
+class Counter(_Metric):
+    """A count that only goes up (name it *_total)."""
+    
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """
+    A value that goes up and down. With function, the value is read from
+    it at scrape time instead (for state kept elsewhere).
+    """
+    
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames=(), function=None):
+        super().__init__(name, help, labelnames)
+        self.function = function
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels):
+        """Count the block as in progress while it runs."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def _samples(self) -> list:
+        if self.function is not None:
+            return [f"{self.name} {_number(self.function())}"]
+        return super()._samples()
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (durations) in cumulative buckets."""
+    
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # [count per bucket (last: above every bound)..., sum]
+                series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the block takes (also when it raises)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> list:
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._values.items())
+        
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._labels(key, (('le', _number(bound)),))} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{self._labels(key)} {cumulative}")
+        return lines
+
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format (version 0.0.4)."""
+    return "\n\n".join(metric.render() for metric in _registry) + "\n"
+
+
+# ============ BACKEND METRICS ============
+STAGE_SECONDS = Histogram(
+    "wikiquiz_stage_duration_seconds",
+    "Time spent per generation stage (fetch, parse, cache lookups, quota wait, DB writes, ...)",
+    ["stage"]
+)
+LLM_CALL_SECONDS = Histogram(
+    "wikiquiz_llm_call_duration_seconds",
+    "LLM API calls, from sending the prompt to the reply (quota wait excluded)",
+    ["kind", "outcome"]
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "wikiquiz_http_request_duration_seconds",
+    "API requests by route",
+    ["method", "route", "status"]
+)
+
+CACHE_LOOKUPS = Counter(
+    "wikiquiz_cache_lookups_total",
+    "Lookups of stored articles, quizzes, related topics and LLM replies",
+    ["cache", "result"]
+)
+LLM_RETRIES = Counter(
+    "wikiquiz_llm_retries_total",
+    "LLM retries: of a single call (call) or re-sent quiz slots (slot)",
+    ["scope"]
+)
+FALLBACK_GENERATIONS = Counter(
+    "wikiquiz_fallback_generations_total",
+    "Quizzes generated from the title alone because the article text was too short"
+)
+FAIL_FAST = Counter(
+    "wikiquiz_fail_fast_total",
+    "Generations ended early: deadline passed, circuit open or retry budget spent",
+    ["reason"]
+)
+
+GENERATIONS_IN_FLIGHT = Gauge(
+    "wikiquiz_generations_in_flight",
+    "Quiz generation pipelines running"
+)
+LLM_CALLS_IN_FLIGHT = Gauge(
+    "wikiquiz_llm_calls_in_flight",
+    "LLM API calls waiting for a reply"
+)
@@ -0,0 +1,384 @@
+"""
+Bulk quiz pre-generation for a list of Wikipedia articles.
+
+Pre-warms the database before a term starts, so the first student to
+open an article gets the stored quiz instead of waiting for Gemini:
+
+    python pregenerate.py urls.txt
+    cat urls.txt | python pregenerate.py - --concurrency 8
+
+The list holds one en.wikipedia.org/wiki/* URL per line (blank lines and
+lines starting with # are skipped). Each article goes through:
+
+- fetch:     pooled HTTP client (fetcher.py), --fetchers at a time
+- parse:     scraper.parse_wikipedia_html in a process pool (--processes),
+             as HTML parsing is CPU-bound
+- generate:  quiz and related topics through the same rate-limited LLM path
+             as the API, --concurrency articles at a time, at background
+             priority (the quota is shared with the server through SQLite)
+- store:     articles, quizzes and topics inserted --batch-size at a time,
+             one transaction per batch
+
+With --source dump, articles are read from the offline dump instead
+(dumpsource.py, WIKI_DUMP_PATH): each lookup runs in the process pool and
+is timed as the parse stage, and nothing is fetched.
+
+The database is the checkpoint: articles whose quiz and topics are stored
+already are skipped, and an article stored without a quiz is not fetched
+again, so after a crash or Ctrl-C the same command picks up where it
+stopped. Work of the last, unflushed batch is redone, mostly from the LLM
+response cache.
+
+At the end it prints throughput and per-stage timings (--report writes
+them as JSON).
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from config import ARTICLE_SOURCE, WIKI_DUMP_PATH
+from dumpsource import load_article
+from db import (
+    get_db,
+    run_db,
+    close_connections,
+    find_article_id,
+    save_article_aliases,
+    get_related_topics,
+    save_related_topics,
+    save_quiz,
+)
+from fetcher import fetcher
+from llm import model_name, rate_limit_stats, prompt_cache_stats, output_repair_stats
+from quiz import build_quiz_from_text, get_related_topics_from_content
+from ratelimit import llm_priority, PRIORITY_BACKGROUND
+from scraper import parse_wikipedia_html
+from storage import save_article, get_article_text, get_article_sections
+from utils import validate_wikipedia_url, canonicalize_wikipedia_url
+
+STAGES = ("fetch", "parse", "generate", "store")
+
+
+def read_urls(path: str) -> list:
+    """URLs from a file ('-' for stdin), in order, without duplicates."""
+    stream = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        lines = [line.strip() for line in stream]
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    return list(dict.fromkeys(line for line in lines if line and not line.startswith("#")))
+
+
+class StageTimer:
+    """Seconds spent per article in each stage."""
+
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+
+    def record(self, stage: str, seconds: float):
+        self.samples[stage].append(seconds)
+
+    def summary(self) -> dict:
+        result = {}
+        for stage, samples in self.samples.items():
+            ordered = sorted(samples)
+            result[stage] = {
+                "count": len(ordered),
+                "total_s": round(sum(ordered), 3),
+                "p50_s": round(statistics.median(ordered), 3) if ordered else 0.0,
+                "p95_s": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3) if ordered else 0.0,
+            }
+        return result
+
+
+# ============ DATABASE STEPS ============
+def _load_progress(url: str, canonical_url: str, with_topics: bool):
+    """
+    What is stored for an article already.
+    
+    Returns:
+        None if it is not stored, "done" if nothing is left to generate,
+        else (article_id, title, text, sections, needs_quiz, needs_topics)
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        article_id = find_article_id(cursor, canonical_url, url)
+        if article_id is None:
+            return None
+        
+        needs_quiz = conn.execute(
+            "SELECT 1 FROM quizzes WHERE article_id = ? LIMIT 1", (article_id,)
+        ).fetchone() is None
+        needs_topics = with_topics and get_related_topics(cursor, article_id) is None
+        if not needs_quiz and not needs_topics:
+            return "done"
+        
+        title, text = get_article_text(cursor, article_id)
+        sections = get_article_sections(cursor, article_id)
+        return article_id, title, text, sections, needs_quiz, needs_topics
+
+
+def _store_batch(items: list, llm_model: str) -> int:
+    """
+    Store a batch of generated articles in one transaction.
+    
+    Returns:
+        int: Number of quizzes inserted
+    """
+    stored = 0
+    with get_db() as conn:
+        cursor = conn.cursor()
+        for item in items:
+            article_id = item["article_id"]
+            if article_id is None:
+                scraped = item["scraped"]
+                # Two input URLs may redirect to one article
+                article_id = find_article_id(cursor, scraped["canonical_url"]) or save_article(cursor, scraped)
+                save_article_aliases(cursor, article_id, item["canonical_url"], scraped["canonical_url"])
+            
+            has_quiz = cursor.execute(
+                "SELECT 1 FROM quizzes WHERE article_id = ? LIMIT 1", (article_id,)
+            ).fetchone() is not None
+            if item["quiz"] is not None and not has_quiz:
+                save_quiz(cursor, article_id, item["quiz"], llm_model)
+                stored += 1
+            if item["related"] and item["related"].get("topics"):
+                save_related_topics(cursor, article_id, item["related"])
+        conn.commit()
+    return stored
+
+
+# ============ PIPELINE ============
+def _ignore_sigint():
+    # Ctrl-C is handled once, by the parent, which shuts the pool down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class Pregenerator:
+    """
+    Two-stage pipeline: fetch+parse workers feed a bounded queue that the
+    generation workers drain, so only a few parsed articles wait in memory
+    while the LLM (the slow stage) is busy.
+    """
+
+    def __init__(self, processes: int, fetchers: int, concurrency: int, batch_size: int, with_topics: bool,
+                 source: str = "http"):
+        self.processes = processes
+        self.fetchers = fetchers
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.with_topics = with_topics
+        self.source = source
+        self.timer = StageTimer()
+        self.counts = {"total": 0, "skipped": 0, "generated": 0, "failed": 0}
+        self.failures = []
+        self._pending = []
+        self._store_lock = asyncio.Lock()
+
+    async def run(self, urls: list):
+        self.counts["total"] = len(urls)
+        todo = asyncio.Queue()
+        for url in urls:
+            todo.put_nowait(url)
+        parsed = asyncio.Queue(maxsize=self.concurrency * 2)
+        
+        with ProcessPoolExecutor(max_workers=self.processes, initializer=_ignore_sigint) as pool:
+            # Start the workers now, while this process has no other threads
+            # yet (forking a multi-threaded process can deadlock)
+            pool.submit(os.getpid).result()
+            
+            fetchers = [asyncio.ensure_future(self._fetch_worker(todo, parsed, pool)) for _ in range(self.fetchers)]
+            generators = [asyncio.ensure_future(self._generate_worker(parsed)) for _ in range(self.concurrency)]
+            try:
+                await asyncio.gather(*fetchers)
+                for _ in generators:
+                    await parsed.put(None)
+                await asyncio.gather(*generators)
+            finally:
+                for task in fetchers + generators:
+                    task.cancel()
+                await asyncio.gather(*fetchers, *generators, return_exceptions=True)
+                # Interrupted runs keep what was generated so far (the lock
+                # also waits for a shielded flush still in progress)
+                await self._flush()
+
+    def _fail(self, url: str, error: Exception):
+        # HTTPExceptions from the scraper carry the readable message
+        message = str(getattr(error, "detail", None) or error).splitlines()[0]
+        self.counts["failed"] += 1
+        self.failures.append({"url": url, "error": message})
+        print(f"❌ {url}: {message}")
+
+    async def _fetch_worker(self, todo: asyncio.Queue, parsed: asyncio.Queue, pool):
+        loop = asyncio.get_running_loop()
+        
+        while not todo.empty():
+            url = todo.get_nowait()
+            if not validate_wikipedia_url(url):
+                self._fail(url, ValueError("not an en.wikipedia.org/wiki/* URL"))
+                continue
+            
+            canonical_url = canonicalize_wikipedia_url(url)
+            try:
+                progress = await run_db(_load_progress, url, canonical_url, self.with_topics)
+                if progress == "done":
+                    self.counts["skipped"] += 1
+                    continue
+                
+                item = {"url": url, "canonical_url": canonical_url, "scraped": None, "quiz": None, "related": None}
+                if progress is not None:
+                    article_id, title, text, sections, needs_quiz, needs_topics = progress
+                    item.update(article_id=article_id, title=title, text=text, sections=sections,
+                                needs_quiz=needs_quiz, needs_topics=needs_topics)
+                elif self.source == "dump":
+                    # Each pool process opens the dump once, on its first lookup
+                    start = time.perf_counter()
+                    scraped = await loop.run_in_executor(pool, load_article, url)
+                    self.timer.record("parse", time.perf_counter() - start)
+                    
+                    item.update(article_id=None, scraped=scraped, title=scraped["title"], text=scraped["text"],
+                                sections=scraped["section_texts"], needs_quiz=True, needs_topics=self.with_topics)
+                else:
+                    start = time.perf_counter()
+                    response = await fetcher.fetch_async(url)
+                    self.timer.record("fetch", time.perf_counter() - start)
+                    
+                    start = time.perf_counter()
+                    scraped = await loop.run_in_executor(pool, parse_wikipedia_html, response.text, response.url)
+                    self.timer.record("parse", time.perf_counter() - start)
+                    scraped["etag"] = response.etag
+                    scraped["last_modified"] = response.last_modified
+                    
+                    item.update(article_id=None, scraped=scraped, title=scraped["title"], text=scraped["text"],
+                                sections=scraped["section_texts"], needs_quiz=True, needs_topics=self.with_topics)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._fail(url, e)
+                continue
+            
+            await parsed.put(item)
+
+    async def _generate_worker(self, parsed: asyncio.Queue):
+        # Server requests waiting for quota in this process go first
+        llm_priority.set(PRIORITY_BACKGROUND)
+        
+        while True:
+            item = await parsed.get()
+            if item is None:
+                return
+            
+            start = time.perf_counter()
+            try:
+                quiz_call = build_quiz_from_text(item["text"], item["title"], item["sections"]) if item["needs_quiz"] else None
+                topics_call = get_related_topics_from_content(item["title"], item["text"]) if item["needs_topics"] else None
+                results = await asyncio.gather(*(call for call in (quiz_call, topics_call) if call is not None))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._fail(item["url"], e)
+                continue
+            
+            if quiz_call is not None:
+                item["quiz"] = results.pop(0)
+            if topics_call is not None:
+                item["related"] = results.pop(0)
+            self.timer.record("generate", time.perf_counter() - start)
+            
+            self.counts["generated"] += 1
+            print(f"✅ [{self._done()}/{self.counts['total']}] {item['title']}")
+            
+            self._pending.append(item)
+            if len(self._pending) >= self.batch_size:
+                # Shielded: a batch already handed to the DB thread is
+                # committed even if Ctrl-C cancels this worker meanwhile
+                await asyncio.shield(self._flush())
+
+    def _done(self) -> int:
+        return self.counts["skipped"] + self.counts["generated"] + self.counts["failed"]
+
+    async def _flush(self):
+        async with self._store_lock:
+            batch, self._pending = self._pending, []
+            if not batch:
+                return
+            
+            start = time.perf_counter()
+            await run_db(_store_batch, batch, model_name())
+            elapsed = time.perf_counter() - start
+            for _ in batch:
+                self.timer.record("store", elapsed / len(batch))
+            print(f"💾 Stored {len(batch)} article(s)")
+
+
+# ============ CLI ============
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("urls", help="file with one Wikipedia URL per line ('-' for stdin)")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="HTML parsing processes")
+    parser.add_argument("--fetchers", type=int, default=8, help="articles fetched at a time")
+    parser.add_argument("--concurrency", type=int, default=4, help="articles generated at a time")
+    parser.add_argument("--batch-size", type=int, default=20, help="articles stored per transaction")
+    parser.add_argument("--source", choices=("http", "dump"), default=ARTICLE_SOURCE,
+                        help="fetch articles from Wikipedia or read them from the offline dump")
+    parser.add_argument("--no-related-topics", action="store_true", help="only generate quizzes")
+    parser.add_argument("--report", help="write counts, timings and failures to this JSON file")
+    args = parser.parse_args()
+    if args.source == "dump" and not WIKI_DUMP_PATH:
+        parser.error("--source dump needs WIKI_DUMP_PATH")
+    
+    urls = read_urls(args.urls)
+    runner = Pregenerator(
+        processes=max(1, args.processes),
+        fetchers=max(1, args.fetchers),
+        concurrency=max(1, args.concurrency),
+        batch_size=max(1, args.batch_size),
+        with_topics=not args.no_related_topics,
+        source=args.source
+    )
+    
+    print(f"🔄 Pre-generating {len(urls)} article(s)")
+    start = time.perf_counter()
+    try:
+        asyncio.run(runner.run(urls))
+    except KeyboardInterrupt:
+        print("⚠️  Interrupted: run the same command again to resume")
+    finally:
+        fetcher.close()
+        close_connections()
+    elapsed = time.perf_counter() - start
+    
+    report = {
+        **runner.counts,
+        "elapsed_s": round(elapsed, 3),
+        "articles_per_minute": round(runner.counts["generated"] / elapsed * 60, 2) if elapsed else 0.0,
+        "stages": runner.timer.summary(),
+        "rate_limit": rate_limit_stats(),
+        "prompt_cache": prompt_cache_stats(),
+        "output_repair": output_repair_stats(),
+        "failures": runner.failures,
+    }
+    
+    print(f"\n{runner.counts['generated']} generated, {runner.counts['skipped']} already stored, "
+          f"{runner.counts['failed']} failed of {runner.counts['total']} in {elapsed:.1f}s "
+          f"({report['articles_per_minute']} articles/min)")
+    print(f"{'stage':<10}{'count':>7}{'total s':>10}{'p50 s':>9}{'p95 s':>9}")
+    for stage, stats in report["stages"].items():
+        print(f"{stage:<10}{stats['count']:>7}{stats['total_s']:>10}{stats['p50_s']:>9}{stats['p95_s']:>9}")
+    
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    
+    if runner.counts["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
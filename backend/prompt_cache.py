@@ -0,0 +1,173 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from db import get_db
+from logs import get_logger
+
+log = get_logger(__name__)
+
+# Eviction (expired rows, then least recently used beyond the cap) runs
+# once every this many stores rather than on each one
+EVICT_EVERY = 64
+
+# sqlite3.OperationalError messages that will not go away by retrying:
+# read-only deployments, where the table could not even be created
+_PERMANENT_ERRORS = ("readonly database", "read-only", "unable to open database", "permission denied", "no such table")
+
+
+class PromptCache:
+    """
+    Persistent LLM response cache, keyed by a hash of (model, temperature,
+    prompt, variant).
+    
+    Rows live in the llm_cache table, so every worker process shares them.
+    Entries expire ttl seconds after they were stored; beyond max_entries
+    the least recently used ones are evicted. Methods are blocking (run
+    them through db.run_db from async code).
+    """
+
+    def __init__(self, ttl: float, max_entries: int, enabled: bool = True):
+        """
+        Args:
+            ttl: Seconds a stored response stays valid
+            max_entries: Rows kept before LRU eviction
+            enabled: False turns get/put into no-ops
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "errors": 0}
+        self._stores_since_evict = 0
+
+    @staticmethod
+    def key(model: str, temperature, prompt: str, variant: int = 0) -> str:
+        """
+        Cache key of a prompt. variant tells apart calls that send the same
+        prompt but need different answers (two slots of one quiz).
+        """
+        payload = json.dumps([model, temperature, variant, prompt], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self._counters[name] += n
+
+    def get(self, key: str):
+        """Return the cached response text for key, or None."""
+        if not self.enabled:
+            return None
+        
+        now = time.time()
+        try:
+            with get_db() as conn:
+                row = conn.execute(
+                    "SELECT response FROM llm_cache WHERE key = ? AND created_at >= ?",
+                    (key, now - self.ttl)
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE llm_cache SET last_used_at = ?, hits = hits + 1 WHERE key = ?",
+                        (now, key)
+                    )
+                    conn.commit()
+        except sqlite3.Error as e:
+            self._on_error(e)
+            self._count("misses")
+            return None
+        
+        self._count("hits" if row is not None else "misses")
+        return row[0] if row is not None else None
+
+    def put(self, key: str, model: str, response: str):
+        """Store a response (replacing an expired entry under the same key)."""
+        if not self.enabled:
+            return
+        
+        now = time.time()
+        try:
+            with get_db() as conn:
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO llm_cache (key, model, response, created_at, last_used_at, hits)
+                    VALUES (?, ?, ?, ?, ?, 0)
+                    """,
+                    (key, model, response, now, now)
+                )
+                conn.commit()
+                
+                with self._lock:
+                    self._stores_since_evict += 1
+                    evict = self._stores_since_evict >= EVICT_EVERY
+                    if evict:
+                        self._stores_since_evict = 0
+                if evict:
+                    self.evict(conn)
+        except sqlite3.Error as e:
+            self._on_error(e)
+            return
+        
+        self._count("stores")
+
+    def evict(self, conn=None) -> int:
+        """Delete expired entries and the least recently used ones beyond max_entries."""
+        if conn is None:
+            with get_db() as conn:
+                return self.evict(conn)
+        
+        expired = conn.execute(
+            "DELETE FROM llm_cache WHERE created_at < ?",
+            (time.time() - self.ttl,)
+        ).rowcount
+        overflow = conn.execute(
+            """
+            DELETE FROM llm_cache WHERE key IN (
+                SELECT key FROM llm_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,)
+        ).rowcount
+        conn.commit()
+        
+        self._count("evictions", expired + overflow)
+        return expired + overflow
+
+    def _on_error(self, error: sqlite3.Error):
+        """
+        Never fail a call over the cache. Read-only deployments turn it off
+        for good; anything else ("database is locked" past the busy
+        timeout) only costs this lookup or store.
+        """
+        message = str(error).lower()
+        if isinstance(error, sqlite3.OperationalError) and any(m in message for m in _PERMANENT_ERRORS):
+            log.warning("LLM response cache disabled", extra={"error": str(error)})
+            self.enabled = False
+            return
+        
+        self._count("errors")
+        log.warning("LLM response cache unavailable, skipping it for this call", extra={"error": str(error)})
+
+    def stats(self) -> dict:
+        """Hit/miss counters of this process, plus the shared table's size."""
+        with self._lock:
+            counters = dict(self._counters)
+        
+        entries = None
+        if self.enabled:
+            try:
+                with get_db() as conn:
+                    entries = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            except sqlite3.Error:
+                pass
+        
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            "enabled": self.enabled,
+            "ttl_seconds": self.ttl,
+            "max_entries": self.max_entries,
+            "entries": entries,
+            **counters,
+            "hit_rate": round(counters["hits"] / lookups, 3) if lookups else 0.0,
+        }
@@ -0,0 +1,241 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+from config import (
+    LLM_PROVIDER,
+    GEMINI_MODEL,
+    STUB_LLM_LATENCY_SECONDS,
+    STUB_LLM_FAILURE_RATE,
+    STUB_LLM_MALFORMED_RATE,
+    STUB_LLM_RATE_LIMIT_RATE,
+    STUB_LLM_SEED,
+)
+
+
+class LLMProvider:
+    """
+    What llm.py needs from a chat model: one async call, prompt in, text out.
+    
+    ainvoke returns an object with .content (the reply text) and optionally
+    .usage_metadata ({"total_tokens": ...}), like a langchain AIMessage.
+    """
+    
+    name = "base"
+    model_name = "unknown"
+    # Part of the response cache key: answers at other temperatures differ
+    temperature = 0.0
+
+    async def ainvoke(self, prompt: str, timeout: float = None):
+        raise NotImplementedError
+
+
+# ============ GEMINI ============
+class GeminiProvider(LLMProvider):
+    """
+    Google Gemini through langchain.
+    
+    The langchain client is built on the first call: importing the Google
+    SDK takes most of a second, which a cold start serving a health check
+    or a cached quiz should not pay.
+    """
+    
+    name = "gemini"
+
+    def __init__(self, model: str = GEMINI_MODEL, api_key: str = None, temperature: float = 0.3):
+        self.model_name = model
+        self.temperature = temperature
+        self.api_key = api_key
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                # Imported here so the stub provider runs without the Google SDK
+                from langchain_google_genai import ChatGoogleGenerativeAI
+                
+                self._client = ChatGoogleGenerativeAI(
+                    model=self.model_name,
+                    google_api_key=self.api_key or os.getenv("GOOGLE_API_KEY"),
+                    temperature=self.temperature
+                )
+            return self._client
+
+    async def ainvoke(self, prompt: str, timeout: float = None):
+        client = self._client
+        if client is None:
+            # The first call pays the SDK import: keep it off the event loop
+            client = await asyncio.to_thread(lambda: self.client)
+        return await client.ainvoke(prompt, timeout=timeout)
+
+
+# ============ LOCAL STUB ============
+class StubResponse:
+    def __init__(self, content: str, usage_metadata: dict):
+        self.content = content
+        self.usage_metadata = usage_metadata
+
+
+class StubProvider(LLMProvider):
+    """
+    Offline stand-in for Gemini, for benchmarks and load tests.
+    
+    Answers every prompt llm.py sends (single question, batch, title
+    fallback, related topics) with schema-valid JSON built from the prompt
+    text, after a simulated latency. Configured fractions of calls instead
+    fail (server error), return malformed JSON or raise a 429.
+    
+    Outcomes are deterministic: each is drawn from a generator seeded with
+    the seed, the prompt and how often that prompt was sent before, so a run
+    does not depend on the order concurrent calls happen to arrive in, and
+    a retried prompt gets a fresh draw.
+    """
+    
+    name = "stub"
+    model_name = "stub"
+
+    def __init__(
+        self,
+        latency: float = STUB_LLM_LATENCY_SECONDS,
+        failure_rate: float = STUB_LLM_FAILURE_RATE,
+        malformed_rate: float = STUB_LLM_MALFORMED_RATE,
+        rate_limit_rate: float = STUB_LLM_RATE_LIMIT_RATE,
+        seed: int = STUB_LLM_SEED
+    ):
+        """
+        Args:
+            latency: Mean seconds per call (each call varies by +/-20%)
+            failure_rate: Fraction of calls raising a 503 error
+            malformed_rate: Fraction of calls returning invalid JSON
+            rate_limit_rate: Fraction of calls raising 429 RESOURCE_EXHAUSTED
+            seed: Seed of the outcome draws
+        """
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.malformed_rate = malformed_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.seed = seed
+        self._sent = {}
+        self.calls = 0
+
+    def _rng(self, prompt: str) -> random.Random:
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        attempt = self._sent.get(digest, 0)
+        self._sent[digest] = attempt + 1
+        return random.Random(f"{self.seed}:{digest}:{attempt}")
+
+    async def ainvoke(self, prompt: str, timeout: float = None):
+        self.calls += 1
+        rng = self._rng(prompt)
+        latency = self.latency * rng.uniform(0.8, 1.2)
+        
+        if timeout is not None and latency > timeout:
+            await asyncio.sleep(timeout)
+            raise Exception("504 DEADLINE_EXCEEDED: stub call timed out")
+        await asyncio.sleep(latency)
+        
+        draw = rng.random()
+        if draw < self.rate_limit_rate:
+            raise Exception("429 RESOURCE_EXHAUSTED: stub quota exceeded")
+        draw -= self.rate_limit_rate
+        if draw < self.failure_rate:
+            raise Exception("503 UNAVAILABLE: stub server error")
+        draw -= self.failure_rate
+        
+        if draw < self.malformed_rate:
+            content = '```json\n{"question": "Truncated stub answer", "options": ["A) '
+        else:
+            content = json.dumps(self._answer(prompt, rng))
+        
+        return StubResponse(content, {
+            "input_tokens": len(prompt) // 4,
+            "output_tokens": len(content) // 4,
+            "total_tokens": (len(prompt) + len(content)) // 4,
+        })
+
+    # Replies are recognised by the fixed parts of llm.py's prompts
+    def _answer(self, prompt: str, rng: random.Random):
+        title = _match(r'Article Title: "(.*)"', prompt) or _match(r'(?:quiz|questions) about "(.*)"', prompt) or "the article"
+        
+        if "Article Title:" in prompt:
+            excerpt = prompt.split("Article Content (excerpt):", 1)[-1].split("\nTask:", 1)[0]
+            return _topics(title, excerpt, rng)
+        
+        if '"questions": [' in prompt:
+            slots = re.findall(r'^\d+\. (easy|medium|hard)(?: - from section "(.*)")?$', prompt, re.M)
+            text = prompt.split("ARTICLE TEXT:", 1)[1] if "ARTICLE TEXT:" in prompt else title
+            return {"questions": [
+                _question(difficulty, section or title, text, rng) for difficulty, section in slots
+            ]}
+        
+        difficulty = _match(r"Difficulty MUST be: (\w+)", prompt) or _match(r"question at (\w+) level", prompt) or "easy"
+        section = _match(r'"section": "(.*)",', prompt) or title
+        text = prompt.split("SECTION TEXT:", 1)[1] if "SECTION TEXT:" in prompt else title
+        return _question(difficulty, section, text, rng)
+
+
+def _match(pattern: str, text: str):
+    found = re.search(pattern, text)
+    return found.group(1) if found else None
+
+
+def _sentences(text: str) -> list:
+    return [s.strip() for s in re.split(r"(?<=[.!?])\s+", text) if len(s.strip()) > 20]
+
+
+def _question(difficulty: str, section: str, text: str, rng: random.Random) -> dict:
+    sentences = _sentences(text) or [f"{section} is covered in the article."]
+    fact = rng.choice(sentences)[:120]
+    options = [fact, "None of the statements in the section", "The opposite of the section's claim", "A fact from another article"]
+    answer = rng.randrange(4)
+    options[0], options[answer] = options[answer], options[0]
+    
+    return {
+        "question": f"Which statement is supported by the section \"{section}\"?",
+        "options": [f"{letter}) {option}" for letter, option in zip("ABCD", options)],
+        "answer": "ABCD"[answer],
+        "difficulty": difficulty,
+        "section": section,
+        "explanation": f"The section states: {fact}",
+    }
+
+
+def _topics(title: str, content: str, rng: random.Random) -> dict:
+    # Capitalised phrases inside sentences (not sentence starts) stand in
+    # for related concepts
+    candidates = list(dict.fromkeys(
+        phrase for phrase in re.findall(r"(?<=[a-z,;] )[A-Z][a-z]+(?: [A-Z][a-z]+)*", content)
+        if phrase != title
+    ))
+    rng.shuffle(candidates)
+    topics = (candidates + [f"{title} topic {n}" for n in range(1, 6)])[:5]
+    
+    return {
+        "topics": topics,
+        "wiki_links": [f"https://en.wikipedia.org/wiki/{topic.replace(' ', '_')}" for topic in topics],
+    }
+
+
+PROVIDERS = {
+    "gemini": GeminiProvider,
+    "stub": StubProvider,
+}
+
+
+def create_provider(name: str = None, **kwargs) -> LLMProvider:
+    """
+    Create the LLM provider selected by name (default LLM_PROVIDER).
+    
+    Args:
+        name: "gemini" or "stub"
+        **kwargs: Passed to the provider's constructor
+    """
+    name = (name or LLM_PROVIDER).lower()
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown LLM_PROVIDER '{name}'. Use one of: {', '.join(PROVIDERS)}")
+    return PROVIDERS[name](**kwargs)
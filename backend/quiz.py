@@ -1,7 +1,11 @@
 from llm import generate_quiz_from_text, extract_related_topics_from_content
+from resilience import ResilienceError
+from logs import get_logger
 import json
 
-def build_quiz_from_text(text: str, title: str = "Wikipedia Article") -> list:
+log = get_logger(__name__)
+
+async def build_quiz_from_text(text: str, title: str = "Wikipedia Article", sections: dict = None, on_question=None) -> list:
     """
     Build quiz from Wikipedia text with error handling.
     
@@ -11,6 +15,8 @@ def build_quiz_from_text(text: str, title: str = "Wikipedia Article") -> list:
     Args:
         text: The Wikipedia article text
         title: The article title (used for fallback generation)
+        sections: {section name: text} breakdown, so each question gets its own excerpt
+        on_question: Optional callback (slot index, question) for each question as it is ready
     
     Returns:
         list: Array of 6 quiz questions (2 easy, 2 medium, 2 hard)
@@ -21,7 +27,7 @@ def build_quiz_from_text(text: str, title: str = "Wikipedia Article") -> list:
     try:
         # Generate quiz - passes title for fallback mode
         # Returns 6 questions: 2 easy, 2 medium, 2 hard
-        quiz = generate_quiz_from_text(text, title)
+        quiz = await generate_quiz_from_text(text, title, sections=sections, on_question=on_question)
         
         if not quiz:
             raise ValueError("Empty quiz generated")
@@ -32,14 +38,17 @@ def build_quiz_from_text(text: str, title: str = "Wikipedia Article") -> list:
         if len(quiz) < 6:
             raise ValueError(f"Quiz has only {len(quiz)} questions (need 6: 2 easy, 2 medium, 2 hard)")
         
-        print(f"✅ Quiz built: {len(quiz)} questions (2 easy, 2 medium, 2 hard)")
+        log.debug("Quiz built", extra={"questions": len(quiz)})
         return quiz
-        
+    
+    except ResilienceError:
+        # Kept as is: the API answers these with 503/504
+        raise
     except Exception as e:
         raise Exception(str(e))
 
 
-def get_related_topics_from_content(title: str, content: str) -> dict:
+async def get_related_topics_from_content(title: str, content: str, use_cache: bool = True) -> dict:
     """
     Extract related topics and Wikipedia links from article content using AI.
     
@@ -52,26 +61,26 @@ def get_related_topics_from_content(title: str, content: str) -> dict:
     Args:
         title: The Wikipedia article title
         content: The full article content/text
+        use_cache: False to bypass the LLM response cache
     
     Returns:
         dict: Contains 'topics' (list of 5) and 'related_links' (list of 5 URLs)
     """
     
     try:
-        print(f"🔗 Extracting related topics from article content for: {title}")
+        log.debug("Extracting related topics", extra={"title": title})
         
         # Try to extract from content using AI
-        related = extract_related_topics_from_content(title, content)
+        related = await extract_related_topics_from_content(title, content, use_cache=use_cache)
         
         if related and len(related.get("topics", [])) >= 5:
-            print(f"✅ Extracted 5 related topics from article content")
+            log.debug("Related topics extracted", extra={"title": title})
             return related
         else:
-            print(f"⚠️  Could not extract 5 topics from content, using fallback")
             raise Exception("Insufficient topics extracted")
             
     except Exception as e:
-        print(f"⚠️  Error extracting topics from content: {str(e)}")
+        log.warning("Could not extract related topics, using fallback", extra={"title": title, "error": str(e)})
         
         # Fallback: Return minimal structure
         return {
@@ -0,0 +1,269 @@
+import asyncio
+import heapq
+import itertools
+import sqlite3
+import statistics
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from db import get_db, run_db
+from logs import get_logger
+
+log = get_logger(__name__)
+
+# Lower runs first: interactive quiz generation goes ahead of background
+# work (topic extraction, pre-warming) waiting for the same quota
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BACKGROUND: "background"}
+
+# Priority of LLM calls made by the current task when a call does not pass one
+llm_priority = ContextVar("llm_priority", default=PRIORITY_INTERACTIVE)
+
+# After a 429 every caller sharing the bucket pauses this long
+RATE_LIMIT_PENALTY_SECONDS = 5.0
+
+
+def refill(level: float, updated_at: float, capacity: float, rate: float, now: float) -> float:
+    """Bucket level at now, given its level at updated_at and a refill rate per second."""
+    return min(capacity, level + max(0.0, now - updated_at) * rate)
+
+
+class TokenBucketLimiter:
+    """
+    Requests-per-minute and tokens-per-minute buckets for one LLM quota.
+    
+    Each call takes one request and its estimated tokens before it is
+    sent; when a bucket is short the caller sleeps until it has refilled.
+    Bucket levels live in SQLite (one IMMEDIATE transaction per take), so
+    every thread and uvicorn worker draws from the same quota. Waiting
+    callers in this process form a priority queue: only the head of the
+    queue takes from the buckets, and it wakes the next one when done.
+    """
+
+    def __init__(self, rpm: int, tpm: int, persist: bool = True, name: str = "gemini"):
+        """
+        Args:
+            rpm: Requests per minute (0 = unlimited)
+            tpm: Tokens per minute (0 = unlimited)
+            persist: Keep bucket levels in the database (else in memory)
+            name: Prefix of the bucket rows
+        """
+        self.requests_bucket = f"{name}:requests"
+        self.tokens_bucket = f"{name}:tokens"
+        # Capacity is one minute of quota; refill rate is capacity / 60 per second
+        self.capacities = {}
+        if rpm:
+            self.capacities[self.requests_bucket] = float(rpm)
+        if tpm:
+            self.capacities[self.tokens_bucket] = float(tpm)
+        self.persist = persist
+        
+        self._lock = threading.Lock()
+        self._memory = {}
+        self._waiters = []
+        self._seq = itertools.count()
+        self._waits = deque(maxlen=1000)
+        self._stats = {}
+        self.rate_limit_errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.capacities)
+
+    def _rate(self, bucket: str) -> float:
+        return self.capacities[bucket] / 60.0
+
+    # ============ BUCKET STORAGE ============
+    def _transact(self, step):
+        """
+        Run step(levels) -> (result, new levels or None) on the current
+        bucket levels and store the new levels atomically.
+        """
+        now = time.time()
+        
+        if self.persist:
+            try:
+                return self._transact_db(step, now)
+            except sqlite3.Error as e:
+                # Read-only deployments: keep limiting, per process
+                log.warning("Rate limiter falling back to in-memory buckets", extra={"error": str(e)})
+                self.persist = False
+        
+        with self._lock:
+            levels = {
+                bucket: refill(*self._memory.get(bucket, (capacity, now)), capacity, self._rate(bucket), now)
+                for bucket, capacity in self.capacities.items()
+            }
+            result, new_levels = step(levels)
+            for bucket, level in (new_levels or {}).items():
+                self._memory[bucket] = (level, now)
+        return result
+
+    def _transact_db(self, step, now: float):
+        with get_db() as conn:
+            # IMMEDIATE takes the write lock up front, so two workers cannot
+            # both read the same level and spend it twice
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                stored = {
+                    row[0]: (row[1], row[2])
+                    for row in conn.execute(
+                        f"SELECT name, tokens, updated_at FROM rate_limit_buckets WHERE name IN ({','.join('?' * len(self.capacities))})",
+                        list(self.capacities)
+                    )
+                }
+                levels = {
+                    bucket: refill(*stored.get(bucket, (capacity, now)), capacity, self._rate(bucket), now)
+                    for bucket, capacity in self.capacities.items()
+                }
+                result, new_levels = step(levels)
+                if new_levels:
+                    conn.executemany(
+                        """
+                        INSERT INTO rate_limit_buckets (name, tokens, updated_at) VALUES (?, ?, ?)
+                        ON CONFLICT(name) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at
+                        """,
+                        [(bucket, level, now) for bucket, level in new_levels.items()]
+                    )
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        return result
+
+    def _take(self, costs: dict) -> float:
+        """Take costs from the buckets if all have enough; else seconds until they will."""
+        def step(levels):
+            wait = max(
+                ((cost - levels[bucket]) / self._rate(bucket) for bucket, cost in costs.items() if cost > levels[bucket]),
+                default=0.0
+            )
+            if wait > 0:
+                return wait, None
+            return 0.0, {bucket: levels[bucket] - cost for bucket, cost in costs.items()}
+        
+        return self._transact(step)
+
+    # ============ ACQUIRE ============
+    async def acquire(self, tokens: int, priority: int = None) -> float:
+        """
+        Wait until one request and tokens fit the quota, then take them.
+        
+        Args:
+            tokens: Estimated tokens of the call (prompt + expected output)
+            priority: PRIORITY_* (default: llm_priority of the current task)
+        
+        Returns:
+            float: Seconds spent waiting
+        """
+        if not self.enabled:
+            return 0.0
+        if priority is None:
+            priority = llm_priority.get()
+        
+        costs = {}
+        if self.requests_bucket in self.capacities:
+            costs[self.requests_bucket] = 1.0
+        if self.tokens_bucket in self.capacities:
+            # A call larger than the bucket would wait forever: cap it
+            costs[self.tokens_bucket] = float(min(tokens, self.capacities[self.tokens_bucket]))
+        
+        # [priority, seq, loop, wakeup]: seq keeps FIFO order within a priority
+        entry = [priority, next(self._seq), asyncio.get_running_loop(), asyncio.Event()]
+        with self._lock:
+            heapq.heappush(self._waiters, entry)
+        
+        start = time.perf_counter()
+        throttled = False
+        try:
+            while True:
+                entry[3].clear()
+                with self._lock:
+                    is_head = self._waiters[0] is entry
+                
+                if is_head:
+                    wait = await run_db(self._take, costs)
+                    if wait == 0:
+                        break
+                    throttled = True
+                else:
+                    # Woken by the previous head when it leaves the queue
+                    wait = 1.0
+                
+                try:
+                    # Re-check at least every second: a higher priority
+                    # caller may have become head in the meantime
+                    await asyncio.wait_for(entry[3].wait(), min(wait, 1.0))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._lock:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                head = self._waiters[0] if self._waiters else None
+            if head is not None:
+                head[2].call_soon_threadsafe(head[3].set)
+        
+        waited = time.perf_counter() - start
+        self._record(priority, waited, throttled)
+        return waited
+
+    async def adjust(self, tokens: int):
+        """Charge (or refund, if negative) the difference between estimated and actual tokens."""
+        if not tokens or self.tokens_bucket not in self.capacities:
+            return
+        capacity = self.capacities[self.tokens_bucket]
+        await run_db(self._transact, lambda levels: (
+            None, {self.tokens_bucket: min(capacity, levels[self.tokens_bucket] - tokens)}
+        ))
+
+    async def record_rate_limit_error(self):
+        """The API answered 429 anyway: make everyone sharing the quota pause."""
+        with self._lock:
+            self.rate_limit_errors += 1
+        if self.requests_bucket not in self.capacities:
+            return
+        penalty = self._rate(self.requests_bucket) * RATE_LIMIT_PENALTY_SECONDS
+        await run_db(self._transact, lambda levels: (
+            None, {self.requests_bucket: min(levels[self.requests_bucket], 0.0) - penalty}
+        ))
+
+    # ============ METRICS ============
+    def _record(self, priority: int, waited: float, throttled: bool):
+        name = PRIORITY_NAMES.get(priority, str(priority))
+        with self._lock:
+            stats = self._stats.setdefault(name, {
+                "calls": 0,
+                "throttled": 0,
+                "wait_seconds_total": 0.0,
+                "wait_seconds_max": 0.0,
+            })
+            stats["calls"] += 1
+            stats["throttled"] += int(throttled)
+            stats["wait_seconds_total"] += waited
+            stats["wait_seconds_max"] = max(stats["wait_seconds_max"], waited)
+            self._waits.append(waited)
+
+    def stats(self) -> dict:
+        """Quota settings and waiting-time metrics since startup."""
+        with self._lock:
+            waits = sorted(self._waits)
+            by_priority = {name: {**s, "wait_seconds_total": round(s["wait_seconds_total"], 3),
+                                  "wait_seconds_max": round(s["wait_seconds_max"], 3)}
+                           for name, s in self._stats.items()}
+            queued = len(self._waiters)
+        
+        return {
+            "enabled": self.enabled,
+            "requests_per_minute": self.capacities.get(self.requests_bucket),
+            "tokens_per_minute": self.capacities.get(self.tokens_bucket),
+            "shared": self.persist,
+            "queued": queued,
+            "rate_limit_errors": self.rate_limit_errors,
+            # Over the last (up to) 1000 calls
+            "wait_p50_seconds": round(statistics.median(waits), 3) if waits else 0.0,
+            "wait_p95_seconds": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 3) if waits else 0.0,
+            "by_priority": by_priority,
+        }
@@ -0,0 +1,272 @@
+import asyncio
+import functools
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logs import get_logger
+
+log = get_logger(__name__)
+
+# Absolute time.monotonic() by which the current request must be done
+# (None = no deadline). Set once per generation with deadline_scope; every
+# scrape and LLM call made by the request's tasks reads it from here
+request_deadline = ContextVar("request_deadline", default=None)
+
+
+class ResilienceError(Exception):
+    """A call refused without being attempted (or abandoned) to fail fast."""
+
+
+class DeadlineExceeded(ResilienceError):
+    """The request's deadline passed before the call could complete."""
+
+
+class CircuitOpenError(ResilienceError):
+    """The circuit breaker is open: the service has been failing."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RetryBudgetExhausted(ResilienceError):
+    """Too many retries process-wide: give up instead of adding load."""
+
+
+# ============ DEADLINE ============
+@contextmanager
+def deadline_scope(seconds: float):
+    """Run the block (and tasks started in it) with a deadline seconds from now."""
+    token = request_deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        request_deadline.reset(token)
+
+
+def remaining():
+    """Seconds left before the current deadline, or None without one."""
+    deadline = request_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def clamp_timeout(timeout: float = None):
+    """
+    A call's timeout cut down to the time left before the deadline.
+    
+    Raises:
+        DeadlineExceeded: The deadline has already passed
+    """
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+    return left if timeout is None else min(timeout, left)
+
+
+async def within_deadline(awaitable, timeout: float = None):
+    """
+    Await something, but no longer than timeout or the current deadline.
+    
+    Raises:
+        DeadlineExceeded: The deadline passed first
+        asyncio.TimeoutError: timeout passed first
+    """
+    try:
+        limit = clamp_timeout(timeout)
+    except DeadlineExceeded:
+        # Never awaited: close it so Python does not warn about it
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise
+    
+    if limit is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, limit)
+    except asyncio.TimeoutError:
+        left = remaining()
+        if left is not None and left <= 0:
+            raise DeadlineExceeded("Request deadline exceeded") from None
+        raise
+
+
+# ============ BACKOFF AND RETRIES ============
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with full jitter: uniform in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class RetryBudget:
+    """
+    Process-wide cap on retries, relative to the calls being made.
+    
+    Over the last window seconds, retries may be at most ratio times the
+    calls made (plus a floor of minimum), so when most calls fail the
+    retries stop multiplying the load instead of tripling it.
+    """
+
+    def __init__(self, ratio: float, minimum: int, window: float = 60.0):
+        self.ratio = ratio
+        self.minimum = minimum
+        self.window = window
+        self._lock = threading.Lock()
+        self._calls = deque()
+        self._retries = deque()
+        self.exhausted = 0
+
+    def _trim(self, now: float):
+        for events in (self._calls, self._retries):
+            while events and events[0] < now - self.window:
+                events.popleft()
+
+    def record_call(self):
+        """Count one call made (first attempt or retry)."""
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            self._calls.append(now)
+
+    def allow_retry(self, count: int = 1) -> bool:
+        """Take count retries from the budget; False (and nothing taken) if it is spent."""
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            if len(self._retries) + count > self.minimum + self.ratio * len(self._calls):
+                self.exhausted += 1
+                return False
+            self._retries.extend([now] * count)
+            return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._trim(time.monotonic())
+            return {
+                "ratio": self.ratio,
+                "minimum": self.minimum,
+                "window_seconds": self.window,
+                "calls": len(self._calls),
+                "retries": len(self._retries),
+                "exhausted": self.exhausted,
+            }
+
+
+def retrying(attempts: int, retry_if, budget: RetryBudget, base: float, cap: float, on_retry=None):
+    """
+    Decorator retrying an async function on errors retry_if accepts.
+    
+    Retries back off with full jitter, take from the retry budget and
+    never sleep past the request deadline; ResilienceErrors (deadline,
+    open circuit, spent budget) are raised at once.
+    
+    Args:
+        attempts: Calls at most, including the first
+        retry_if: Predicate (exception -> bool) for retryable errors
+        budget: Shared RetryBudget
+        base: Backoff before the first retry (doubling after each)
+        cap: Longest backoff
+        on_retry: Optional callback (exception) before each retry
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            for attempt in range(attempts):
+                try:
+                    return await fn(*args, **kwargs)
+                except ResilienceError:
+                    raise
+                except Exception as e:
+                    if attempt == attempts - 1 or not retry_if(e):
+                        raise
+                    
+                    delay = backoff_delay(attempt, base, cap)
+                    left = remaining()
+                    if left is not None and delay >= left:
+                        raise
+                    if not budget.allow_retry():
+                        log.warning("Retry budget spent, not retrying", extra={"error": str(e)})
+                        raise
+                    if on_retry is not None:
+                        on_retry(e)
+                    await asyncio.sleep(delay)
+        return wrapper
+    return decorate
+
+
+# ============ CIRCUIT BREAKER ============
+class CircuitBreaker:
+    """
+    Fails calls fast while a service keeps failing.
+    
+    closed: calls go through; failure_threshold failures in a row open it.
+    open: calls raise CircuitOpenError for reset_timeout seconds.
+    half-open: calls go through again; the first outcome decides: a
+    success closes the circuit, a failure opens it for another
+    reset_timeout. (Letting the slots of one quiz through together
+    avoids failing the request that happens to find the service back.)
+    
+    State is per process (every uvicorn worker finds out on its own).
+    """
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, name: str = "gemini"):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.name = name
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._counts = {"opened": 0, "rejected": 0}
+
+    def _retry_after(self, now: float) -> float:
+        return max(0.0, self._opened_at + self.reset_timeout - now)
+
+    def check(self):
+        """Raise CircuitOpenError unless a call may go out now."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.OPEN and self._retry_after(now) == 0:
+                self.state = self.HALF_OPEN
+            if self.state != self.OPEN:
+                return
+            
+            self._counts["rejected"] += 1
+            retry_after = self._retry_after(now)
+        raise CircuitOpenError(
+            f"{self.name} is failing: circuit open, retry in {retry_after:.0f}s",
+            retry_after
+        )
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self._counts["opened"] += 1
+                    log.warning("Circuit breaker opened", extra={"circuit": self.name, "failures": self.failures})
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "retry_after_seconds": round(self._retry_after(time.monotonic()), 1) if self.state == self.OPEN else 0.0,
+                **self._counts,
+            }
@@ -1,9 +1,11 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 
 class QuizRequest(BaseModel):
     url: str
+    # Article source: "http" or "dump" (default: ARTICLE_SOURCE)
+    source: Optional[str] = None
 
 
 class QuizQuestion(BaseModel):
@@ -29,3 +31,24 @@ class QuizHistoryItem(BaseModel):
     title: str
     url: str
     created_at: str
+
+
+class QuizHistoryPage(BaseModel):
+    items: List[QuizHistoryItem]
+    # Pass as after_id to get the next page; None on the last page
+    next_after_id: Optional[int] = None
+
+
+class JobStatus(BaseModel):
+    id: int
+    url: str
+    # queued, running, succeeded or failed
+    status: str
+    # Pipeline stage of a running job (checking_cache, scraping, generating_quiz, collecting_topics)
+    stage: Optional[str] = None
+    # Set once the job has succeeded: GET /api/quizzes/{quiz_id}
+    quiz_id: Optional[int] = None
+    error: Optional[str] = None
+    attempts: int
+    created_at: str
+    updated_at: str
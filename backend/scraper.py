@@ -1,39 +1,92 @@
-import requests
-from bs4 import BeautifulSoup
-from utils import http_500
+import asyncio
+import re
+from extract import extract_page
+from fetcher import fetcher
+from metrics import STAGE_SECONDS
+from resilience import DeadlineExceeded, within_deadline
+from utils import http_500, canonicalize_wikipedia_url
 
+# "[edit]" links after headings ("[ edit ]" once text nodes are space-joined)
+EDIT_LINK_PATTERN = re.compile(r"\[\s*edit\s*(source\s*)?\]", re.IGNORECASE)
 
-def scrape_wikipedia(url: str) -> dict:
+
+async def scrape_wikipedia(url: str) -> dict:
     """
     Scrapes an English Wikipedia article.
     Extracts the title, full text content, and section-wise text.
+    The ETag/Last-Modified validators are returned for later revalidation.
+    HTML parsing runs on a worker thread so the event loop stays free.
+    The fetch is abandoned at the request deadline (DeadlineExceeded).
     """
-    headers = {
-        'User-Agent': 'WikiQuizGenerator/1.0 (Educational Project; contact: your@email.com)'
-    }
+    try:
+        with STAGE_SECONDS.time(stage="fetch"):
+            response = await within_deadline(fetcher.fetch_async(url))
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        http_500(f"Failed to fetch Wikipedia article: {str(e)}")
     
+    with STAGE_SECONDS.time(stage="parse"):
+        scraped = await asyncio.to_thread(parse_wikipedia_html, response.text, response.url)
+    scraped["etag"] = response.etag
+    scraped["last_modified"] = response.last_modified
+    return scraped
+
+
+async def revalidate_wikipedia(url: str, etag: str = None, last_modified: str = None):
+    """
+    Check whether a stored article changed, using a conditional GET.
+    
+    Returns:
+        dict: Freshly scraped article (same shape as scrape_wikipedia),
+              or None if Wikipedia answered 304 Not Modified
+    """
     try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
+        with STAGE_SECONDS.time(stage="fetch"):
+            response = await within_deadline(fetcher.fetch_async(url, etag, last_modified))
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         http_500(f"Failed to fetch Wikipedia article: {str(e)}")
     
-    soup = BeautifulSoup(response.text, 'html.parser')
+    if response.not_modified:
+        return None
     
-    # 1. Extract Title
-    title_tag = soup.find(id="firstHeading")
-    title = title_tag.get_text() if title_tag else "Wikipedia Topic"
+    with STAGE_SECONDS.time(stage="parse"):
+        scraped = await asyncio.to_thread(parse_wikipedia_html, response.text, response.url)
+    scraped["etag"] = response.etag
+    scraped["last_modified"] = response.last_modified
+    return scraped
+
+
+def parse_wikipedia_html(html: str, url: str, engine: str = None) -> dict:
+    """
+    Extracts the title, canonical URL, full text and section-wise text
+    from the HTML of an English Wikipedia article.
     
-    # 2. Extract Main Content Body
-    # We focus on the mw-parser-output class which contains the actual article text
-    content_div = soup.find(id="mw-content-text")
+    Args:
+        html: Page HTML
+        url: URL the page was fetched from
+        engine: HTML extraction engine (default HTML_EXTRACTOR, see extract.py)
+    """
+    page = extract_page(html, engine)
+    
+    # 1. Extract Title
+    title_text = page["title"]
+    title = title_text if title_text is not None else "Wikipedia Topic"
     
-    if content_div:
-        parser_output = content_div.find(class_="mw-parser-output")
+    # Final article URL after MediaWiki redirects (e.g. /wiki/Python_language
+    # is served as Python_(programming_language) with a canonical link)
+    if page["canonical_href"]:
+        canonical_url = canonicalize_wikipedia_url(page["canonical_href"])
+    elif title_text is not None:
+        canonical_url = canonicalize_wikipedia_url("https://en.wikipedia.org/wiki/" + title)
     else:
-        parser_output = None
+        canonical_url = canonicalize_wikipedia_url(url)
     
-    if not parser_output:
+    # 2. Extract Main Content Body
+    # We focus on the mw-parser-output class which contains the actual article text
+    if page["blocks"] is None:
         http_500("Could not identify the main content area of this article.")
     
     full_text_list = []
@@ -42,17 +95,16 @@ def scrape_wikipedia(url: str) -> dict:
     section_texts[current_section] = []
     
     # 3. Iterate through elements to organize by sections and build full text
-    for el in parser_output.children:
-        if el.name in ["h2", "h3"]:
+    for tag, block_text in page["blocks"]:
+        if tag in ["h2", "h3"]:
             # New section header found - clean the title (remove [edit] etc)
-            current_section = el.get_text(" ", strip=True).replace("[edit]", "").strip()
-            section_texts[current_section] = []
-        elif el.name == "p":
+            current_section = EDIT_LINK_PATTERN.sub("", block_text).strip() or current_section
+            section_texts.setdefault(current_section, [])
+        elif tag == "p":
             # Paragraph text found
-            para_text = el.get_text(" ", strip=True)
-            if para_text:
-                section_texts[current_section].append(para_text)
-                full_text_list.append(para_text)
+            if block_text:
+                section_texts[current_section].append(block_text)
+                full_text_list.append(block_text)
     
     # Clean up empty sections and join paragraphs
     final_sections = {
@@ -65,8 +117,9 @@ def scrape_wikipedia(url: str) -> dict:
     
     return {
         "title": title,
+        "canonical_url": canonical_url,
         "text": full_text,
         "sections": list(final_sections.keys()),
         "section_texts": final_sections,
-        "raw_html": response.text
+        "raw_html": html
     }
@@ -0,0 +1,156 @@
+"""
+Section selection: pick a different, relevant chunk of the article for
+each quiz question instead of sending the same opening text six times.
+
+Sections are ranked locally (no LLM call) by how densely they use the
+article's key terms (TF-IDF across sections, with the title's words
+boosted) and by length, then split into paragraph-aligned chunks that
+fit a character budget. Slots are filled round-robin across the ranked
+sections so the questions cover the whole article.
+"""
+import math
+import re
+from collections import Counter
+from config import QUESTION_CONTEXT_CHARS
+
+# Sections that hold lists/citations rather than article prose
+SKIPPED_SECTIONS = {
+    "references", "external links", "see also", "further reading", "notes",
+    "bibliography", "sources", "citations", "footnotes", "notes and references",
+    "works cited", "gallery",
+}
+
+# Sections shorter than this are not worth a question on their own
+MIN_SECTION_CHARS = 200
+
+STOPWORDS = set("""
+a about above after again against all also am an and any are as at be because been
+before being below between both but by can could did do does doing down during each
+few for from further had has have having he her here hers him his how i if in into is
+it its itself just more most my no nor not now of off on once only or other our out
+over own same she should so some such than that the their them then there these they
+this those through to too under until up very was we were what when where which while
+who whom why will with would you your
+""".split())
+
+
+def _tokens(text: str) -> list:
+    return [t for t in re.findall(r"[a-z0-9]+", text.lower()) if t not in STOPWORDS and len(t) > 2]
+
+
+def rank_sections(title: str, section_texts: dict) -> list:
+    """
+    Rank article sections by relevance.
+    
+    Args:
+        title: Article title
+        section_texts: {section name: section text} in article order
+    
+    Returns:
+        list: Section names, most relevant first
+    """
+    candidates = {
+        name: text
+        for name, text in section_texts.items()
+        if name.strip().lower() not in SKIPPED_SECTIONS and len(text) >= MIN_SECTION_CHARS
+    }
+    if not candidates:
+        # Short articles: use whatever prose there is
+        candidates = {name: text for name, text in section_texts.items() if text.strip()}
+    
+    counts = {name: Counter(_tokens(text)) for name, text in candidates.items()}
+    
+    # Article key terms: overall frequency x inverse section frequency
+    total = Counter()
+    document_frequency = Counter()
+    for counter in counts.values():
+        total.update(counter)
+        document_frequency.update(counter.keys())
+    
+    n_sections = len(counts)
+    weights = {
+        term: freq * math.log(1 + n_sections / document_frequency[term])
+        for term, freq in total.items()
+    }
+    for term in _tokens(title):
+        weights[term] = weights.get(term, 0) * 2 + 1
+    
+    keywords = dict(sorted(weights.items(), key=lambda kv: kv[1], reverse=True)[:50])
+    
+    scores = {}
+    for name, counter in counts.items():
+        length = sum(counter.values()) or 1
+        density = sum(keywords.get(term, 0) * freq for term, freq in counter.items()) / length
+        scores[name] = density * math.log(1 + length)
+    
+    return sorted(scores, key=lambda name: scores[name], reverse=True)
+
+
+def chunk_section(text: str, budget: int) -> list:
+    """Split a section into paragraph-aligned chunks of at most budget characters."""
+    chunks = []
+    current = ""
+    
+    for paragraph in (p.strip() for p in text.split("\n") if p.strip()):
+        if len(paragraph) > budget:
+            # One long paragraph: cut at the last sentence end inside the budget
+            if current:
+                chunks.append(current)
+                current = ""
+            while len(paragraph) > budget:
+                cut = paragraph.rfind(". ", 0, budget)
+                cut = cut + 1 if cut > budget // 2 else budget
+                chunks.append(paragraph[:cut].strip())
+                paragraph = paragraph[cut:].strip()
+            current = paragraph
+        elif len(current) + len(paragraph) + 1 > budget:
+            # current is empty when the paragraph fills the budget exactly
+            if current:
+                chunks.append(current)
+            current = paragraph
+        else:
+            current = f"{current}\n{paragraph}" if current else paragraph
+    
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def select_question_chunks(title: str, section_texts: dict, slots: int = 6, budget: int = None) -> list:
+    """
+    Choose a compact, relevant excerpt for each quiz slot.
+    
+    Args:
+        title: Article title
+        section_texts: {section name: section text} in article order
+        slots: Number of questions to plan for
+        budget: Max characters per excerpt (default QUESTION_CONTEXT_CHARS)
+    
+    Returns:
+        list: [(section name, excerpt), ...] with one entry per slot,
+              or [] if the article has no usable text
+    """
+    budget = budget or QUESTION_CONTEXT_CHARS
+    ranked = rank_sections(title, section_texts)
+    chunked = [(name, chunk_section(section_texts[name], budget)) for name in ranked]
+    chunked = [(name, chunks) for name, chunks in chunked if chunks]
+    
+    if not chunked:
+        return []
+    
+    # Round-robin: best chunk of every ranked section first, then second chunks...
+    picks = []
+    depth = 0
+    while len(picks) < slots and any(depth < len(chunks) for _, chunks in chunked):
+        for name, chunks in chunked:
+            if depth < len(chunks):
+                picks.append((name, chunks[depth]))
+                if len(picks) == slots:
+                    break
+        depth += 1
+    
+    # Fewer chunks than slots: reuse them (the slots differ in difficulty)
+    while len(picks) < slots:
+        picks.append(picks[len(picks) % len(picks)])
+    
+    return picks
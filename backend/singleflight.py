@@ -0,0 +1,100 @@
+import asyncio
+import os
+import uuid
+from db import get_db, run_db, claim_lease, release_lease
+from logs import get_logger
+from resilience import DeadlineExceeded, remaining
+
+log = get_logger(__name__)
+
+
+class SingleFlight:
+    """
+    In-process request coalescing.
+    
+    The first caller for a key starts the work as a task; callers that
+    arrive while it is still running await the same task and receive the
+    same result (or exception). The task is shielded, so one caller
+    disconnecting does not cancel the work for the others.
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key: str, fn):
+        """
+        Args:
+            key: Coalescing key (normalized article URL)
+            fn: Coroutine function that does the work
+        """
+        task = self._calls.get(key)
+        
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            log.info("Waiting for in-flight generation", extra={"key": key})
+        
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    def in_flight(self) -> int:
+        """Number of keys currently being worked on in this process."""
+        return len(self._calls)
+
+
+def _claim(key: str, owner: str, ttl: float) -> bool:
+    with get_db() as conn:
+        return claim_lease(conn, key, owner, ttl)
+
+
+def _release(key: str, owner: str):
+    with get_db() as conn:
+        release_lease(conn, key, owner)
+
+
+async def run_with_lease(key: str, fn, ttl: float, poll_interval: float = 0.5):
+    """
+    Run fn while holding the DB-backed lease for key.
+    
+    Used across uvicorn workers sharing one SQLite file: only the lease
+    holder runs the pipeline, the others poll until it is released (or its
+    TTL expires after a crash) and then claim it themselves, by which time
+    the article and quiz are already cached. Waiting stops at the
+    request deadline (resilience.request_deadline), if one is set.
+    
+    Args:
+        key: Normalized article URL
+        fn: Coroutine function to run while holding the lease
+        ttl: Seconds after which an unreleased lease may be taken over
+        poll_interval: Seconds between claim attempts
+    
+    Raises:
+        DeadlineExceeded: The deadline passed before the lease was free
+    """
+    owner = f"{os.getpid()}-{uuid.uuid4().hex}"
+    waited = False
+    
+    while True:
+        claimed = await run_db(_claim, key, owner, ttl)
+        
+        if claimed:
+            break
+        
+        left = remaining()
+        if left is not None and left <= 0:
+            raise DeadlineExceeded("Request deadline exceeded waiting for another worker")
+        
+        if not waited:
+            log.info("Another worker is generating, waiting", extra={"key": key})
+            waited = True
+        await asyncio.sleep(poll_interval if left is None else min(poll_interval, left))
+    
+    try:
+        return await fn()
+    finally:
+        await run_db(_release, key, owner)
@@ -0,0 +1,339 @@
+"""
+Compressed, content-addressed storage for article text and HTML.
+
+Article bodies are stored once per distinct content in the blobs table,
+keyed by the SHA-256 of the uncompressed text and compressed with zstd
+(when the zstandard package is installed) or zlib. articles.text_hash /
+articles.html_hash point at them; scraped_text / raw_html are only used by
+rows written before this storage mode existed.
+
+Raw HTML is only kept when STORE_RAW_HTML is enabled.
+
+Migrate an existing database and print the bytes saved:
+    python storage.py migrate [--keep-html] [--vacuum]
+Report current storage usage:
+    python storage.py report
+"""
+import argparse
+import hashlib
+import json
+import os
+import zlib
+from datetime import datetime, timezone
+from config import STORE_RAW_HTML
+from db import get_db, find_article_id, DB_PATH
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+
+DEFAULT_CODEC = "zstd" if ZSTD_AVAILABLE else "zlib"
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    if codec == "zlib":
+        return zlib.compress(data, 9)
+    raise ValueError(f"Unknown blob codec '{codec}'")
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError("Blob is zstd-compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "zlib":
+        return zlib.decompress(data)
+    raise ValueError(f"Unknown blob codec '{codec}'")
+
+
+def put_blob(cursor, text: str, codec: str = None) -> str:
+    """
+    Store text compressed, once per distinct content.
+    
+    Returns:
+        str: Content hash to keep on the article row
+    """
+    codec = codec or DEFAULT_CODEC
+    raw = text.encode("utf-8")
+    content_hash = hashlib.sha256(raw).hexdigest()
+    
+    exists = cursor.execute(
+        "SELECT 1 FROM blobs WHERE hash = ?",
+        (content_hash,)
+    ).fetchone()
+    
+    if not exists:
+        data = _compress(raw, codec)
+        cursor.execute(
+            """
+            INSERT OR IGNORE INTO blobs (hash, codec, size, stored_size, data)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (content_hash, codec, len(raw), len(data), data)
+        )
+    
+    return content_hash
+
+
+def get_blob(cursor, content_hash: str) -> str:
+    """Load and decompress a blob by hash (None if missing)."""
+    row = cursor.execute(
+        "SELECT codec, data FROM blobs WHERE hash = ?",
+        (content_hash,)
+    ).fetchone()
+    
+    if not row:
+        return None
+    
+    codec, data = row
+    return _decompress(data, codec).decode("utf-8")
+
+
+def store_article_content(cursor, text: str, html: str = None, keep_html: bool = None, sections: dict = None) -> dict:
+    """
+    Store article text, its section breakdown (and HTML if enabled) as blobs.
+    
+    Returns:
+        dict: Column values for the article row (text_hash, html_hash,
+              sections_hash, scraped_text and raw_html, the last two always None)
+    """
+    if keep_html is None:
+        keep_html = STORE_RAW_HTML
+    
+    return {
+        "text_hash": put_blob(cursor, text or ""),
+        "html_hash": put_blob(cursor, html) if keep_html and html else None,
+        "sections_hash": put_blob(cursor, json.dumps(sections)) if sections else None,
+        "scraped_text": None,
+        "raw_html": None,
+    }
+
+
+def save_article(cursor, scraped: dict) -> int:
+    """
+    Insert a scraped article (content as blobs) under its canonical URL.
+    
+    Args:
+        cursor: Cursor of the caller's transaction (not committed here)
+        scraped: Article dict from scraper.parse_wikipedia_html, plus the
+                 optional etag/last_modified validators of the fetch
+    
+    Returns:
+        int: Article id (of the existing row if another worker stored it first)
+    """
+    content = store_article_content(
+        cursor, scraped["text"], scraped["raw_html"], sections=scraped["section_texts"]
+    )
+    now = datetime.now(timezone.utc).isoformat()
+    
+    # OR IGNORE: another worker may have stored it in the meantime
+    cursor.execute(
+        """
+        INSERT OR IGNORE INTO articles
+            (url, title, text_hash, html_hash, sections_hash, etag, last_modified, fetched_at, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            scraped["canonical_url"],
+            scraped["title"],
+            content["text_hash"],
+            content["html_hash"],
+            content["sections_hash"],
+            scraped.get("etag"),
+            scraped.get("last_modified"),
+            now,
+            now
+        )
+    )
+    return find_article_id(cursor, scraped["canonical_url"])
+
+
+def get_article_text(cursor, article_id: int):
+    """
+    Load an article's title and text, decompressing only the text blob.
+    
+    Returns:
+        tuple: (title, text), or None if the article does not exist
+    """
+    row = cursor.execute(
+        "SELECT title, text_hash, scraped_text FROM articles WHERE id = ?",
+        (article_id,)
+    ).fetchone()
+    
+    if not row:
+        return None
+    
+    title, text_hash, scraped_text = row
+    if text_hash:
+        return title, get_blob(cursor, text_hash)
+    return title, scraped_text
+
+
+def get_article_sections(cursor, article_id: int):
+    """
+    Load an article's section breakdown.
+    
+    Returns:
+        dict: {section name: text} in article order, or None for articles
+              stored before sections were kept
+    """
+    row = cursor.execute(
+        "SELECT sections_hash FROM articles WHERE id = ?",
+        (article_id,)
+    ).fetchone()
+    
+    if not row or not row[0]:
+        return None
+    
+    sections = get_blob(cursor, row[0])
+    return json.loads(sections) if sections else None
+
+
+def get_article_html(cursor, article_id: int):
+    """Load an article's raw HTML if it was kept (None otherwise)."""
+    row = cursor.execute(
+        "SELECT html_hash, raw_html FROM articles WHERE id = ?",
+        (article_id,)
+    ).fetchone()
+    
+    if not row:
+        return None
+    
+    html_hash, raw_html = row
+    if html_hash:
+        return get_blob(cursor, html_hash)
+    return raw_html
+
+
+def prune_blobs(cursor) -> int:
+    """Delete blobs no article points at any more. Returns rows deleted."""
+    cursor.execute("""
+        DELETE FROM blobs
+        WHERE hash NOT IN (SELECT text_hash FROM articles WHERE text_hash IS NOT NULL)
+          AND hash NOT IN (SELECT html_hash FROM articles WHERE html_hash IS NOT NULL)
+          AND hash NOT IN (SELECT sections_hash FROM articles WHERE sections_hash IS NOT NULL)
+    """)
+    return cursor.rowcount
+
+
+# ============ MIGRATION & REPORTING ============
+def storage_report(cursor) -> dict:
+    """Bytes used by inline article columns and by the blob table."""
+    inline_text, inline_html = cursor.execute("""
+        SELECT
+            COALESCE(SUM(LENGTH(CAST(scraped_text AS BLOB))), 0),
+            COALESCE(SUM(LENGTH(CAST(raw_html AS BLOB))), 0)
+        FROM articles
+    """).fetchone()
+    
+    blob_count, blob_size, blob_stored = cursor.execute("""
+        SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(stored_size), 0)
+        FROM blobs
+    """).fetchone()
+    
+    page_count = cursor.execute("PRAGMA page_count").fetchone()[0]
+    page_size = cursor.execute("PRAGMA page_size").fetchone()[0]
+    
+    return {
+        "inline_text_bytes": inline_text,
+        "inline_html_bytes": inline_html,
+        "blobs": blob_count,
+        "blob_uncompressed_bytes": blob_size,
+        "blob_stored_bytes": blob_stored,
+        "content_bytes": inline_text + inline_html + blob_stored,
+        "db_file_bytes": page_count * page_size,
+    }
+
+
+def migrate_article_storage(conn, keep_html: bool = None, codec: str = None) -> dict:
+    """
+    Move inline scraped_text/raw_html into compressed blobs.
+    Raw HTML is dropped unless keep_html (default STORE_RAW_HTML).
+    
+    Returns:
+        dict: {'articles': rows rewritten, 'before': report, 'after': report,
+               'bytes_saved': content bytes saved}
+    """
+    if keep_html is None:
+        keep_html = STORE_RAW_HTML
+    
+    cursor = conn.cursor()
+    before = storage_report(cursor)
+    
+    ids = [r[0] for r in cursor.execute("""
+        SELECT id FROM articles
+        WHERE scraped_text IS NOT NULL OR raw_html IS NOT NULL
+    """).fetchall()]
+    
+    # One row at a time so large HTML bodies are never all in memory
+    for article_id in ids:
+        text, html = cursor.execute(
+            "SELECT scraped_text, raw_html FROM articles WHERE id = ?",
+            (article_id,)
+        ).fetchone()
+        
+        text_hash = put_blob(cursor, text, codec) if text is not None else None
+        html_hash = put_blob(cursor, html, codec) if keep_html and html else None
+        
+        cursor.execute(
+            """
+            UPDATE articles
+            SET text_hash = COALESCE(?, text_hash),
+                html_hash = COALESCE(?, html_hash),
+                scraped_text = NULL,
+                raw_html = NULL
+            WHERE id = ?
+            """,
+            (text_hash, html_hash, article_id)
+        )
+        conn.commit()
+    
+    prune_blobs(cursor)
+    conn.commit()
+    after = storage_report(cursor)
+    
+    return {
+        "articles": len(ids),
+        "before": before,
+        "after": after,
+        "bytes_saved": before["content_bytes"] - after["content_bytes"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compressed article storage tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    
+    migrate = sub.add_parser("migrate", help="rewrite inline article text/HTML into compressed blobs")
+    migrate.add_argument("--keep-html", action="store_true", default=STORE_RAW_HTML, help="keep raw HTML (compressed)")
+    migrate.add_argument("--codec", choices=["zstd", "zlib"], default=None)
+    migrate.add_argument("--vacuum", action="store_true", help="VACUUM afterwards to shrink the file")
+    
+    sub.add_parser("report", help="print storage usage")
+    
+    args = parser.parse_args()
+    
+    with get_db() as conn:
+        if args.command == "report":
+            print(json.dumps(storage_report(conn.cursor()), indent=2))
+            return
+        
+        file_before = os.path.getsize(DB_PATH)
+        result = migrate_article_storage(conn, keep_html=args.keep_html, codec=args.codec)
+        
+        if args.vacuum:
+            conn.execute("VACUUM")
+        result["db_file_bytes_before"] = file_before
+        result["db_file_bytes_after"] = os.path.getsize(DB_PATH)
+    
+    print(json.dumps(result, indent=2))
+    print(f"✅ Migrated {result['articles']} article(s), saved {result['bytes_saved']:,} bytes of content")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The backend uses flat 'from config import ...' style imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
@@ -0,0 +1,104 @@
+import asyncio
+import httpx
+import pytest
+from fetcher import Fetcher
+
+PAGE = "https://en.wikipedia.org/wiki/Python"
+
+
+def _fetcher(handler, **kwargs) -> Fetcher:
+    """A Fetcher whose requests are answered by handler instead of the network."""
+    return Fetcher(transport=httpx.MockTransport(handler), **kwargs)
+
+
+def test_fetch_returns_text_and_validators():
+    seen = []
+    
+    def handler(request):
+        seen.append(request)
+        return httpx.Response(
+            200,
+            text="<html>Python</html>",
+            headers={"ETag": '"v1"', "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"}
+        )
+    
+    result = _fetcher(handler).fetch_sync(PAGE)
+    
+    assert result.status_code == 200
+    assert result.text == "<html>Python</html>"
+    assert result.etag == '"v1"'
+    assert result.last_modified == "Mon, 01 Jan 2024 00:00:00 GMT"
+    assert not result.not_modified
+    assert "If-None-Match" not in seen[0].headers
+    assert seen[0].headers["User-Agent"].startswith("WikiQuizGenerator")
+
+
+def test_conditional_fetch_not_modified():
+    def handler(request):
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, text="changed", headers={"ETag": '"v2"'})
+    
+    fetcher = _fetcher(handler)
+    unchanged = fetcher.fetch_sync(PAGE, etag='"v1"', last_modified="Mon, 01 Jan 2024 00:00:00 GMT")
+    changed = fetcher.fetch_sync(PAGE, etag='"v0"')
+    
+    assert unchanged.not_modified
+    assert unchanged.text is None
+    # The stored validators are kept for the next check
+    assert unchanged.etag == '"v1"'
+    assert unchanged.last_modified == "Mon, 01 Jan 2024 00:00:00 GMT"
+    assert changed.status_code == 200
+    assert changed.etag == '"v2"'
+
+
+def test_fetch_follows_redirects():
+    def handler(request):
+        if request.url.path == "/wiki/Py":
+            return httpx.Response(301, headers={"Location": PAGE})
+        return httpx.Response(200, text="Python")
+    
+    result = _fetcher(handler).fetch_sync("https://en.wikipedia.org/wiki/Py")
+    
+    assert result.url == PAGE
+    assert result.text == "Python"
+
+
+def test_fetch_raises_on_error_status():
+    fetcher = _fetcher(lambda request: httpx.Response(404))
+    
+    with pytest.raises(httpx.HTTPStatusError):
+        fetcher.fetch_sync(PAGE)
+
+
+def test_per_host_limit():
+    in_flight = {"en.wikipedia.org": 0, "de.wikipedia.org": 0}
+    peak = dict(in_flight)
+    
+    async def handler(request):
+        host = request.url.host
+        in_flight[host] += 1
+        peak[host] = max(peak[host], in_flight[host])
+        await asyncio.sleep(0.01)
+        in_flight[host] -= 1
+        return httpx.Response(200, text="ok")
+    
+    fetcher = _fetcher(handler, per_host_limit=2)
+    
+    async def fetch_all():
+        urls = [f"https://{host}/wiki/Page_{n}" for host in in_flight for n in range(6)]
+        return await asyncio.gather(*(fetcher.fetch(url) for url in urls))
+    
+    results = fetcher.run(fetch_all())
+    
+    assert len(results) == 12
+    assert peak == {"en.wikipedia.org": 2, "de.wikipedia.org": 2}
+
+
+def test_fetch_async_from_another_loop():
+    fetcher = _fetcher(lambda request: httpx.Response(200, text="Python"))
+    
+    # The request path runs on uvicorn's loop, not the fetcher's
+    result = asyncio.run(fetcher.fetch_async(PAGE))
+    
+    assert result.text == "Python"
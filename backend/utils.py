@@ -1,4 +1,5 @@
 import re
+from urllib.parse import urlsplit, urlunsplit, quote, unquote
 from fastapi import HTTPException
 
 def validate_wikipedia_url(url: str) -> bool:
@@ -6,6 +7,35 @@ def validate_wikipedia_url(url: str) -> bool:
     pattern = r'^https?://en\.wikipedia\.org/wiki/[^#?]+$'
     return bool(re.match(pattern, url))
 
+def canonicalize_wikipedia_url(url: str) -> str:
+    """
+    Canonical form of a Wikipedia article URL, used as the cache key.
+    
+    Forces https, drops query/fragment, decodes percent-encoding,
+    treats spaces and underscores alike and upper-cases the first letter
+    of the title (as MediaWiki does), then re-encodes consistently, so
+    'http://en.wikipedia.org/wiki/python%20(programming_language)' and
+    'https://en.wikipedia.org/wiki/Python_(programming_language)' match.
+    """
+    parts = urlsplit(url.strip())
+    path = parts.path
+    
+    if not path.startswith("/wiki/"):
+        return urlunsplit(("https", parts.netloc.lower(), path, "", ""))
+    
+    title = unquote(path[len("/wiki/"):]).replace(" ", "_")
+    title = re.sub(r"_+", "_", title).strip("_")
+    if title:
+        title = title[0].upper() + title[1:]
+    
+    return urlunsplit((
+        "https",
+        parts.netloc.lower(),
+        "/wiki/" + quote(title, safe="()_,:;!'*-.~@$&+=/"),
+        "",
+        ""
+    ))
+
 def http_422(detail: str):
     raise HTTPException(status_code=422, detail=detail)
 
@@ -15,6 +45,13 @@ def http_404(detail: str):
 def http_500(detail: str):
     raise HTTPException(status_code=500, detail=detail)
 
+def http_503(detail: str, retry_after: float = None):
+    headers = {"Retry-After": str(max(1, round(retry_after)))} if retry_after else None
+    raise HTTPException(status_code=503, detail=detail, headers=headers)
+
+def http_504(detail: str):
+    raise HTTPException(status_code=504, detail=detail)
+
 def score_attempt(quiz_json: list, user_answers: dict):
     """
     Scores the user's quiz attempt.
@@ -24,6 +24,19 @@ export interface QuizHistoryItem {
   created_at: string;
 }
 
+export interface QuizHistoryPage {
+  items: QuizHistoryItem[];
+  next_after_id: number | null;
+}
+
+export interface HistoryQuery {
+  limit?: number;
+  afterId?: number | null;
+  since?: string;
+  until?: string;
+  title?: string;
+}
+
 export interface AttemptResult {
   score: number;
   total: number;
@@ -43,12 +56,84 @@ export async function generateQuiz(url: string): Promise<Quiz> {
   return res.json();
 }
 
+export interface QuizStreamHandlers {
+  onArticle?: (article: { url: string; title: string }) => void;
+  onQuestion?: (index: number, question: QuizQuestion, received: number) => void;
+}
+
+// POST /api/quizzes/stream: same result as generateQuiz, but questions are
+// reported through the handlers as soon as the server has them
+export async function streamQuiz(url: string, handlers: QuizStreamHandlers = {}): Promise<Quiz> {
+  const res = await fetch(`${API}/api/quizzes/stream`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ url })
+  });
+
+  if (!res.ok || !res.body) {
+    const err = await res.json().catch(() => ({}));
+    throw new Error(err.detail || "Request failed");
+  }
+
+  const quiz: Quiz = { url, title: "", quiz: [], related_topics: [], related_links: [] };
+  const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+  let buffer = "";
+  let received = 0;
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += value;
+
+    // Events are separated by a blank line: "event: <name>\ndata: <json>"
+    let end: number;
+    while ((end = buffer.indexOf("\n\n")) !== -1) {
+      const block = buffer.slice(0, end);
+      buffer = buffer.slice(end + 2);
+
+      const event = block.match(/^event: (.*)$/m)?.[1];
+      const data = JSON.parse(block.match(/^data: (.*)$/m)?.[1] ?? "{}");
+
+      if (event === "article") {
+        quiz.title = data.title;
+        handlers.onArticle?.(data);
+      } else if (event === "question") {
+        quiz.quiz[data.index] = data.question;
+        received += 1;
+        handlers.onQuestion?.(data.index, data.question, received);
+      } else if (event === "related_topics") {
+        quiz.related_topics = data.related_topics;
+        quiz.related_links = data.related_links;
+      } else if (event === "done") {
+        quiz.id = data.id;
+        quiz.quiz = quiz.quiz.filter(Boolean);
+        return quiz;
+      } else if (event === "error") {
+        throw new Error(data.detail || "Request failed");
+      }
+    }
+  }
+  throw new Error("Connection closed before the quiz was ready");
+}
+
 export async function fetchHistory(): Promise<QuizHistoryItem[]> {
   const res = await fetch(`${API}/api/quizzes`);
   if (!res.ok) throw new Error("Failed to fetch history");
   return res.json();
 }
 
+export async function fetchHistoryPage(query: HistoryQuery = {}): Promise<QuizHistoryPage> {
+  const params = new URLSearchParams({ limit: String(query.limit ?? 20) });
+  if (query.afterId) params.set("after_id", String(query.afterId));
+  if (query.since) params.set("since", query.since);
+  if (query.until) params.set("until", query.until);
+  if (query.title) params.set("title", query.title);
+
+  const res = await fetch(`${API}/api/quizzes?${params}`);
+  if (!res.ok) throw new Error("Failed to fetch history");
+  return res.json();
+}
+
 export async function fetchQuiz(id: number | string): Promise<Quiz> {
   const res = await fetch(`${API}/api/quizzes/${id}`);
   if (!res.ok) throw new Error("Failed to fetch quiz");
@@ -1,5 +1,5 @@
 import { useState } from "react";
-import { generateQuiz, Quiz } from "@/api/client";
+import { streamQuiz, Quiz } from "@/api/client";
 import TakeQuiz from "@/components/TakeQuiz";
 import { Sparkles, Link as LinkIcon, AlertCircle } from "lucide-react";
 
@@ -8,6 +8,7 @@ export default function GenerateQuiz() {
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [quiz, setQuiz] = useState<Quiz | null>(null);
+  const [questionsReady, setQuestionsReady] = useState(0);
 
   const handleGenerate = async (e: React.FormEvent) => {
     e.preventDefault();
@@ -15,9 +16,12 @@ export default function GenerateQuiz() {
 
     setLoading(true);
     setError(null);
+    setQuestionsReady(0);
 
     try {
-      const result = await generateQuiz(url);
+      const result = await streamQuiz(url, {
+        onQuestion: (_index, _question, received) => setQuestionsReady(received),
+      });
       setQuiz(result);
     } catch (err) {
       setError(err instanceof Error ? err.message : "Failed to generate quiz");
@@ -76,7 +80,7 @@ export default function GenerateQuiz() {
           {loading ? (
             <>
               <div className="w-5 h-5 border-2 border-primary-foreground/30 border-t-primary-foreground rounded-full animate-spin" />
-              Generating Quiz...
+              {questionsReady > 0 ? `Generating Quiz... (${questionsReady}/6 questions)` : "Generating Quiz..."}
             </>
           ) : (
             <>
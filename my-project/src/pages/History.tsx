@@ -1,5 +1,5 @@
 import { useState, useEffect } from "react";
-import { fetchHistory, QuizHistoryItem } from "@/api/client";
+import { fetchHistoryPage, QuizHistoryItem } from "@/api/client";
 import QuizCard from "@/components/QuizCard";
 import QuizDetailsModal from "@/components/QuizDetailsModal";
 import { History as HistoryIcon, Loader2, FileQuestion } from "lucide-react";
@@ -9,12 +9,15 @@ export default function History() {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
   const [selectedQuizId, setSelectedQuizId] = useState<number | string | null>(null);
+  const [nextAfterId, setNextAfterId] = useState<number | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     const loadHistory = async () => {
       try {
-        const data = await fetchHistory();
-        setQuizzes(data);
+        const page = await fetchHistoryPage();
+        setQuizzes(page.items);
+        setNextAfterId(page.next_after_id);
       } catch (err) {
         setError("Failed to load quiz history");
       } finally {
@@ -24,6 +27,20 @@ export default function History() {
     loadHistory();
   }, []);
 
+  const loadMore = async () => {
+    if (!nextAfterId) return;
+    setLoadingMore(true);
+    try {
+      const page = await fetchHistoryPage({ afterId: nextAfterId });
+      setQuizzes((prev) => [...prev, ...page.items]);
+      setNextAfterId(page.next_after_id);
+    } catch (err) {
+      setError("Failed to load quiz history");
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   return (
     <div className="max-w-4xl mx-auto animate-fade-in">
       <div className="flex items-center gap-3 mb-8">
@@ -64,6 +81,14 @@ export default function History() {
               onViewDetails={(id) => setSelectedQuizId(id || 'temp')}
             />
           ))}
+          {nextAfterId && (
+            <div className="flex justify-center pt-2">
+              <button onClick={loadMore} disabled={loadingMore} className="btn-secondary flex items-center gap-2">
+                {loadingMore && <Loader2 className="w-4 h-4 animate-spin" />}
+                Load more
+              </button>
+            </div>
+          )}
         </div>
       )}
 